@@ -1,4 +1,5 @@
-import flask
+import flask, os
+import contextlib
 import flask_sqlalchemy
 import flask_bootstrap
 import flask_mail
@@ -48,3 +49,20 @@ def create_app(config_name):
     app.register_blueprint(transactions_blueprint, url_prerix = "/transactions")
 
     return app
+
+
+@contextlib.contextmanager
+def app_context(config_name = None):
+    """
+    app_context(config_name)
+        Runs the enclosed block against the current application when there is one.
+        Otherwise, e.g. from scripts and the shell, creates a single application from
+        config_name (defaults to FLASK_CONFIG) and pushes its context for the block.
+    """
+    if flask.has_app_context():
+        yield flask.current_app._get_current_object()
+        return
+
+    app = create_app(config_name or os.getenv('FLASK_CONFIG') or 'default')
+    with app.app_context():
+        yield app
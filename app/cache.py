@@ -0,0 +1,97 @@
+import threading, time
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+
+class TimedCache:
+    """
+    class TimedCache
+        In-process key/value store whose entries expire after a timeout
+        timeout is the default lifetime of an entry in seconds
+        maxsize is the maximum number of entries; least recently used are evicted first
+
+        Every process holds its own copy: under several gunicorn workers, invalidating
+        an entry only drops it in the worker that wrote the change, and the others keep
+        serving theirs until it times out.
+    """
+    def __init__(self, timeout = 300, maxsize = None):
+        self.timeout = timeout
+        self.maxsize = maxsize
+
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default = None):
+        """Returns the live value stored under key, otherwise default"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return default
+
+            value, expiry = entry
+            if expiry < time.monotonic():
+                del self.entries[key]
+                return default
+
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout = None):
+        """Stores value under key for timeout seconds (defaults to self.timeout)"""
+        timeout = self.timeout if timeout is None else timeout
+
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + float(timeout))
+            self.entries.move_to_end(key)
+
+            if self.maxsize is not None:
+                while len(self.entries) > self.maxsize:
+                    self.entries.popitem(last = False)
+        return value
+
+    def get_or_set(self, key, builder, timeout = None):
+        """
+        get_or_set(key, builder)
+            Returns the value stored under key, calling builder() to create it when missing
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = self.set(key, builder(), timeout)
+        return value
+
+    def invalidate(self, key = None):
+        """Drops the entry stored under key, or every entry when key is None"""
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+
+def after_commit(target, callback, *args):
+    """
+    after_commit(target, callback, *args)
+        Calls callback(*args) once the session holding target commits rather than at
+        flush, where another request could cache the old rows again before the commit;
+        forgotten when the session rolls back. Repeated calls run once per commit.
+    """
+    session = object_session(target) if not isinstance(target, Session) else target
+    if session is None:
+        callback(*args)
+        return
+    session.info.setdefault('after_commit', set()).add((callback, args))
+
+
+@event.listens_for(Session, 'after_commit')
+def run_after_commit(session):
+    for callback, args in session.info.pop('after_commit', ()):
+        callback(*args)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def forget_after_commit(session, transaction):
+    #only the outermost transaction ends the unit of work; savepoints keep theirs
+    if transaction.parent is None:
+        session.info.pop('after_commit', None)
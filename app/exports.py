@@ -0,0 +1,168 @@
+import csv, re, zipfile
+import flask
+from datetime import date
+from xml.sax.saxutils import escape
+
+#formats served by stream_export and the content type of each
+mimetypes = {
+        'csv' : 'text/csv',
+        'xlsx' : 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        }
+
+spreadsheet = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+relationships = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+package_relationships = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+#the fixed parts of a single sheet workbook; the sheet itself is streamed
+xlsx_parts = {
+        '[Content_Types].xml' :
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" '
+            'ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" ContentType="application/'
+            'vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/'
+            'vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            '</Types>',
+        '_rels/.rels' :
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            f'<Relationships xmlns="{package_relationships}">'
+            f'<Relationship Id="rId1" Type="{relationships}/officeDocument" '
+            'Target="xl/workbook.xml"/></Relationships>',
+        'xl/workbook.xml' :
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            f'<workbook xmlns="{spreadsheet}" xmlns:r="{relationships}"><sheets>'
+            '<sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets></workbook>',
+        'xl/_rels/workbook.xml.rels' :
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            f'<Relationships xmlns="{package_relationships}">'
+            f'<Relationship Id="rId1" Type="{relationships}/worksheet" '
+            'Target="worksheets/sheet1.xml"/></Relationships>'
+        }
+
+#characters XML 1.0 cannot carry
+illegal_characters = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class line_buffer:
+    """Write target for csv.writer that hands back whatever was written last"""
+    def __init__(self):
+        self.value = ''
+
+    def write(self, value):
+        self.value = value
+
+
+def csv_rows(header, rows):
+    """
+    csv_rows(header, rows)
+        Yields the header and every row of rows encoded as CSV lines, one at a time
+    """
+    buffer = line_buffer()
+    writer = csv.writer(buffer)
+
+    writer.writerow(header)
+    yield buffer.value
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.value
+
+
+class chunk_buffer:
+    """Unseekable write target that hands back everything written since the last take"""
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        if data:
+            self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def xlsx_cell(value):
+    if value is None:
+        return '<c/>'
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c><v>{value}</v></c>'
+    if isinstance(value, date):
+        value = value.isoformat(sep = ' ') if hasattr(value, 'hour') else value.isoformat()
+    value = illegal_characters.sub('', escape(str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{value}</t></is></c>'
+
+
+def xlsx_chunks(header, rows):
+    """
+    xlsx_chunks(header, rows)
+        Yields an XLSX workbook of the header and rows piece by piece as it is compressed;
+        cells are written inline so no part of the workbook needs the whole result
+    """
+    buffer = chunk_buffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in xlsx_parts.items():
+            archive.writestr(name, content)
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64 = True) as sheet:
+            sheet.write(('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                f'<worksheet xmlns="{spreadsheet}"><sheetData>').encode())
+            sheet.write(('<row>' + ''.join(xlsx_cell(item) for item in header) +
+                '</row>').encode())
+
+            for row in rows:
+                sheet.write(('<row>' + ''.join(xlsx_cell(item) for item in row) +
+                    '</row>').encode())
+                if buffer.chunks:
+                    yield buffer.take()
+            sheet.write(b'</sheetData></worksheet>')
+    yield buffer.take()
+
+
+def coalesce(chunks, size = 65536):
+    """
+    coalesce(chunks, size)
+        Joins the small pieces yielded by chunks into pieces of about size bytes
+    """
+    pending, length = [], 0
+    for chunk in chunks:
+        pending.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield ''.join(pending) if isinstance(chunk, str) else b''.join(pending)
+            pending, length = [], 0
+    if pending:
+        yield ''.join(pending) if isinstance(pending[0], str) else b''.join(pending)
+
+
+def stream_export(filename, header, query, format = 'csv', batch = 1000):
+    """
+    stream_export(filename, header, query, format)
+        Returns a response streaming the rows of query as a {format} attachment, where
+        format is csv or xlsx; filename is given without its extension
+        Rows are fetched {batch} at a time so memory stays bounded for any result size
+    """
+    if format not in mimetypes:
+        flask.abort(404)
+
+    rows = query.yield_per(batch) if hasattr(query, 'yield_per') else query
+    chunks = xlsx_chunks(header, rows) if format == 'xlsx' else csv_rows(header, rows)
+
+    response = flask.Response(flask.stream_with_context(coalesce(chunks)),
+            mimetype = mimetypes[format])
+    response.headers['Content-Disposition'] = \
+            f'attachment; filename="{filename}.{format}"'
+    return response
+
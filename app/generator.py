@@ -1,6 +1,8 @@
-import threading, os, flask, time
+import threading, os, flask, time, atexit, random, tempfile, multiprocessing, json
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from faker import Faker
-from random import randint
+from random import randint, Random
 from datetime import datetime, date, timedelta
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy import func
@@ -8,39 +10,60 @@ from sqlalchemy import func
 from . import db, create_app
 from .models import (user, member, occupation, document_type, month, loan_type, role,
         registration_fee, employer, employment, monthly_deposit, phone_number, review,
-        branch, event, event_image, loan_overdue, loan_overdue_payment, loan, installment,
-        monthly_deposit_overdue, deposit_overdue_payment, group)
+        branch, event, loan_overdue, loan_overdue_payment, loan, installment,
+        monthly_deposit_overdue, deposit_overdue_payment, group, ledger_rollup,
+        ledger_kinds)
+from .transactions.dependencies import generate_overdue_monthly_deposits
+from .transactions.summaries import invalidate_year_summaries
+from .kpis import kpi_cache
 
 class Timer:
     """
     class Timer
-        Generates a new time between begin and end
-        begin is the time to start from, default is datetime.utcnow()
+        Simulated clock of the Generator; every add() moves it forward by a random step.
+        The clock lives in memory and is saved to the checkpoint file every so many ticks
+        and when the process exits, so that the next run resumes from where this one stopped.
+        begin is the time to start from when not resuming, default is 5 years before end
         end is the time to stop, default is datetime.utcnow()
+        checkpoint is the file the clock is saved to, default is app/file.txt
+        every is the number of ticks between checkpoints
+        seed makes the sequence of steps, and so the generated timeline, reproducible
+        resume starts the clock from the checkpoint when there is one and saves it there;
+        otherwise the checkpoint is neither read nor written
     """
-    current = list()
-
-    def __init__(self, begin = datetime.utcnow(), end = datetime.utcnow()):
-        # set the initial time
+    format = "%d-%b-%Y %H:%M:%S.%f"
+
+    def __init__(self, begin = None, end = None, checkpoint = None, every = 100,
+            seed = None, resume = True):
+        self.checkpoint = checkpoint or os.path.join(os.path.dirname(__file__), 'file.txt')
+        self.every = every if resume else 0
+        self.random = Random(seed)
+
+        self.end = end or datetime.utcnow()
+        self.begin = (resume and self.load()) or begin or \
+                self.end - timedelta(days = 5 * 365, seconds = 0, milliseconds = 0)
+        self.current = self.begin
+        self.ticks = 0
+
+        self.seed = seed
+        self.reset()
+        if resume:
+            atexit.register(self.save)
+
+    def load(self):
+        """Returns the time saved at the checkpoint, otherwise None"""
         try:
-            with open('app/file.txt', 'r') as file:
-                self.begin = datetime.strptime(file.read(), "%d-%b-%Y %H:%M:%S.%f")
-        except:
-            self.begin = datetime.utcnow() - timedelta(days = 5 * 365, seconds = 0, milliseconds = 0)
-
-        self.end = end
-        self.days = 1 #number of days from self.begin
-        self.seconds = 1000 #number of self.days + seconds from begin
-        self.milliseconds = 1000 # number of self.days + seconds + milliseconds from begin
-        self.seed = 1
-
-        # get time to begin from file
-        try:
-            file = open('file.txt', 'r')
-            file.read()
-        except:
-            with open('file.txt', 'r') as file:
-                file.write(self.begin)
+            with open(self.checkpoint, 'r') as file:
+                return datetime.strptime(file.read().strip(), self.format)
+        except (OSError, ValueError):
+            return None
+
+    def save(self):
+        """Saves the current time to the checkpoint, replacing the old one atomically"""
+        handle, temporary = tempfile.mkstemp(dir = os.path.dirname(self.checkpoint) or '.')
+        with os.fdopen(handle, 'w') as file:
+            file.write(self.current.strftime(self.format))
+        os.replace(temporary, self.checkpoint)
 
     def add(self, brake = 1):
         """
@@ -49,38 +72,30 @@ class Timer:
             returns datetime.datetime object
             brake is a time generation regulator - reduces time difference
         """
-        self.seconds = randint(self.seconds, 
-                self.seconds + int(randint(10000, 100000)/brake))
+        self.seconds = self.random.randint(self.seconds, 
+                self.seconds + int(self.random.randint(10000, 100000)/brake))
 
-        self.milliseconds = randint(self.milliseconds, 
+        self.milliseconds = self.random.randint(self.milliseconds, 
                 self.milliseconds + int(10000000/brake))
 
         jump = timedelta(days = self.days, seconds = self.seconds, 
                 milliseconds = self.milliseconds)
-
         self.current = self.begin + jump
-        
-        with open('app/file.txt', 'w') as file:
-            file.write((self.begin + jump).strftime("%d-%b-%Y %H:%M:%S.%f"))
-        
-        return self.today()
 
+        self.ticks += 1
+        if self.every and self.ticks % self.every == 0:
+            self.save()
+        return self.current
 
     def today(self):
         """Returns current Timer date and time"""
-        with open('app/file.txt', 'r') as file:
-            try:
-                return datetime.strptime(file.read(), "%d-%b-%Y %H:%M:%S.%f")
-            except:
-                print("Option 2")
-                return self.current
+        return self.current
 
     def reset(self):
         """Resets Timer attributes to default"""
         self.days = 1
         self.seconds = 1000
         self.milliseconds = 1000
-        self.seed = 1
 
 
 class Thread(threading.Thread):
@@ -94,13 +109,30 @@ class Thread(threading.Thread):
             self.start()
 
 
+#present of the timeline of seeded runs, so that a seed generates the same records on any day
+seeded_now = datetime(2026, 1, 1)
+
+
 class Generator:
-    def __init__(self, locale = 'en_CA', period = 5, fee = 2000):
+    #whether unseeded runs resume the Timer from its checkpoint and save it there
+    checkpoints = True
+
+    def __init__(self, locale = 'en_CA', period = 5, fee = 2000, seed = None, now = None):
+        #the generated history ends at now; seeded runs default to seeded_now
+        self.now = now or (seeded_now if seed is not None else datetime.utcnow())
         self.period = timedelta(days = (period * 365)+100, seconds = 0, milliseconds = 0)
-        self.begin = datetime.utcnow() - self.period #default is 5 years from current date
+        self.begin = self.now - self.period #default is 5 years before now
 
         self.fake = Faker(locale = locale)
-        self.timer = Timer(begin = self.begin, end = datetime.utcnow())
+        #a seeded run starts from begin rather than the checkpoint of an earlier run, and
+        #leaves that checkpoint alone
+        self.timer = Timer(begin = self.begin, end = self.now, seed = seed,
+                resume = seed is None and self.checkpoints)
+
+        #a seed makes the generated records the same on every run
+        if seed is not None:
+            random.seed(seed)
+            self.fake.seed_instance(seed)
 
         self.maximum_registration_fee = fee #maximum registration fee
     
@@ -194,36 +226,10 @@ class Generator:
         generate_overdue_monthly_deposits
             automates generation of deferred monthly deposit payments alongside those below the given limit
         """
-        months = month.query.all()
-        for member_item in member.query.all():
-            for month_item in months:
-                if member_item.date_created < datetime.strptime(month_item.description, '%B %Y'):
-                    #check whether ther is an existing overdue record for member for month, month_item
-                    overdues = monthly_deposit_overdue.query.filter(
-                            monthly_deposit_overdue.member_id == member_item.member_id,
-                            monthly_deposit_overdue.month_id == month_item.month_id).first()
-                    if overdues:
-                        continue #a record already exists; no need to continue with process
-
-                    #check whether member in question has made any deposit for the month
-                    deposits = db.session.query(func.sum(monthly_deposit.amount))\
-                        .filter(
-                            monthly_deposit.month_id == month_item.month_id,
-                            monthly_deposit.member_id == member_item.member_id).scalar()
-                    if not deposits:
-                        deposits = 0
-
-                    if (deposits == 0) or (deposits < flask.current_app.config['DEPOSIT_OVERDUE']):
-                        fake_time = self .timer.add(10000)
-                        overdue = monthly_deposit_overdue(
-                                amount = flask.current_app.config['DEPOSIT_OVERDUE'] - deposits,
-                                month_id = month_item.month_id,
-                                member_id = member_item.member_id,
-                                date_created = fake_time,
-                                last_updated = fake_time)
-                        db.session.add(overdue)
-                        print(f'Generation of overdue monthly deposit for ID {member_item.member_id} - {month_item.description}')
+        created = generate_overdue_monthly_deposits(period = None, 
+                today = self.timer.today(), stamp = self.timer.add(10000))
         db.session.commit()
+        print(f'Generation of {created} overdue monthly deposits successful...')
         return None
 
 
@@ -258,16 +264,12 @@ class Generator:
             loan_id is the ID for loan of which installment is generated
         """
         Loan = loan.query.filter_by(loan_id = loan_id).first()
-        
-        paid = db.session.query(func.sum(installment.amount))\
-                .filter_by(loan_id = loan_id).scalar()
-        if not paid:
-            paid = 0
 
         if Loan:
+            paid = Loan.amount_paid
             random_amount = randint(1, 200) * 100
             fake_time = self.timer.add(700)
-            if random_amount <= (Loan.amount - paid):
+            if random_amount <= (Loan.amount + Loan.interest - paid):
                 Installment = installment(
                     amount = random_amount,
                     loan_id = loan_id,
@@ -275,7 +277,7 @@ class Generator:
                     last_updated = fake_time
                 )
                 db.session.add(Installment)
-                if (Loan.amount - (paid + random_amount)) == 0:
+                if (Loan.amount + Loan.interest - (paid + random_amount)) == 0:
                     Loan.status = 'Paid'
                     Loan.last_updated = fake_time
                     db.session.add(Loan)
@@ -350,10 +352,9 @@ class Generator:
             generates individual loan of a random principal for member ID, member_id
             member_id is the ID for member for whom loan is generated
         """
-        viable = True #By default member is viable for loan
-        for item in loan.query.filter_by(member_id = member_id).all():
-            if item.status == 'pending':
-                viable = False
+        #member is not viable for loan while one is pending
+        viable = not db.session.query(loan.query.filter_by(
+            member_id = member_id, status = 'pending').exists()).scalar()
 
         Loan_Type = loan_type.query.filter_by(loan_type_id = type_id).first()
         
@@ -756,6 +757,491 @@ class Generator:
             db.session.rollback()
 
 
+#terms of a loan type that loan histories are generated under
+loan_terms = namedtuple('loan_terms', ['loan_type_id', 'multiplier', 'max_period', 'rate'])
+
+
+class BulkGenerator(Generator):
+    """
+    class BulkGenerator
+        Seeding mode of the Generator for load testing. Instead of one ORM object, commit
+        and re-query per record, whole member histories are built in memory with IDs
+        assigned client-side and written with one executemany INSERT per table every
+        {batch} rows. Mapper events do not fire for these inserts, so the ledger rollups
+        and the balance columns of loans are computed alongside the rows.
+        batch is the number of rows of a table buffered before the buffers are written
+        rollups records the ledger rollups with every write; otherwise they are left
+        accumulating in self.rollups for the caller to record
+    """
+    #tables in foreign key order; buffered rows are written in this order
+    tables = (branch, loan_type, employer, occupation, month, group, member,
+            registration_fee, phone_number, employment, monthly_deposit,
+            monthly_deposit_overdue, deposit_overdue_payment, loan, installment,
+            loan_overdue, loan_overdue_payment)
+
+    #reference records set by prepare() that the histories point at
+    references = ('first', 'months', 'loan_types', 'employers', 'occupations', 'month_ids')
+
+    #histories are stamped by stamp(), not the Timer; a checkpoint saved by one of many
+    #workers would only overwrite that of the Generator's own runs
+    checkpoints = False
+
+    def __init__(self, batch = 5000, rollups = True, **kwargs):
+        super().__init__(**kwargs)
+        self.batch = batch
+        self.record_rollups = rollups
+        self.pending = dict()
+        self.keys = dict()
+        self.rollups = dict()
+        self.written = dict()
+        self.ledger = {model : kind for kind, model in ledger_kinds}
+
+    def next_id(self, model):
+        """Returns the next free primary key of model, reading the highest one only once"""
+        key = db.inspect(model).primary_key[0]
+        if model not in self.keys:
+            self.keys[model] = db.session.query(func.max(key)).scalar() or 0
+        self.keys[model] += 1
+        return self.keys[model]
+
+    def add(self, model, **row):
+        """
+        add(model, **row)
+            Buffers a row of model, assigning its primary key unless row carries one; every
+            row of a model must carry the same columns. Returns the primary key
+        """
+        key = db.inspect(model).primary_key[0].key
+        if key not in row:
+            row[key] = self.next_id(model)
+        self.pending.setdefault(model, []).append(row)
+
+        kind = self.ledger.get(model)
+        if kind:
+            stamp = row['date_created']
+            rollup = self.rollups.setdefault((kind, stamp.year, stamp.month), [0, 0])
+            rollup[0] += 1
+            rollup[1] += row['amount']
+
+        if len(self.pending[model]) >= self.batch:
+            self.flush()
+        return row[key]
+
+    def flush(self):
+        """Writes and commits the buffered rows together with their ledger rollups"""
+        connection = db.session.connection()
+        flushed = []
+        for model in self.tables:
+            rows = self.pending.pop(model, None)
+            if rows:
+                connection.execute(model.__table__.insert(), rows)
+                name = model.__tablename__
+                self.written[name] = self.written.get(name, 0) + len(rows)
+                flushed.append(model)
+
+        #the IDs were assigned here, so later ORM inserts need the sequences moved past them
+        reset_sequences(connection, flushed)
+
+        if self.record_rollups:
+            record_rollups(connection, self.rollups)
+            self.rollups = dict()
+
+        db.session.commit()
+        print(f"Bulk generation wrote {sum(self.written.values())} records...")
+
+    def month_start(self, index):
+        """Returns the first day of month index of the seeded period"""
+        number = self.first.month - 1 + index
+        return datetime(self.first.year + number // 12, number % 12 + 1, 1)
+
+    def stamp(self, index):
+        """Returns a random time within month index of the seeded period"""
+        stamp = self.month_start(index) + timedelta(days = randint(0, 27),
+                seconds = randint(0, 86399))
+        return min(stamp, self.now)
+
+    def prepare(self, months):
+        """
+        prepare(months)
+            Makes sure the reference records the histories point at exist: loan types,
+            employers, occupations and a month record for each of the last months up to
+            self.now
+        """
+        number = self.now.year * 12 + self.now.month - months
+        self.first = datetime(number // 12, number % 12 + 1, 1)
+        self.months = months
+
+        if not loan_type.query.count():
+            for item in loan_types:
+                self.generate_loan_type(item)
+        for i in range(10 - employer.query.count()):
+            self.generate_employer()
+        for i in range(10 - occupation.query.count()):
+            self.generate_occupation()
+
+        self.loan_types = [loan_terms(*item) for item in db.session.query(
+            loan_type.loan_type_id, loan_type.multiplier, loan_type.max_period,
+            loan_type.rate)]
+        self.employers = [item[0] for item in db.session.query(employer.employer_id)]
+        self.occupations = [item[0] for item in db.session.query(occupation.occupation_id)]
+
+        existing = dict(db.session.query(month.description, month.month_id))
+        self.month_ids = []
+        for index in range(months):
+            description = self.month_generator(self.month_start(index))
+            if description not in existing:
+                existing[description] = self.add(month, description = description)
+            self.month_ids.append(existing[description])
+        self.flush()
+
+    def reference(self):
+        """Returns the reference records set by prepare() for another BulkGenerator"""
+        return {name : getattr(self, name) for name in self.references}
+
+    def use_reference(self, reference):
+        """Points the histories at the reference records prepared by another BulkGenerator"""
+        for name in self.references:
+            setattr(self, name, reference[name])
+
+    def generate_group_record(self, index):
+        """Buffers a group joined in month index; returns its ID"""
+        fake_time = self.stamp(index)
+        group_id = self.next_id(group)
+        return self.add(group,
+                group_id = group_id,
+                name = f"{self.fake.company()} {group_id}",
+                email_address = f"group{group_id}@{self.fake.free_email_domain()}",
+                phone_no = "01" + f"{group_id:08d}",
+                location_address = self.fake.address(),
+                date_created = fake_time,
+                last_updated = fake_time)
+
+    def generate_member_history(self, group_id = None, payment_rate = 0.9, loans = 1):
+        """
+        generate_member_history(group_id, payment_rate, loans)
+            Buffers a member joining during the first half of the period together with
+            their registration fee, phone number, employment, monthly deposits, deposit
+            overdues, loans, installments and loan overdues up to the current month
+            group_id is the group the member belongs to
+            payment_rate is the chance that the member deposits in a given month
+            loans is the maximum number of loans the member takes, one at a time
+        """
+        joined = randint(0, max(self.months // 2 - 1, 0))
+        fake_time = self.stamp(joined)
+        member_id = self.next_id(member)
+
+        first_name = self.fake.first_name()
+        last_name = self.fake.last_name()
+        fake_date = self.fake.date_of_birth(minimum_age = 25, maximum_age = 45)
+        self.add(member,
+                member_id = member_id,
+                first_name = first_name,
+                middle_name = self.fake.last_name(),
+                last_name = last_name,
+                email_address = f"{first_name}.{last_name}.{member_id}@"\
+                        f"{self.fake.free_email_domain()}".lower(),
+                location_address = self.fake.address() + "\n" + self.fake.city(),
+                id_no = 500000000 + member_id,
+                date_of_birth = fake_date,
+                gender = "male" if randint(1, 11) % 2 == 0 else "female",
+                nationality = "Canada",
+                status = "activated",
+                group_id = group_id,
+                date_created = fake_time,
+                last_updated = fake_time)
+
+        #registration fee in one or two payments
+        amount = randint(15, 20) * 100
+        for fee in (amount, self.maximum_registration_fee - amount):
+            if fee:
+                self.add(registration_fee, amount = fee, member_id = member_id,
+                        date_created = fake_time, last_updated = fake_time)
+
+        self.add(phone_number, member_id = member_id, phone_no = "07" + f"{member_id:08d}",
+                date_created = fake_time, last_updated = fake_time)
+        self.add(employment, member_id = member_id,
+                employer_id = self.employers[randint(0, len(self.employers) - 1)],
+                occupation_id = self.occupations[randint(0, len(self.occupations) - 1)],
+                status = "active", date_created = fake_time, last_updated = fake_time)
+
+        #deposits[index] is the running total deposited by the end of month index
+        limit = int(flask.current_app.config['DEPOSIT_OVERDUE'])
+        deposits = []
+        total = 0
+        for index in range(joined, self.months):
+            fake_time = self.stamp(index)
+            if randint(1, 1000) <= payment_rate * 1000:
+                amount = randint(50, 100) * 100
+                total += amount
+                self.add(monthly_deposit, amount = amount, member_id = member_id,
+                        month_id = self.month_ids[index], date_created = fake_time,
+                        last_updated = fake_time)
+
+            elif index < self.months - 1:
+                #a missed month is charged the next month and sometimes paid later on
+                charged = self.stamp(index + 1)
+                paid = randint(1, 2) == 1
+                overdue_id = self.add(monthly_deposit_overdue, amount = limit,
+                        member_id = member_id, month_id = self.month_ids[index],
+                        status = "paid" if paid else "pending", date_created = charged,
+                        last_updated = charged)
+                if paid:
+                    self.add(deposit_overdue_payment, amount = limit,
+                            monthly_deposit_overdue_id = overdue_id,
+                            date_created = charged, last_updated = charged)
+            deposits.append(total)
+
+        index = joined + 3
+        while loans and index < self.months and deposits[index - joined - 1]:
+            index = self.generate_loan_history(member_id, index,
+                    deposits[index - joined - 1])
+            loans -= 1
+
+    def generate_loan_history(self, member_id, index, deposits):
+        """
+        generate_loan_history(member_id, index, deposits)
+            Buffers a loan taken in month index against deposits, its monthly installments
+            and, past the loan type's period, an overdue charge
+            Returns the month after the loan was paid off, or the period's end
+        """
+        Loan_Type = self.loan_types[randint(0, len(self.loan_types) - 1)]
+        amount = int((deposits / 2.0) * Loan_Type.multiplier)
+        interest = loan_type.interest_on(amount, Loan_Type.rate, Loan_Type.max_period)
+        fake_time = self.stamp(index)
+
+        #installments are planned first so that the loan is written with its balances
+        installments = []
+        paid = 0
+        while index + 1 < self.months and paid < amount + interest:
+            index += 1
+            payment = min(randint(1, 200) * 100, amount + interest - paid)
+            installments.append((payment, self.stamp(index)))
+            paid += payment
+
+        #a loan still unpaid past the loan type's period is charged once
+        charge = None
+        due = fake_time + timedelta(days = Loan_Type.max_period * 365)
+        if paid < amount + interest and due < self.now:
+            charge = int((10/100) * amount)
+
+        loan_id = self.add(loan,
+                loan_type = Loan_Type.loan_type_id,
+                amount = amount,
+                member_id = member_id,
+                status = "Paid" if paid == amount + interest else "pending",
+                interest = interest,
+                amount_paid = paid,
+                overdue_charged = charge or 0,
+                overdue_paid = 0,
+                outstanding = amount + interest + (charge or 0) - paid,
+                date_created = fake_time,
+                last_updated = installments[-1][1] if installments else fake_time)
+
+        for payment, stamp in installments:
+            self.add(installment, amount = payment, loan_id = loan_id,
+                    date_created = stamp, last_updated = stamp)
+
+        if charge:
+            stamp = due
+            self.add(loan_overdue, amount = charge, loan_id = loan_id,
+                    month = self.month_generator(stamp), status = "pending",
+                    date_created = stamp, last_updated = stamp)
+        return index + 1
+
+    def populate(self, members = 1000, months = 60, group_size = 8, payment_rate = 0.9,
+            loans = 1):
+        """
+        populate(members, months, group_size, payment_rate, loans)
+            Seeds the histories of members new members over the last months months
+            group_size is the number of members per group, 0 leaves members without groups
+            payment_rate is the chance that a member deposits in a given month
+            loans is the maximum number of loans taken by a member
+            Returns {table name : records written}
+        """
+        self.prepare(months)
+        self.generate_histories(members, group_size, payment_rate, loans)
+
+        invalidate_year_summaries()
+        kpi_cache.invalidate()
+        return self.written
+
+    def generate_histories(self, members, group_size = 8, payment_rate = 0.9, loans = 1):
+        """
+        generate_histories(members, group_size, payment_rate, loans)
+            Seeds the histories of members new members against the prepared references
+        """
+        group_id = None
+        for number in range(members):
+            if group_size and number % group_size == 0:
+                group_id = self.generate_group_record(randint(0, self.months // 2))
+            self.generate_member_history(group_id, payment_rate, loans)
+        self.flush()
+
+
+def reset_sequences(connection, tables):
+    """
+    reset_sequences(connection, tables)
+        Moves the primary key sequences of tables past their highest IDs once rows were
+        written with IDs assigned client-side. Only PostgreSQL needs it: SQLite and
+        MySQL take the next ID from the highest one in the table
+    """
+    if connection.dialect.name != 'postgresql':
+        return
+
+    for model in tables:
+        table = model.__tablename__
+        key = db.inspect(model).primary_key[0].name
+        connection.execute(f"SELECT setval(pg_get_serial_sequence('\"{table}\"', '{key}'), "
+                f'COALESCE(MAX("{key}"), 1), MAX("{key}") IS NOT NULL) FROM "{table}"')
+
+
+def record_rollups(connection, rollups):
+    """Records {(kind, year, month) : [count, total]} rollups in the ledger"""
+    for (kind, year, month_number), (count, total) in rollups.items():
+        ledger_rollup.record(connection, kind, datetime(year, month_number, 1), total, count)
+
+
+def partition_strides(members, months, loans):
+    """
+    partition_strides(members, months, loans)
+        Returns {model : number of IDs reserved per partition} for partitions of members
+        members, bounding the records a member history can write to each table
+    """
+    bounds = {group : 1, member : 1, registration_fee : 2, phone_number : 1,
+            employment : 1, monthly_deposit : months, monthly_deposit_overdue : months,
+            deposit_overdue_payment : months, loan : loans, installment : months,
+            loan_overdue : loans}
+    return {model : members * bound for model, bound in bounds.items()}
+
+
+def seed_partition(task):
+    """
+    seed_partition(task)
+        Process pool worker seeding one partition of a partitioned generation, described
+        by the dictionary task; the histories are written to task['database'] with IDs
+        from task['keys'] and their ledger rollups are returned for the parent to record
+        Returns (records written by table name, rollups)
+    """
+    app = create_app(task['config'])
+    app.config['SQLALCHEMY_DATABASE_URI'] = task['database']
+
+    with app.app_context():
+        if task['shard']:
+            db.create_all()
+
+        generator = BulkGenerator(batch = task['batch'], rollups = False,
+                seed = task['seed'], now = task['now'])
+        generator.use_reference(task['reference'])
+        generator.keys = {model : task['keys'][model.__tablename__]
+                for model in BulkGenerator.tables if model.__tablename__ in task['keys']}
+
+        generator.generate_histories(task['members'], task['group_size'],
+                task['payment_rate'], task['loans'])
+        db.session.remove()
+    return generator.written, generator.rollups
+
+
+def merge_shard(path, tables):
+    """
+    merge_shard(path, tables)
+        Copies the rows of tables from the SQLite shard at path into the application's
+        SQLite database in one transaction
+    """
+    with db.engine.connect() as connection:
+        connection.execute("ATTACH DATABASE ? AS shard", path)
+        try:
+            with connection.begin():
+                for model in tables:
+                    columns = ", ".join(f'"{column.name}"' for column in model.__table__.c)
+                    connection.execute(f'INSERT INTO main."{model.__tablename__}" '
+                            f'({columns}) SELECT {columns} FROM shard."{model.__tablename__}"')
+        finally:
+            connection.execute("DETACH DATABASE shard")
+
+
+def populate_partitioned(config_name, members = 1000, workers = 4, months = 60,
+        group_size = 8, payment_rate = 0.9, loans = 1, batch = 5000, seed = None,
+        now = None):
+    """
+    populate_partitioned(config_name, members, workers, months, group_size, payment_rate,
+            loans, batch, seed, now)
+        Seeds the histories of members new members across a pool of workers processes,
+        like BulkGenerator.populate(). Members are split into one partition per worker,
+        each with its own seed and its own range of IDs in every table. On SQLite every
+        worker writes a shard database that is merged into the application's database
+        afterwards; other databases take the batched inserts of all workers directly.
+        config_name is the configuration the workers create their application with
+        seed and now are those of a BulkGenerator; every worker's history ends at the
+        same now, so a seed and number of workers always generate the same records
+        Returns {table name : records written}
+    """
+    generator = BulkGenerator(batch = batch, seed = seed, now = now)
+    generator.prepare(months)
+
+    uri = flask.current_app.config['SQLALCHEMY_DATABASE_URI']
+    shard = db.engine.url.get_backend_name() == 'sqlite'
+    folder = tempfile.mkdtemp() if shard else None
+
+    #partitions hold whole groups so that they add up to the groups of a single run
+    unit = group_size or 1
+    units = -(-members // unit)
+    counts = []
+    for partition in range(workers):
+        count = unit * (units // workers + (1 if partition < units % workers else 0))
+        counts.append(min(count, members - sum(counts)))
+
+    #IDs of partition p start after the table's highest ID plus p strides
+    strides = partition_strides(max(counts), months, loans)
+    first = {model : generator.next_id(model) - 1 for model in strides}
+
+    tasks = []
+    for partition, count in enumerate(counts):
+        if not count:
+            continue
+        path = os.path.join(folder, f'partition-{partition}.sqlite') if shard else None
+        tasks.append({
+            'config' : config_name,
+            'database' : 'sqlite:///' + path if shard else uri,
+            'shard' : path,
+            'members' : count,
+            'keys' : {model.__tablename__ : first[model] + partition * strides[model]
+                for model in strides},
+            'reference' : generator.reference(),
+            'seed' : None if seed is None else f'{seed}:{partition}',
+            'now' : generator.now,
+            'group_size' : group_size,
+            'payment_rate' : payment_rate,
+            'loans' : loans,
+            'batch' : batch
+            })
+
+    #workers are spawned rather than forked so they never share the parent's connections
+    db.session.commit()
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers = workers, mp_context = context) as pool:
+        results = list(pool.map(seed_partition, tasks))
+
+    written = dict(generator.written)
+    for task, (counts, rollups) in zip(tasks, results):
+        if task['shard']:
+            merge_shard(task['shard'], [model for model in BulkGenerator.tables
+                if model.__tablename__ in counts])
+            os.remove(task['shard'])
+        for name, count in counts.items():
+            written[name] = written.get(name, 0) + count
+        record_rollups(db.session.connection(), rollups)
+        db.session.commit()
+
+    #the partitions' IDs were assigned client-side and, on SQLite, merged from the shards
+    reset_sequences(db.session.connection(), BulkGenerator.tables)
+    db.session.commit()
+
+    if folder:
+        os.rmdir(folder)
+    invalidate_year_summaries()
+    kpi_cache.invalidate()
+    return written
+
+
 class App:
     def __init__(self, reviews = {}, document_types = [], loan_types = []):
         self.generator = Generator(locale = "en_CA")
@@ -964,48 +1450,52 @@ class App:
             count += 1
             multiplier += 1
 
+#reference records created when the system is initialised
+document_types = ['Passport', 'National ID Card', 'Military ID Card',
+        'Birth Certificate', 'Driver License']
+
+loan_types = [
+        {
+            'description' : 'Individual Loan',
+            'rate' : 1.2,
+            'max_period' : 3,
+            'multiplier' : 3,
+            'overdue_penalty' : 10
+        },
+        {
+            'description' : 'Group Member Loan',
+            'rate' : 1,
+            'max_period' : 4,
+            'multiplier' : 4,
+            'overdue_penalty' : 10
+        },
+        {
+            'description' : 'Group Loan',
+            'rate' : 0.8,
+            'max_period' : 5,
+            'multiplier' : 3,
+            'overdue_penalty' : 10
+            }
+        ]
+
+reviews = {
+        34 :
+        """I have gained financial stability, thanks to the low interest rate loans
+        offered by the organization. All I can say is 'asante'.""",
+        78 :
+        """Being a member has benefited me greatly. I have been able to
+        establish my self financially. Nevertheless, I have been able to invest in
+        real estate, thanks to this organization.""",
+        77 :
+        """
+        Top notch staff, reputable hospitality alongside affordable financial aids is
+        all I needed to attain financial growth. To all non-members, I urge you to
+        take a step towards growth and development by becoming a member.
+        """
+}
+
+
 def stage_one(start = False):
-    document_types = ['Passport', 'National ID Card', 'Military ID Card',
-            'Birth Certificate', 'Driver License']
-
-    loan_types = [
-            {
-                'description' : 'Individual Loan',
-                'rate' : 1.2,
-                'max_period' : 3,
-                'multiplier' : 3,
-                'overdue_penalty' : 10
-            },
-            {
-                'description' : 'Group Member Loan',
-                'rate' : 1,
-                'max_period' : 4,
-                'multiplier' : 4,
-                'overdue_penalty' : 10
-            },
-            {
-                'description' : 'Group Loan',
-                'rate' : 0.8,
-                'max_period' : 5,
-                'multiplier' : 3,
-                'overdue_penalty' : 10
-                }
-            ]
-    reviews = {
-            34 :
-            """I have gained financial stability, thanks to the low interest rate loans
-            offered by the organization. All I can say is 'asante'.""",
-            78 :
-            """Being a member has benefited me greatly. I have been able to
-            establish my self financially. Nevertheless, I have been able to invest in
-            real estate, thanks to this organization.""",
-            77 :
-            """
-            Top notch staff, reputable hospitality alongside affordable financial aids is
-            all I needed to attain financial growth. To all non-members, I urge you to
-            take a step towards growth and development by becoming a member.
-            """
-    }
     app = App(reviews = reviews, document_types = document_types, loan_types = loan_types)
 
     # start from where we left
@@ -1016,6 +1506,110 @@ def stage_one(start = False):
         app.initialize_system()
 
 
+#dataset profiles of known size for performance tests and benchmarks
+#groups is the number of groups members are spread over; payment_rate is the chance
+#that a member deposits in a given month
+profiles = {
+        'small' : {
+            'members' : 250,
+            'groups' : 25,
+            'months' : 24,
+            'loans' : 1,
+            'payment_rate' : 0.95
+        },
+        'medium' : {
+            'members' : 2500,
+            'groups' : 250,
+            'months' : 36,
+            'loans' : 2,
+            'payment_rate' : 0.9
+        },
+        'large' : {
+            'members' : 10000,
+            'groups' : 1000,
+            'months' : 60,
+            'loans' : 2,
+            'payment_rate' : 0.9
+        },
+        'xl' : {
+            'members' : 50000,
+            'groups' : 5000,
+            'months' : 60,
+            'loans' : 3,
+            'payment_rate' : 0.85
+            }
+        }
+
+
+def table_counts():
+    """Returns {table name : number of records} of every table of the application"""
+    return {table.name : db.session.query(func.count()).select_from(table).scalar()
+            for table in db.metadata.sorted_tables}
+
+
+def manifest_path(name):
+    """Returns where the manifest of profile name goes: beside a SQLite database file"""
+    database = db.engine.url.database
+    if db.engine.url.get_backend_name() == 'sqlite' and database:
+        return database + '.manifest.json'
+    return os.path.abspath(f'{name}-dataset.manifest.json')
+
+
+def generate_profile(name, config_name = None, workers = 1, seed = 1, manifest = None):
+    """
+    generate_profile(name, config_name, workers, seed, manifest)
+        Generates dataset profile name into the application's database to completion,
+        alongside the reference records stage_one() creates, then writes a JSON manifest
+        of the profile, its parameters and the row count of every table. The history
+        ends at seeded_now, so a profile and seed always generate the same records.
+        config_name is required with workers above 1, see populate_partitioned()
+        manifest is the path of the manifest, by default manifest_path(name)
+        Returns the manifest
+    """
+    path = manifest or manifest_path(name)
+    settings = profiles[name]
+    group_size = -(-settings['members'] // settings['groups']) if settings['groups'] else 0
+    started = time.perf_counter()
+
+    role.insert_roles()
+    generator = BulkGenerator(seed = seed)
+    if not branch.query.count():
+        generator.generate_branch()
+    if not document_type.query.count():
+        for item in document_types:
+            generator.generate_document_type(item)
+
+    arguments = dict(members = settings['members'], months = settings['months'],
+            group_size = group_size, payment_rate = settings['payment_rate'],
+            loans = settings['loans'])
+    if workers > 1:
+        populate_partitioned(config_name, workers = workers, seed = seed,
+                now = generator.now, **arguments)
+    else:
+        generator.populate(**arguments)
+
+    for key in reviews.keys():
+        if member.query.get(key):
+            generator.generate_review(key, reviews)
+
+    manifest = {
+            'profile' : name,
+            'parameters' : settings,
+            'seed' : seed,
+            'now' : generator.now.isoformat(),
+            'workers' : workers,
+            'database' : db.engine.url.__to_string__(hide_password = True),
+            'generated_at' : datetime.utcnow().isoformat(),
+            'seconds' : round(time.perf_counter() - started, 1),
+            'counts' : table_counts()
+            }
+
+    with open(path, 'w') as file:
+        json.dump(manifest, file, indent = 4)
+    print(f"Generation of {name} dataset successful, manifest written to {path}...")
+    return manifest
+
+
 if __name__ == '__main__':
     print("Run script from shell via $flask shell command")
 
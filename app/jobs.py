@@ -0,0 +1,161 @@
+import json, threading, time
+from datetime import datetime, timedelta
+
+import flask
+from sqlalchemy.exc import DBAPIError
+from . import db
+from .models import job
+
+#job handlers keyed by job kind; registered with @job_handler
+handlers = dict()
+
+worker = None
+worker_lock = threading.Lock()
+
+
+def job_handler(kind):
+    """
+    job_handler(kind)
+        Registers the decorated generator function as the handler of jobs of kind.
+        The handler is called as handler(Job, **arguments), may set Job.total and must
+        yield (cursor, rows affected) after every batch without committing; the runner
+        commits each batch together with the job's progress so that an interrupted job
+        resumes from Job.cursor without repeating work.
+    """
+    def decorator(f):
+        handlers[kind] = f
+        return f
+    return decorator
+
+
+def enqueue(kind, user_id = None, inline = None, **arguments):
+    """
+    enqueue(kind, **arguments)
+        Queues a job of kind and makes sure a worker is there to run it
+        inline runs the job in the calling thread instead; defaults to JOBS_INLINE
+        Returns the queued job
+    """
+    if kind not in handlers:
+        raise ValueError(f'No handler registered for {kind} jobs')
+
+    Job = job(kind = kind, arguments = json.dumps(arguments), user_id = user_id)
+    db.session.add(Job)
+    db.session.commit()
+
+    app = flask.current_app._get_current_object()
+    if app.config['JOBS_INLINE'] if inline is None else inline:
+        run_job(Job)
+    else:
+        start_worker(app)
+
+    return Job
+
+
+def runnable_jobs():
+    """Filter matching queued jobs and running jobs whose worker stopped updating them"""
+    stale = datetime.utcnow() - timedelta(seconds = flask.current_app.config['JOB_TIMEOUT'])
+    return db.or_(job.status == 'queued',
+            db.and_(job.status == 'running', job.last_updated < stale))
+
+
+def claim_job():
+    """
+    Marks the oldest runnable job as running and returns it, otherwise None.
+    The claim is a conditional UPDATE so that workers of several processes never pick
+    the same job.
+    """
+    candidates = [item.job_id for item in job.query.filter(runnable_jobs())\
+            .order_by(job.job_id.asc()).limit(5).all()]
+
+    for job_id in candidates:
+        claimed = job.query.filter(job.job_id == job_id, runnable_jobs()).update(
+                {'status' : 'running', 'last_updated' : datetime.utcnow()},
+                synchronize_session = False)
+        db.session.commit()
+
+        if claimed:
+            return job.query.get(job_id)
+    return None
+
+
+def describe(exc):
+    """Returns the one line description of exc shown to users; tracebacks are logged"""
+    if isinstance(exc, DBAPIError) and exc.orig is not None:
+        exc = exc.orig
+    message = str(exc).splitlines()[0] if str(exc) else ''
+    return f'{type(exc).__name__}: {message}'[:200]
+
+
+def run_job(Job):
+    """Runs Job batch by batch, committing its progress after every batch"""
+    arguments = json.loads(Job.arguments)
+    Job.status = 'running'
+
+    try:
+        for cursor, rows in handlers[Job.kind](Job, **arguments):
+            Job.cursor = cursor
+            Job.rows += rows
+            Job.progress += 1
+
+            db.session.add(Job)
+            db.session.commit()
+
+        Job.status = 'completed'
+        Job.error = None
+    except Exception as exc:
+        db.session.rollback()
+        flask.current_app.logger.exception('Job %s (%s) failed', Job.job_id, Job.kind)
+        Job.status = 'failed'
+        Job.error = describe(exc)
+
+    db.session.add(Job)
+    db.session.commit()
+    return Job
+
+
+def work(app, poll = None):
+    """
+    work(app, poll)
+        Runs runnable jobs one after another until none is left
+        poll is the number of seconds to wait for new jobs instead of returning
+    """
+    with app.app_context():
+        try:
+            while True:
+                Job = claim_job()
+                if Job is None and poll:
+                    time.sleep(poll)
+                    continue
+
+                Job = Job or retire()
+                if Job is None:
+                    break
+                run_job(Job)
+        finally:
+            db.session.remove()
+
+
+def retire():
+    """
+    Claims a job queued while the worker found the queue empty, otherwise unregisters
+    the worker so that the next start_worker() starts a new one instead of relying on a
+    thread that is about to exit
+    Returns the claimed job or None
+    """
+    global worker
+
+    with worker_lock:
+        Job = claim_job()
+        if Job is None and worker is threading.current_thread():
+            worker = None
+        return Job
+
+
+def start_worker(app):
+    """Starts a background worker thread for app unless one is already running"""
+    global worker
+
+    with worker_lock:
+        if worker is None or not worker.is_alive():
+            worker = threading.Thread(target = work, args = (app,), daemon = True)
+            worker.start()
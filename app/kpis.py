@@ -0,0 +1,215 @@
+import json, os, tempfile, threading, time
+from decimal import Decimal
+
+import flask
+from . import db
+
+#KPI builders keyed by name; registered with @kpi
+builders = dict()
+
+scheduler = None
+scheduler_lock = threading.Lock()
+
+
+def kpi(name):
+    """
+    kpi(name)
+        Registers the decorated function as the builder of the KPI payload name.
+        The builder runs inside an app context and must return JSON serialisable data.
+    """
+    def decorator(f):
+        builders[name] = f
+        return f
+    return decorator
+
+
+def encode(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+class KPICache:
+    """
+    class KPICache
+        Precomputed KPI payloads served stale-while-revalidate: a payload older than
+        KPI_REFRESH_INTERVAL seconds, or marked stale by a new transaction, is still
+        returned at once while a background thread recomputes it, so a request only
+        waits for the aggregate queries when the KPI was never computed.
+
+        With KPI_CACHE_PATH set, payloads are also written there as JSON files whose
+        modification time is the time they were computed, so that the processes of a
+        multi-worker deployment share one copy; marking a KPI stale zeroes that time.
+        Without it the cache is per process: a KPI marked stale in one gunicorn worker
+        stays fresh in the others until KPI_REFRESH_INTERVAL has passed.
+    """
+    def __init__(self):
+        self.entries = dict()
+        self.stale = set()
+        self.refreshing = set()
+        self.lock = threading.Lock()
+
+    def filename(self, name):
+        folder = flask.current_app.config['KPI_CACHE_PATH']
+        if not folder:
+            return None
+        return os.path.join(folder, name.replace(' ', '_') + '.json')
+
+    def stamp(self, name):
+        """Returns the time the shared copy of name was computed, 0 if stale, else None"""
+        filename = self.filename(name)
+        try:
+            return os.stat(filename).st_mtime if filename else None
+        except OSError:
+            return None
+
+    def load(self, name):
+        try:
+            with open(self.filename(name)) as source:
+                return json.load(source)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, name, payload, computed):
+        filename = self.filename(name)
+        if filename is None:
+            return
+
+        #written aside then renamed so that readers never see half a file
+        os.makedirs(os.path.dirname(filename), exist_ok = True)
+        handle, temporary = tempfile.mkstemp(dir = os.path.dirname(filename))
+        with os.fdopen(handle, 'w') as target:
+            json.dump(payload, target, default = encode)
+        os.utime(temporary, (computed, computed))
+        os.replace(temporary, filename)
+
+    def get(self, name):
+        """
+        get(name)
+            Returns the payload of KPI name, revalidating it in the background when stale
+        """
+        with self.lock:
+            entry = self.entries.get(name)
+
+        stamp = self.stamp(name)
+        if stamp is not None and (entry is None or stamp > entry[1]):
+            payload = self.load(name)
+            if payload is not None:
+                entry = (payload, stamp)
+                with self.lock:
+                    self.entries[name] = entry
+
+        if entry is None:
+            return self.refresh(name)
+
+        interval = flask.current_app.config['KPI_REFRESH_INTERVAL']
+        if name in self.stale or stamp == 0 or time.time() - entry[1] > interval:
+            self.revalidate(name)
+        start_scheduler(flask.current_app._get_current_object())
+        return entry[0]
+
+    def computed_at(self, name):
+        """Returns the time the cached payload of name was computed, otherwise None"""
+        entry = self.entries.get(name)
+        return entry[1] if entry else None
+
+    def refresh(self, name):
+        """Recomputes KPI name now and returns its payload"""
+        #transactions landing while the payload is computed mark it stale again
+        with self.lock:
+            self.stale.discard(name)
+
+        computed = time.time()
+        payload = json.loads(json.dumps(builders[name](), default = encode))
+
+        with self.lock:
+            self.entries[name] = (payload, computed)
+        self.save(name, payload, computed)
+        return payload
+
+    def revalidate(self, name):
+        """Recomputes KPI name in a background thread unless that is already under way"""
+        app = flask.current_app._get_current_object()
+        if app.config['KPI_REFRESH_INLINE']:
+            self.refresh(name)
+            return
+
+        with self.lock:
+            if name in self.refreshing:
+                return
+            self.refreshing.add(name)
+
+        def run():
+            try:
+                with app.app_context():
+                    try:
+                        self.refresh(name)
+                    finally:
+                        db.session.remove()
+            finally:
+                with self.lock:
+                    self.refreshing.discard(name)
+
+        threading.Thread(target = run, daemon = True).start()
+
+    def invalidate(self, name = None):
+        """Marks KPI name, or every KPI when name is None, stale in every process"""
+        names = list(builders) if name is None else [name]
+        with self.lock:
+            self.stale.update(names)
+
+        if not flask.has_app_context():
+            return
+        for item in names:
+            filename = self.filename(item)
+            if filename and os.path.exists(filename):
+                try:
+                    os.utime(filename, (0, 0))
+                except OSError:
+                    pass
+
+    def clear(self):
+        """Forgets every payload held by this process e.g., when switching databases"""
+        with self.lock:
+            self.entries.clear()
+            self.stale.clear()
+
+kpi_cache = KPICache()
+
+
+def refresh_due(app):
+    """Refreshes the KPIs of app whose payloads are older than the refresh interval"""
+    with app.app_context():
+        try:
+            interval = app.config['KPI_REFRESH_INTERVAL']
+            for name in builders:
+                stamp = kpi_cache.stamp(name)
+                if stamp is None:
+                    stamp = kpi_cache.computed_at(name) or 0
+
+                #another worker sharing KPI_CACHE_PATH may have refreshed it already
+                if name in kpi_cache.stale or time.time() - stamp >= interval:
+                    kpi_cache.refresh(name)
+        finally:
+            db.session.remove()
+
+
+def start_scheduler(app):
+    """Starts the thread refreshing the KPIs of app every KPI_REFRESH_INTERVAL seconds"""
+    global scheduler
+
+    if app.config['KPI_REFRESH_INLINE']:
+        return
+
+    with scheduler_lock:
+        if scheduler is None or not scheduler.is_alive():
+            def run():
+                while True:
+                    time.sleep(app.config['KPI_REFRESH_INTERVAL'])
+                    try:
+                        refresh_due(app)
+                    except Exception:
+                        app.logger.exception('KPI refresh failed')
+
+            scheduler = threading.Thread(target = run, daemon = True)
+            scheduler.start()
@@ -1,15 +1,52 @@
-import flask
+import flask, hashlib
 from flask_login import UserMixin, AnonymousUserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from itsdangerous import TimedJSONWebSignatureSerializer as serializer
 from datetime import datetime
+from types import MappingProxyType
+from sqlalchemy import event as sa_event
+from sqlalchemy.exc import IntegrityError
 
 from . import db, login_manager
+from .cache import TimedCache, after_commit
+
+#user_id -> (password hash version, detached user) of recently authenticated users. The
+#cache is per process: a password change, deactivation or role change made through one
+#gunicorn worker only reaches the others when their copy expires after
+#USER_CACHE_TIMEOUT seconds (30 by default)
+principal_cache = TimedCache(maxsize = 1024)
 
 #register load_user to be called when info about logged in user is required
 @login_manager.user_loader
 def load_user(user_id):
-    return user.query.get(int(user_id))
+    """
+    load_user(user_id)
+        user_id is the '<id>.<password version>' string returned by user.get_id
+        Loads the user together with their role in one query and keeps a detached copy
+        for USER_CACHE_TIMEOUT seconds; sessions issued before a password change no
+        longer match the version and are logged out. Sessions holding a bare '<id>', as
+        issued before ids carried the version, are accepted without the check.
+    """
+    user_id, _, version = str(user_id).partition('.')
+    user_id = int(user_id)
+
+    cached = principal_cache.get(user_id)
+    if cached is None:
+        User = user.query.options(db.joinedload(user.role))\
+                .filter(user.id == user_id).first()
+        if User is None:
+            return None
+
+        cached = (User.password_version(), User)
+        db.session.expunge(User)
+        principal_cache.set(user_id, cached, 
+                flask.current_app.config['USER_CACHE_TIMEOUT'])
+
+    if version and version != cached[0]:
+        return None
+
+    #attach a copy to this request's session without querying the database
+    return db.session.merge(cached[1], load = False)
 
 
 class Permission:
@@ -22,6 +59,10 @@ class Permission:
     ADMIN = 64
 
 
+#role_id -> permissions table shared by all requests of this process
+permission_cache = TimedCache()
+
+
 class role(db.Model):
     __tablename__ = 'role'
 
@@ -67,6 +108,28 @@ class role(db.Model):
             Role.default = (Role.name == default_role)
             db.session.add(Role)
         db.session.commit()
+        role.invalidate_permissions()
+
+    @staticmethod
+    def permission_table():
+        """
+        permission_table()
+            Returns a read-only mapping of role_id to permissions loaded with one query
+            and shared across requests until a role changes or PERMISSION_CACHE_TIMEOUT
+            elapses (which bounds staleness when another process edits roles)
+        """
+        def build():
+            rows = db.session.query(role.role_id, role.permissions).all()
+            return MappingProxyType({role_id : permissions or 0 
+                for role_id, permissions in rows})
+
+        return permission_cache.get_or_set('roles', build,
+                flask.current_app.config['PERMISSION_CACHE_TIMEOUT'])
+
+    @staticmethod
+    def invalidate_permissions(*args):
+        permission_cache.invalidate('roles')
+        principal_cache.invalidate()
 
     def add_permission(self, perm):
         if not self.has_permission(perm):
@@ -82,6 +145,11 @@ class role(db.Model):
     def has_permission(self, perm):
         return self.permissions & perm == perm
 
+
+#drop the shared permission table whenever a role is edited
+for action in ('after_insert', 'after_update', 'after_delete'):
+    sa_event.listen(role, action, role.invalidate_permissions)
+
             
 class anonymous_user(AnonymousUserMixin):
     def can(self, permission):
@@ -131,12 +199,31 @@ class user(UserMixin, db.Model):
                 self.role_id = Role.role_id
 
     def can(self, perm):
-        Role = role.query.filter_by(role_id = self.role_id).first()
+        if self.role_id is None:
+            return False
 
-        return self.role_id is not None and Role.has_permission(perm)
+        #memoise permissions for the rest of the request
+        memo = flask.g.setdefault('permissions', dict())
+        if self.role_id not in memo:
+            memo[self.role_id] = role.permission_table().get(self.role_id, 0)
+
+        return memo[self.role_id] & perm == perm
 
     def is_administrator(self):
         return self.can(Permission.ADMIN)
+
+    def get_id(self):
+        """
+        get_id()
+            Returns '<id>.<password version>', the identifier Flask-Login keeps in the
+            session and remember cookie. Changing its format, or password_version's,
+            logs out every session on the next deploy.
+        """
+        return f'{self.id}.{self.password_version()}'
+
+    def password_version(self):
+        """Short fingerprint of the password hash; changes whenever the password does"""
+        return hashlib.sha1((self.password_hash or '').encode('utf-8')).hexdigest()[:12]
     
     @property
     def password(self):
@@ -169,6 +256,14 @@ class user(UserMixin, db.Model):
         return True
 
 
+def invalidate_principal(mapper, connection, target):
+    after_commit(target, principal_cache.invalidate, target.id)
+
+#profile edits, status changes and password changes reload the cached user
+for action in ('after_update', 'after_delete'):
+    sa_event.listen(user, action, invalidate_principal)
+
+
 class member(db.Model):
     __tablename__ = "member"
     member_id = db.Column(db.Integer, primary_key = True, nullable = False)
@@ -193,7 +288,7 @@ class member(db.Model):
             onupdate = datetime.utcnow)
 
     #relationships
-    group_id = db.Column(db.Integer, db.ForeignKey('group.group_id'))
+    group_id = db.Column(db.Integer, db.ForeignKey('group.group_id'), index = True)
 
     documents = db.relationship('document', backref = 'owner', lazy = 'dynamic')
     deposits = db.relationship('monthly_deposit', backref = 'owner', lazy = 'dynamic')
@@ -293,17 +388,18 @@ class month(db.Model):
 
 class monthly_deposit(db.Model):
     __tablename__ = "monthly_deposit"
+    __table_args__ = (db.Index('ix_monthly_deposit_member_month', 'member_id', 'month_id'),)
     deposit_id = db.Column(db.Integer, primary_key = True, nullable = False)
 
     amount = db.Column(db.Integer, nullable = False)
 
-    date_created = db.Column(db.DateTime, default = datetime.utcnow)
+    date_created = db.Column(db.DateTime, default = datetime.utcnow, index = True)
     last_updated = db.Column(db.DateTime, default = datetime.utcnow,
             onupdate = datetime.utcnow)
 
     #relationships
     member_id = db.Column(db.Integer, db.ForeignKey('member.member_id'))
-    month_id = db.Column(db.Integer, db.ForeignKey('month.month_id'))
+    month_id = db.Column(db.Integer, db.ForeignKey('month.month_id'), index = True)
 
     def __repr__(self):
         return '<Deposit : %r>' % self.amount
@@ -326,6 +422,15 @@ class loan_type(db.Model):
     #relationships
     loans = db.relationship('loan', backref='type', lazy='dynamic')
 
+    @staticmethod
+    def interest_on(amount, rate, max_period):
+        """
+        interest_on(amount, rate, max_period)
+            Returns the interest, in whole shillings, on a loan of amount at rate percent
+            a month over max_period years
+        """
+        return int(round(amount * (max_period * 12) * (rate / 100)))
+
     def __repr__(self):
         return '<Loan Type : %r>' % self.descriptiom
 
@@ -336,12 +441,12 @@ class registration_fee(db.Model):
 
     amount = db.Column(db.Integer, nullable = False)
 
-    date_created = db.Column(db.DateTime, default = datetime.utcnow)
+    date_created = db.Column(db.DateTime, default = datetime.utcnow, index = True)
     last_updated = db.Column(db.DateTime, default = datetime.utcnow,
             onupdate = datetime.utcnow)
 
     #relationships
-    member_id = db.Column(db.Integer, db.ForeignKey('member.member_id'))
+    member_id = db.Column(db.Integer, db.ForeignKey('member.member_id'), index = True)
 
     def __repr__(self):
         return '<Registration Fee : %r>' % self.amount
@@ -459,22 +564,105 @@ class attachment(db.Model):
         return '<Attachment : %r>' % self.filename
 
 
+def loan_interest(context):
+    """Default interest of a new loan, from the rate and period of its loan type"""
+    parameters = context.current_parameters
+    terms = context.connection.execute(db.select([loan_type.rate, loan_type.max_period])\
+            .where(loan_type.loan_type_id == parameters.get('loan_type'))).first()
+    return loan_type.interest_on(parameters['amount'], *terms) if terms else 0
+
+
+def loan_outstanding(context):
+    """Default outstanding balance of a new loan: its amount together with its interest"""
+    interest = context.current_parameters.get('interest')
+    if interest is None:
+        interest = loan_interest(context)
+    return context.current_parameters['amount'] + interest
+
+
 class loan(db.Model):
     __tablename__ = 'loan'
+    __table_args__ = (db.Index('ix_loan_status_last_updated', 'status', 'last_updated'),)
     loan_id = db.Column(db.Integer, primary_key = True, nullable = False)
 
     amount = db.Column(db.Integer, nullable = False)
     status = db.Column(db.String(16), default = "pending", nullable = False)
 
-    date_created = db.Column(db.DateTime, default = datetime.utcnow)
+    #interest is fixed when the loan is taken; the balances are maintained by the
+    #installment and overdue listeners below and outstanding is
+    #amount + interest + overdue_charged - amount_paid - overdue_paid
+    interest = db.Column(db.Integer, default = loan_interest, nullable = False)
+    amount_paid = db.Column(db.Integer, default = 0, nullable = False)
+    overdue_charged = db.Column(db.Integer, default = 0, nullable = False)
+    overdue_paid = db.Column(db.Integer, default = 0, nullable = False)
+    outstanding = db.Column(db.Integer, default = loan_outstanding, nullable = False)
+
+    date_created = db.Column(db.DateTime, default = datetime.utcnow, index = True)
     last_updated = db.Column(db.DateTime, default = datetime.utcnow,
             onupdate = datetime.utcnow)
 
     #relationships
-    member_id = db.Column(db.Integer, db.ForeignKey('member.member_id'))
+    member_id = db.Column(db.Integer, db.ForeignKey('member.member_id'), index = True)
     loan_type = db.Column(db.Integer, db.ForeignKey('loan_type.loan_type_id'))
 
     installments = db.relationship('installment', backref = 'loan', lazy = 'dynamic')
+    #also orders a new loan's insert before its overdues' in the same flush
+    overdues = db.relationship('loan_overdue', backref = 'loan', lazy = 'dynamic')
+
+    @staticmethod
+    def computed_balances():
+        """
+        computed_balances()
+            Returns a query of (loan_id, amount_paid, overdue_charged, overdue_paid)
+            summed from the installment and overdue tables
+        """
+        paid = db.session.query(installment.loan_id,
+                db.func.sum(installment.amount).label('total'))\
+            .group_by(installment.loan_id).subquery()
+        charged = db.session.query(loan_overdue.loan_id,
+                db.func.sum(loan_overdue.amount).label('total'))\
+            .group_by(loan_overdue.loan_id).subquery()
+        settled = db.session.query(loan_overdue.loan_id,
+                db.func.sum(loan_overdue_payment.amount).label('total'))\
+            .join(loan_overdue_payment, 
+                loan_overdue_payment.loan_overdue_id == loan_overdue.loan_overdue_id)\
+            .group_by(loan_overdue.loan_id).subquery()
+
+        return db.session.query(loan.loan_id,
+                db.func.coalesce(paid.c.total, 0),
+                db.func.coalesce(charged.c.total, 0),
+                db.func.coalesce(settled.c.total, 0))\
+            .outerjoin(paid, paid.c.loan_id == loan.loan_id)\
+            .outerjoin(charged, charged.c.loan_id == loan.loan_id)\
+            .outerjoin(settled, settled.c.loan_id == loan.loan_id)
+
+    @staticmethod
+    def check_balances(fix = False):
+        """
+        check_balances(fix)
+            Compares the maintained balance columns of every loan with the sums of its
+            installments and overdues; fix rewrites mismatching loans (the caller commits)
+            Returns [(Loan, amount_paid, overdue_charged, overdue_paid)] of mismatches
+        """
+        computed = loan.computed_balances().subquery()
+        columns = list(computed.c)
+
+        mismatches = db.session.query(loan, *columns[1:])\
+            .join(computed, columns[0] == loan.loan_id)\
+            .filter(db.or_(loan.amount_paid != columns[1], 
+                loan.overdue_charged != columns[2], loan.overdue_paid != columns[3],
+                loan.outstanding != loan.amount + loan.interest + columns[2] - columns[1] -
+                    columns[3]))\
+            .all()
+
+        if fix:
+            for Loan, paid, charged, settled in mismatches:
+                Loan.amount_paid = paid
+                Loan.overdue_charged = charged
+                Loan.overdue_paid = settled
+                Loan.outstanding = Loan.amount + Loan.interest + charged - paid - settled
+                db.session.add(Loan)
+        return mismatches
 
     def __repr__(self):
         return '<Loan %r>' % self.amount
@@ -486,12 +674,13 @@ class installment(db.Model):
     
     amount = db.Column(db.Integer, nullable = False)
 
-    date_created = db.Column(db.DateTime, default = datetime.utcnow)
+    date_created = db.Column(db.DateTime, default = datetime.utcnow, index = True)
     last_updated = db.Column(db.DateTime, default = datetime.utcnow,
             onupdate = datetime.utcnow)
 
     #relationship
-    loan_id = db.Column(db.Integer, db.ForeignKey('loan.loan_id'), nullable = False)
+    loan_id = db.Column(db.Integer, db.ForeignKey('loan.loan_id'), nullable = False, 
+            index = True)
 
     def __repr__(self, field):
         return '<Installment ID %r>'% field.data
@@ -505,12 +694,13 @@ class loan_overdue(db.Model):
     month = db.Column(db.String(32), nullable = False)
     status = db.Column(db.String(16), default = "pending")
     
-    date_created = db.Column(db.DateTime, default = datetime.utcnow)
+    date_created = db.Column(db.DateTime, default = datetime.utcnow, index = True)
     last_updated = db.Column(db.DateTime, default = datetime.utcnow,
             onupdate = datetime.utcnow)
 
     #relationship
-    loan_id =  db.Column(db.Integer, db.ForeignKey('loan.loan_id'), nullable = False)
+    loan_id =  db.Column(db.Integer, db.ForeignKey('loan.loan_id'), nullable = False,
+            index = True)
     
     payments = db.relationship('loan_overdue_payment', backref = 'overdue',  
             lazy = 'dynamic')
@@ -525,13 +715,13 @@ class loan_overdue_payment(db.Model):
     
     amount = db.Column(db.Integer, nullable = False)
 
-    date_created = db.Column(db.DateTime, default = datetime.utcnow)
+    date_created = db.Column(db.DateTime, default = datetime.utcnow, index = True)
     last_updated = db.Column(db.DateTime, default = datetime.utcnow,
             onupdate = datetime.utcnow)
 
     #relationships
     loan_overdue_id = db.Column(db.Integer, db.ForeignKey('loan_overdue.loan_overdue_id'),
-            nullable = False)
+            nullable = False, index = True)
 
     def __repr__(self):
         return ''% self.loan_overdue_payment_id
@@ -539,17 +729,20 @@ class loan_overdue_payment(db.Model):
 
 class monthly_deposit_overdue(db.Model):
     __tablename__ = 'monthly_deposit_overdue'
+    __table_args__ = (db.Index('ix_monthly_deposit_overdue_member_month', 
+        'member_id', 'month_id'),)
     monthly_deposit_overdue_id = db.Column(db.Integer, primary_key = True)
     
     amount = db.Column(db.Integer, nullable = False)
-    status = db.Column(db.String(16), default = "pending")
+    status = db.Column(db.String(16), default = "pending", index = True)
 
-    date_created = db.Column(db.DateTime, default = datetime.utcnow)
+    date_created = db.Column(db.DateTime, default = datetime.utcnow, index = True)
     last_updated = db.Column(db.DateTime, default = datetime.utcnow,
             onupdate = datetime.utcnow)
 
     #relationship
-    month_id = db.Column(db.Integer, db.ForeignKey('month.month_id'), nullable = False)
+    month_id = db.Column(db.Integer, db.ForeignKey('month.month_id'), nullable = False,
+            index = True)
     member_id = db.Column(db.Integer, db.ForeignKey('member.member_id'), nullable = False)
 
     payments = db.relationship('deposit_overdue_payment', backref = 'overdue', 
@@ -565,14 +758,217 @@ class deposit_overdue_payment(db.Model):
 
     amount = db.Column(db.Integer, nullable = False)
 
-    date_created = db.Column(db.DateTime, default = datetime.utcnow)
+    date_created = db.Column(db.DateTime, default = datetime.utcnow, index = True)
     last_updated = db.Column(db.DateTime, default = datetime.utcnow,
             onupdate = datetime.utcnow)
 
     #relationships
     monthly_deposit_overdue_id = db.Column(db.Integer, 
             db.ForeignKey('monthly_deposit_overdue.monthly_deposit_overdue_id'), 
-            nullable = False)
+            nullable = False, index = True)
+
+
+def monthly_totals(model, year = None):
+    """
+    monthly_totals(model, year)
+        Computes the number and sum of {model}.amount for every calendar month in a
+        single grouped query; year restricts it to the months of that year
+        Returns a dictionary keyed by (year, month) e.g., {(2020, 7) : (12, 84000)}
+    """
+    years = db.extract('year', model.date_created)
+    months = db.extract('month', model.date_created)
+
+    records = db.session.query(years, months, db.func.count(model.amount),
+            db.func.sum(model.amount)).filter(model.date_created != None)
+    if year is not None:
+        records = records.filter(model.date_created >= datetime(year, 1, 1),
+                model.date_created < datetime(year + 1, 1, 1))
+
+    return {(int(item[0]), int(item[1])) : (item[2], item[3])
+            for item in records.group_by(years, months).all()}
+
+
+class ledger_rollup(db.Model):
+    """
+    Running count and sum of every transaction kind per calendar month.
+    Maintained on every insert so that reports read O(months) rows instead of
+    re-summing the raw transaction tables.
+    """
+    __tablename__ = 'ledger_rollup'
+    __table_args__ = (db.UniqueConstraint('year', 'month', 'kind'),)
+    rollup_id = db.Column(db.Integer, primary_key = True)
+
+    year = db.Column(db.Integer, nullable = False)
+    month = db.Column(db.Integer, nullable = False)
+    kind = db.Column(db.String(32), nullable = False)
+    count = db.Column(db.Integer, default = 0, nullable = False)
+    total = db.Column(db.Integer, default = 0, nullable = False)
+
+    last_updated = db.Column(db.DateTime, default = datetime.utcnow,
+            onupdate = datetime.utcnow)
+
+    @staticmethod
+    def record(connection, kind, stamp, amount, count = 1):
+        """
+        Adds {count} transactions of {kind} worth {amount} to the rollup of {stamp}'s month.
+        connection is the connection of the transaction in which the records are written
+        """
+        table = ledger_rollup.__table__
+        bucket = (table.c.year == stamp.year) & (table.c.month == stamp.month) &\
+                (table.c.kind == kind)
+
+        update = table.update().where(bucket).values(
+            count = table.c.count + count,
+            total = table.c.total + amount,
+            last_updated = datetime.utcnow())
+
+        if connection.execute(update).rowcount == 0:
+            #the savepoint keeps the transaction usable when another one inserted the
+            #month's first record in the meantime; the UPDATE then finds its row
+            try:
+                with connection.begin_nested():
+                    connection.execute(table.insert().values(
+                        year = stamp.year,
+                        month = stamp.month,
+                        kind = kind,
+                        count = count,
+                        total = amount,
+                        last_updated = datetime.utcnow()))
+            except IntegrityError:
+                connection.execute(update)
+
+    @staticmethod
+    def rebuild(year = None):
+        """
+        rebuild(year)
+            Recomputes the rollups from the raw transaction tables e.g., for backfills
+            year restricts the rebuild to a single year; the caller commits
+            Returns the number of rollups written
+        """
+        rollups = ledger_rollup.query
+        if year is not None:
+            rollups = rollups.filter_by(year = year)
+        rollups.delete(synchronize_session = False)
+
+        written = 0
+        for kind, model in ledger_kinds:
+            for (Year, Month), (count, total) in monthly_totals(model, year).items():
+                db.session.add(ledger_rollup(year = Year, month = Month, kind = kind,
+                    count = count, total = total or 0))
+                written += 1
+        return written
+
+    def __repr__(self):
+        return '<Ledger Rollup %r %r/%r>' % (self.kind, self.month, self.year)
+
+
+def loan_balance_listener(column, sign, loan_id):
+    """
+    Returns an after_insert listener adding sign * amount of the inserted record to the
+    column of its loan in the same transaction; loan_id(target, connection) finds the loan
+    """
+    def after_insert(mapper, connection, target):
+        table = loan.__table__
+        amount = target.amount or 0
+        Loan_id = loan_id(target, connection)
+
+        #one atomic UPDATE so concurrent payments never overwrite each other; last_updated
+        #is kept, not bumped by its onupdate, as it dates the repayment of paid loans
+        connection.execute(table.update().where(table.c.loan_id == Loan_id).values({
+            column : table.c[column] + amount,
+            'outstanding' : table.c.outstanding + sign * amount,
+            'last_updated' : table.c.last_updated}))
+
+        session = db.object_session(target)
+        if session is not None:
+            session.info.setdefault('stale loans', set()).add(Loan_id)
+    return after_insert
+
+sa_event.listen(installment, 'after_insert', loan_balance_listener('amount_paid', -1,
+    lambda target, connection: target.loan_id))
+sa_event.listen(loan_overdue, 'after_insert', loan_balance_listener('overdue_charged', 1,
+    lambda target, connection: target.loan_id))
+sa_event.listen(loan_overdue_payment, 'after_insert', loan_balance_listener('overdue_paid', -1,
+    lambda target, connection: connection.scalar(db.select([loan_overdue.loan_id])\
+        .where(loan_overdue.loan_overdue_id == target.loan_overdue_id))))
+
+
+@sa_event.listens_for(db.session, 'after_flush_postexec')
+def expire_stale_loans(session, flush_context):
+    """Expires the balances of loans loaded in session that the flush just updated"""
+    stale = session.info.pop('stale loans', None)
+    if not stale:
+        return
+
+    for key, Loan in list(session.identity_map.items()):
+        if key[0] is loan and key[1][0] in stale:
+            session.expire(Loan, ['amount_paid', 'overdue_charged', 'overdue_paid',
+                'outstanding'])
+
+
+#transaction tables summarised in ledger_rollup, keyed by the series name used in reports
+ledger_kinds = (
+        ('deposits', monthly_deposit),
+        ('installments', installment),
+        ('loans', loan),
+        ('loan overdues', loan_overdue),
+        ('overdue payments', loan_overdue_payment),
+        ('registration fees', registration_fee),
+        ('deposit overdues', monthly_deposit_overdue),
+        ('deposit overdue payments', deposit_overdue_payment)
+        )
+
+
+def rollup_listener(kind):
+    def after_insert(mapper, connection, target):
+        ledger_rollup.record(connection, kind, target.date_created, target.amount or 0)
+    return after_insert
+
+for kind, model in ledger_kinds:
+    sa_event.listen(model, 'after_insert', rollup_listener(kind))
+
+
+class job(db.Model):
+    """
+    Long running operation queued for the background job runner (app/jobs.py).
+    Work is done in batches; cursor records where the last committed batch stopped so
+    that an interrupted job resumes without repeating work.
+    """
+    __tablename__ = 'job'
+    job_id = db.Column(db.Integer, primary_key = True)
+
+    kind = db.Column(db.String(64), nullable = False)
+    arguments = db.Column(db.Text, default = '{}', nullable = False)
+    status = db.Column(db.String(16), default = 'queued', nullable = False, index = True)
+
+    cursor = db.Column(db.Integer)
+    progress = db.Column(db.Integer, default = 0, nullable = False)
+    total = db.Column(db.Integer)
+    rows = db.Column(db.Integer, default = 0, nullable = False)
+    error = db.Column(db.Text)
+
+    date_created = db.Column(db.DateTime, default = datetime.utcnow)
+    last_updated = db.Column(db.DateTime, default = datetime.utcnow,
+            onupdate = datetime.utcnow)
+
+    #relationships
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+
+    def to_json(self):
+        return {
+                'job_id' : self.job_id,
+                'kind' : self.kind,
+                'status' : self.status,
+                'progress' : self.progress,
+                'total' : self.total,
+                'rows' : self.rows,
+                'error' : self.error,
+                'date_created' : self.date_created.isoformat() if self.date_created else None,
+                'last_updated' : self.last_updated.isoformat() if self.last_updated else None
+                }
+
+    def __repr__(self):
+        return '<Job %r : %r>' % (self.job_id, self.kind)
 
 
 class event(db.Model):
@@ -623,3 +1019,27 @@ class branch(db.Model):
 
     def __repr__(self):
         return '<Branch : %r>'% self.town
+
+
+class imported_payment(db.Model):
+    """
+    Reference of a statement payment posted by the payment import (app/transactions/
+    imports.py); a row whose reference is here was already imported and is skipped, so
+    importing a statement twice, or statements that overlap, posts nothing twice.
+    """
+    __tablename__ = 'imported_payment'
+    imported_payment_id = db.Column(db.Integer, primary_key = True)
+
+    reference = db.Column(db.String(128), nullable = False, unique = True)
+    kind = db.Column(db.String(32), nullable = False)
+    record = db.Column(db.Integer)
+    amount = db.Column(db.Integer, nullable = False)
+
+    date_created = db.Column(db.DateTime, default = datetime.utcnow)
+
+    #relationships
+    member_id = db.Column(db.Integer, db.ForeignKey('member.member_id'))
+    job_id = db.Column(db.Integer, db.ForeignKey('job.job_id'))
+
+    def __repr__(self):
+        return '<Imported Payment %r>' % self.reference
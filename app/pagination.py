@@ -0,0 +1,97 @@
+import flask, math
+from . import db
+
+
+class KeysetPagination:
+    """
+    class KeysetPagination
+        Pages through query in descending order of key by seeking past the last key shown
+        instead of skipping rows with OFFSET, so deep pages cost the same as the first.
+        Rendered by macros.pagination_widget like a Flask-SQLAlchemy pagination.
+
+        query is the listing query; rows expose key by name or start with its model
+        key is a unique column e.g., loan.loan_id
+        after pages to rows older than the key after (the 'next' link)
+        before pages to rows newer than the key before (the 'previous' link)
+        page is the number of the page shown, for display only
+        approximate_total estimates the number of rows from the key range of the table
+    """
+    keyset = True
+
+    def __init__(self, query, key, per_page, after = None, before = None, page = 1,
+            approximate_total = False):
+        self.key = key
+        self.per_page = int(per_page)
+        self.page = max(page, 1) if after is not None or before is not None else 1
+
+        query = query.order_by(None)
+        if before is not None:
+            rows = query.filter(key > before).order_by(key.asc())\
+                    .limit(self.per_page + 1).all()
+            self.has_prev = len(rows) > self.per_page
+            self.has_next = True
+            self.items = list(reversed(rows[:self.per_page]))
+        else:
+            if after is not None:
+                query = query.filter(key < after)
+            rows = query.order_by(key.desc()).limit(self.per_page + 1).all()
+            self.has_prev = after is not None
+            self.has_next = len(rows) > self.per_page
+            self.items = rows[:self.per_page]
+
+        self.total = approximate_count(key) if approximate_total else None
+
+    def cursor(self, row):
+        value = getattr(row, self.key.key, None)
+        if value is None and isinstance(row, tuple):
+            value = getattr(row[0], self.key.key)
+        return value
+
+    @property
+    def next_cursor(self):
+        return self.cursor(self.items[-1]) if self.has_next and self.items else None
+
+    @property
+    def prev_cursor(self):
+        return self.cursor(self.items[0]) if self.has_prev and self.items else None
+
+    @property
+    def pages(self):
+        if self.total is None:
+            return None
+        return max(math.ceil(self.total / self.per_page), self.page)
+
+    @staticmethod
+    def from_request(query, key, approximate_total = True):
+        """
+        from_request(query, key)
+            Pages query with the after, before and page arguments of the current request
+        """
+        args = flask.request.args
+        return KeysetPagination(query, key,
+                flask.current_app.config['FLASKY_POSTS_PER_PAGE'],
+                after = args.get('after', type = int),
+                before = args.get('before', type = int),
+                page = args.get('page', 1, type = int),
+                approximate_total = approximate_total)
+
+
+def approximate_count(key):
+    """
+    approximate_count(key)
+        Estimates the number of rows of key's table without scanning it: from the planner
+        statistics on PostgreSQL, otherwise from the range of key (exact when no row was
+        ever deleted)
+    """
+    table = key.table
+    if db.session.get_bind().dialect.name == 'postgresql':
+        estimate = db.session.execute(
+                'SELECT reltuples FROM pg_class WHERE relname = :name',
+                {'name' : table.name}).scalar()
+        if estimate and estimate > 0:
+            return int(estimate)
+
+    first, last = db.session.query(db.func.min(key), db.func.max(key)).one()
+    if first is None:
+        return 0
+    return last - first + 1
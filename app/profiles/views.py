@@ -1,4 +1,6 @@
 import flask, os
+from datetime import datetime
+from sqlalchemy import func, case
 from werkzeug.utils import secure_filename
 from flask_login import current_user, login_required
 
@@ -9,33 +11,87 @@ from .forms import (RegisterDocumentTypeForm, DocumentUploadForm, RegisterPhoneN
         LoginMemberForm)
 
 from .. import db
+from ..pagination import KeysetPagination
+from ..exports import stream_export
+from ..transactions.statements import member_statement, opening_balances, statement_line
 from ..decorators import permission_required
 from ..models import (user, member, group, document_type, document, phone_number, 
         loan_type, loan, registration_fee, month, monthly_deposit, employer, employment, 
         occupation, role, Permission)
 
 
+def loans_listing():
+    """
+    loans_listing()
+        Returns (query, key) of the loans listing
+        The query selects plain columns so that it can be paged or exported as is
+    """
+    return db.session.query(
+                loan.loan_id,
+                loan.amount,
+                loan.date_created,
+                loan.status,
+                member.member_id,
+                member.first_name,
+                member.middle_name,
+                member.last_name,
+                loan_type.loan_type_id,
+                loan_type.description)\
+            .join(member, member.member_id == loan.member_id)\
+            .join(loan_type, loan_type.loan_type_id == loan.loan_type), loan.loan_id
+
+
+def monthly_deposits_listing():
+    """
+    monthly_deposits_listing()
+        Returns (query, key) of the monthly deposits listing
+    """
+    return db.session.query(
+                monthly_deposit.deposit_id,
+                monthly_deposit.amount,
+                monthly_deposit.date_created,
+                month.month_id,
+                month.description,
+                member.member_id,
+                member.first_name,
+                member.middle_name,
+                member.last_name)\
+            .join(month, month.month_id == monthly_deposit.month_id)\
+            .join(member, member.member_id == monthly_deposit.member_id),\
+        monthly_deposit.deposit_id
+
+
+def registration_fees_listing():
+    """
+    registration_fees_listing()
+        Returns (query, key) of the registration fees listing
+    """
+    return db.session.query(
+                registration_fee.fee_id,
+                registration_fee.amount,
+                registration_fee.date_created,
+                member.member_id,
+                member.first_name,
+                member.middle_name,
+                member.last_name)\
+            .join(member, member.member_id == registration_fee.member_id),\
+        registration_fee.fee_id
+
+
+#listings that can be exported in full, by the name used in their export URL
+listings = {
+        'loans' : loans_listing,
+        'monthly_deposits' : monthly_deposits_listing,
+        'registration_fees' : registration_fees_listing
+        }
+
+
 @profiles.route('/view_loans')
 @login_required
 @permission_required(Permission.REGISTER)
 def view_loans():
-    page = flask.request.args.get('page', 1, type = int)
-    pagination = loan.query.join(member, member.member_id == loan.member_id)\
-            .join(loan_type, loan_type.loan_type_id == loan.loan_type)\
-            .add_columns(
-                    loan.loan_id,
-                    loan.amount,
-                    loan.date_created,
-                    loan.status,
-                    member.member_id,
-                    member.first_name,
-                    member.middle_name,
-                    member.last_name,
-                    loan_type.loan_type_id,
-                    loan_type.description
-                ).order_by(loan.loan_id.desc()).paginate(page,
-                        per_page = flask.current_app.config['FLASKY_POSTS_PER_PAGE'], 
-                        error_out = False)
+    query, key = loans_listing()
+    pagination = KeysetPagination.from_request(query, key)
     loans = pagination.items
     return flask.render_template('profiles/view_loans.html', loans = loans, 
             pagination = pagination)
@@ -45,23 +101,8 @@ def view_loans():
 @login_required
 @permission_required(Permission.REGISTER)
 def view_monthly_deposits():
-    page = flask.request.args.get('page', 1, type = int)
-    pagination = monthly_deposit.query\
-            .join(month, month.month_id == monthly_deposit.month_id)\
-            .join(member, member.member_id == monthly_deposit.member_id)\
-            .add_columns(
-                    member.member_id,
-                    member.first_name,
-                    member.middle_name,
-                    member.last_name,
-                    monthly_deposit.deposit_id,
-                    monthly_deposit.amount,
-                    monthly_deposit.date_created,
-                    month.month_id,
-                    month.description
-                    ).order_by(monthly_deposit.deposit_id.desc())\
-            .paginate(page, per_page = flask.current_app.config['FLASKY_POSTS_PER_PAGE'], 
-                    error_out = False)
+    query, key = monthly_deposits_listing()
+    pagination = KeysetPagination.from_request(query, key)
     
     deposits = pagination.items
     return flask.render_template('profiles/view_monthly_deposits.html', 
@@ -72,26 +113,27 @@ def view_monthly_deposits():
 @login_required
 @permission_required(Permission.REGISTER)
 def view_registration_fees():
-    page = flask.request.args.get('page', 1, type = int)
-    pagination = registration_fee.query\
-            .join(member, member.member_id == registration_fee.member_id)\
-            .add_columns(
-                    registration_fee.amount,
-                    registration_fee.fee_id,
-                    registration_fee.date_created,
-                    member.member_id,
-                    member.first_name,
-                    member.middle_name,
-                    member.last_name
-                    ).order_by(registration_fee.fee_id.desc())\
-            .paginate(page, per_page = flask.current_app.config['FLASKY_POSTS_PER_PAGE'], 
-                    error_out = False)
+    query, key = registration_fees_listing()
+    pagination = KeysetPagination.from_request(query, key)
     fees = pagination.items
 
     return flask.render_template('profiles/view_registration_fees.html', fees = fees, 
             pagination = pagination)
 
 
+@profiles.route('/records/export/<listing>/<format>')
+@login_required
+@permission_required(Permission.REGISTER)
+def export_listing(listing, format):
+    if listing not in listings:
+        flask.abort(404)
+
+    query, key = listings[listing]()
+    return stream_export(f'{listing}_{datetime.utcnow():%Y%m%d}',
+            [item['name'] for item in query.column_descriptions],
+            query.order_by(key.desc()), format)
+
+
 @profiles.route('/login_member', methods = ['GET', 'POST'])
 @login_required
 @permission_required(Permission.MEMBER)
@@ -577,10 +619,39 @@ def member_profile(member_id):
                 member = Member, employments = employments, tab_variable = tab_variable,
                 group = Group)
 
+    elif tab_variable == 5:
+        year = flask.request.args.get('year', datetime.utcnow().year, type = int)
+        opening = opening_balances(member_id, datetime(year, 1, 1))
+        statement = list(member_statement(member_id, 
+            datetime(year, 1, 1), datetime(year + 1, 1, 1), opening))
+
+        return flask.render_template('profiles/member_profile.html', member = Member,
+                tab_variable = tab_variable, group = Group, statement = statement, 
+                opening = opening, year = year)
+
     return flask.render_template('profiles/member_profile.html', 
             tab_variable = tab_variable, member = Member, group = Group)
 
 
+@profiles.route('/statement/<int:member_id>')
+@login_required
+@permission_required(Permission.MEMBER)
+def statement(member_id):
+    response = flask.make_response(
+        flask.redirect(flask.url_for('profiles.member_profile', member_id = member_id)))
+    response.set_cookie('tab_var', '5', max_age = 60*60)
+    return response
+
+
+@profiles.route('/export_statement/<int:member_id>')
+@login_required
+@permission_required(Permission.MEMBER)
+def export_statement(member_id):
+    Member = member.query.filter_by(member_id = member_id).first_or_404()
+    return stream_export(f'statement_{Member.member_id}', statement_line._fields,
+            member_statement(member_id), flask.request.args.get('format', 'csv'))
+
+
 @profiles.route('/list_of_members')
 @login_required
 @permission_required(Permission.VIEW)
@@ -670,7 +741,7 @@ def list_of_groups():
 @login_required
 def group_personal(group_id):
     response = flask.make_response(
-        flask.redirect(flask.url_for('profiles.group_profile', group_id = group_id)))
+        flask.redirect(flask.url_for('profiles.group_profile', group_id = group_id, tab = 0)))
     response.set_cookie('tab_var', '0', max_age = 60*60)
     return response
 
@@ -679,7 +750,7 @@ def group_personal(group_id):
 @login_required
 def group_registration_fees(group_id):
     response = flask.make_response(flask.redirect(
-        flask.url_for('profiles.group_profile', group_id = group_id)))
+        flask.url_for('profiles.group_profile', group_id = group_id, tab = 1)))
     response.set_cookie('tab_var', '1', max_age = 60*60)
     return response
 
@@ -688,7 +759,7 @@ def group_registration_fees(group_id):
 @login_required
 def group_monthly_deposits(group_id):
     response = flask.make_response(
-        flask.redirect(flask.url_for('profiles.group_profile', group_id = group_id)))
+        flask.redirect(flask.url_for('profiles.group_profile', group_id = group_id, tab = 2)))
     response.set_cookie('tab_var', '2', max_age = 60*60)
     return response
 
@@ -697,76 +768,122 @@ def group_monthly_deposits(group_id):
 @login_required
 def group_loans(group_id):
     response = flask.make_response(
-        flask.redirect(flask.url_for('profiles.group_profile', group_id = group_id)))
+        flask.redirect(flask.url_for('profiles.group_profile', group_id = group_id, tab = 3)))
     response.set_cookie('tab_var', '3', max_age = 60*60)
     return response
 
 
-@profiles.route('/group_profile/<int:group_id>', methods = ['GET', 'POST'])
-def group_profile(group_id):
-    Group = group.query.filter_by(group_id = group_id).first()
-
-    tab_variable = 0
-    if flask.request.cookies.get('tab_var') is not None:
-        tab_variable = int(flask.request.cookies.get('tab_var'))
-
-    if tab_variable == 0:
-        members = member.query.filter_by(group_id = group_id).all()
-        return flask.render_template('profiles/group_profile.html', group = Group,
-            tab_variable = tab_variable, members = members)
-
-    elif tab_variable == 1:
-        fees = member.query.filter_by(group_id = group_id)\
-                .join(registration_fee, registration_fee.member_id == member.member_id)\
-                .add_columns(
-                        member.member_id,
-                        member.first_name,
-                        member.middle_name,
-                        member.last_name,
-                        registration_fee.fee_id,
-                        registration_fee.amount,
-                        registration_fee.date_created
-                    ).order_by(registration_fee.fee_id.desc()).all()
-        return flask.render_template('profiles/group_profile.html', group = Group,
-            tab_variable = tab_variable, fees = fees)
+def group_tab(group_id, tab_variable):
+    """
+    group_tab(group_id, tab_variable)
+        Returns (query, key, totals query) of a group_profile tab
+        The query selects plain columns so that it can be paged or exported as is
+    """
+    if tab_variable == 1:
+        query = db.session.query(
+                    registration_fee.fee_id,
+                    registration_fee.amount,
+                    registration_fee.date_created,
+                    member.member_id,
+                    member.first_name,
+                    member.middle_name,
+                    member.last_name)\
+                .join(member, member.member_id == registration_fee.member_id)\
+                .filter(member.group_id == group_id)
+        return query, registration_fee.fee_id, query.with_entities(
+                func.count(registration_fee.fee_id).label('count'),
+                func.sum(registration_fee.amount).label('total'))
 
     elif tab_variable == 2:
-        deposits = member.query.filter_by(group_id = group_id)\
-            .join(monthly_deposit, monthly_deposit.member_id == member.member_id)\
-            .join(month, month.month_id == monthly_deposit.month_id)\
-            .add_columns(
+        query = db.session.query(
+                    monthly_deposit.deposit_id,
+                    monthly_deposit.amount,
+                    monthly_deposit.date_created,
+                    month.month_id,
+                    month.description,
                     member.member_id,
                     member.first_name,
                     member.middle_name,
                     member.last_name,
-                    member.gender,
-                    month.month_id,
-                    month.description,
-                    monthly_deposit.deposit_id,
-                    monthly_deposit.amount,
-                    monthly_deposit.date_created
-                ).order_by(monthly_deposit.deposit_id.desc())
-        return flask.render_template('profiles/group_profile.html', group = Group,
-            tab_variable = tab_variable, deposits = deposits)
+                    member.gender)\
+                .join(member, member.member_id == monthly_deposit.member_id)\
+                .join(month, month.month_id == monthly_deposit.month_id)\
+                .filter(member.group_id == group_id)
+        return query, monthly_deposit.deposit_id, db.session.query(
+                func.count(monthly_deposit.deposit_id).label('count'),
+                func.sum(monthly_deposit.amount).label('total'))\
+            .join(member, member.member_id == monthly_deposit.member_id)\
+            .filter(member.group_id == group_id)
 
     elif tab_variable == 3:
-        loans = member.query.filter_by(group_id = group_id)\
-                .join(loan, loan.member_id == member.member_id)\
+        query = db.session.query(
+                    loan.loan_id,
+                    loan.amount,
+                    loan.status,
+                    loan.date_created,
+                    loan_type.loan_type_id,
+                    loan_type.description,
+                    member.member_id,
+                    member.first_name,
+                    member.middle_name,
+                    member.last_name)\
+                .join(member, member.member_id == loan.member_id)\
                 .join(loan_type, loan_type.loan_type_id == loan.loan_type)\
-                .add_columns(
-                        member.member_id,
-                        member.first_name,
-                        member.middle_name,
-                        member.last_name,
-                        loan.loan_id,
-                        loan.amount,
-                        loan.status,
-                        loan.date_created,
-                        loan_type.loan_type_id,
-                        loan_type.description
-                    ).order_by(loan.loan_id.desc()).all()
-        return flask.render_template('profiles/group_profile.html', group = Group,
-            tab_variable = tab_variable, loans = loans)
-
-    return flask.render_template('profiles/group_profile.html', group = Group, 
-        tab_variable = tab_variable)
+                .filter(member.group_id == group_id)
+        return query, loan.loan_id, db.session.query(
+                func.count(loan.loan_id).label('count'),
+                func.sum(loan.amount).label('total'),
+                func.count(case([(loan.status == 'pending', 1)])).label('pending'))\
+            .join(member, member.member_id == loan.member_id)\
+            .filter(member.group_id == group_id)
+
+    query = db.session.query(
+                member.member_id,
+                member.first_name,
+                member.middle_name,
+                member.last_name,
+                member.gender,
+                member.location_address,
+                member.email_address,
+                member.status)\
+            .filter(member.group_id == group_id)
+    return query, member.member_id, db.session.query(
+            func.count(member.member_id).label('count'),
+            func.count(case([(member.status == 'activated', 1)])).label('active'))\
+        .filter(member.group_id == group_id)
+
+
+@profiles.route('/group_profile/<int:group_id>', methods = ['GET', 'POST'])
+def group_profile(group_id):
+    Group = group.query.filter_by(group_id = group_id).first_or_404()
+
+    #the tab is chosen by ?tab= and remembered in a cookie by the tab links
+    tab_variable = flask.request.args.get('tab', type = int)
+    if tab_variable is None:
+        tab_variable = int(flask.request.cookies.get('tab_var') or 0)
+    if tab_variable not in range(4):
+        tab_variable = 0
+
+    query, key, totals = group_tab(group_id, tab_variable)
+    pagination = KeysetPagination.from_request(query, key, approximate_total = False)
+
+    return flask.render_template('profiles/group_profile.html', group = Group,
+        tab_variable = tab_variable, pagination = pagination, records = pagination.items,
+        totals = totals.one())
+
+
+@profiles.route('/group/export/<int:group_id>/<int:tab_variable>')
+@login_required
+@permission_required(Permission.REGISTER)
+def export_group_tab(group_id, tab_variable):
+    Group = group.query.filter_by(group_id = group_id).first_or_404()
+
+    names = ['members', 'registration_fees', 'monthly_deposits', 'loans']
+    if tab_variable not in range(len(names)):
+        flask.abort(404)
+
+    query, key, totals = group_tab(group_id, tab_variable)
+    filename = f'{secure_filename(Group.name)}_{names[tab_variable]}'
+
+    return stream_export(filename, [item['name'] for item in query.column_descriptions],
+            query.order_by(key.desc()), flask.request.args.get('format', 'csv'))
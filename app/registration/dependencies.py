@@ -1,56 +1,65 @@
-import flask, os
-from .. import db, create_app
+import flask
+from .. import db
+from ..jobs import enqueue, job_handler
 from ..models import user, member, group
 
 def change_user_status(user_id):
-    app = create_app(os.getenv('FLASK_CONFIG') or 'default')
+    User = user.query.filter_by(id = user_id).first_or_404()
+    User.active = not User.active
 
-    with app.app_context():
-        User = user.query.filter_by(id = user_id).first_or_404()
-        User.active = not User.active
-
-        db.session.add(User)
-        db.session.commit()
+    db.session.add(User)
+    db.session.commit()
 
     return User
 
 def change_member_status(member_id, deactivate_all = False):
-    app = create_app(os.getenv('FLASK_CONFIG') or 'default')
-
-    with app.app_context():
-        Member = member.query.filter_by(member_id = member_id).first_or_404()
+    Member = member.query.filter_by(member_id = member_id).first_or_404()
 
-        if Member.status == 'activated':
-            Member.status = 'deactivated'
-        else:
-            Member.status = 'activated'
+    if Member.status == 'activated':
+        Member.status = 'deactivated'
+    else:
+        Member.status = 'activated'
 
-        if deactivate_all:
-            Member.status = 'deactivated'
+    if deactivate_all:
+        Member.status = 'deactivated'
 
-        db.session.add(Member)
-        db.session.commit()
+    db.session.add(Member)
+    db.session.commit()
 
     return Member
 
-def change_group_status(group_id):
-    app = create_app(os.getenv('FLASK_CONFIG') or 'default')
-
-    with app.app_context():
-        Group = group.query.filter_by(group_id = group_id).first_or_404()
-
-        #deactivate group
-        Group.active = not Group.active
-
-        #deactivate all members of the group
-        for item in member.query.filter_by(group_id = group_id).all():
-            Group = group.query.filter_by(group_id = group_id).first_or_404()
-            if not Group.active:
-                change_member_status(item.member_id, True)
-            else:
-                change_member_status(item.member_id)
-
-        db.session.add(Group)
-        db.session.commit()
-
-    return Group
+def set_group_status(group_id, active):
+    """
+    set_group_status(group_id, active)
+        Activates or deactivates the group together with all of its members using a
+        single UPDATE per table; the caller commits
+        Returns the number of members updated
+    """
+    group.query.filter(group.group_id == group_id).update({'active' : active},
+            synchronize_session = False)
+
+    status = 'activated' if active else 'deactivated'
+    return member.query.filter(member.group_id == group_id, member.status != status)\
+            .update({'status' : status}, synchronize_session = False)
+
+def change_group_status(group_id, user_id = None):
+    """
+    change_group_status(group_id, user_id)
+        Queues the activation or deactivation of the group together with all of its
+        members as a 'group statuses' job
+        Returns the queued job
+    """
+    Group = group.query.filter_by(group_id = group_id).first_or_404()
+    return enqueue('group statuses', user_id = user_id, group_ids = [group_id],
+            active = not Group.active)
+
+@job_handler('group statuses')
+def group_statuses_job(Job, group_ids, active):
+    """
+    Sets the status of the groups {group_ids} and of their members, one group per batch.
+    The status is set rather than toggled so that a resumed job repeats nothing.
+    """
+    Job.total = len(group_ids)
+    start = 0 if Job.cursor is None else Job.cursor + 1
+    for position in range(start, len(group_ids)):
+        yield position, set_group_status(group_ids[position], active)
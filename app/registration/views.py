@@ -430,7 +430,13 @@ def add_group_member(group_id, member_id):
 
 @registration.route('/change_group_status/<int:group_id>')
 def change_group_status(group_id):
-    dependencies.change_group_status(group_id)
+    Job = dependencies.change_group_status(group_id,
+            user_id = getattr(current_user, 'id', None))
+
+    if Job.status == 'completed':
+        flask.flash(f'Status of {Job.rows} group members updated')
+    else:
+        flask.flash('Status change of the group and its members has been queued.')
     return flask.redirect(flask.url_for('profiles.list_of_groups'))
 
 
@@ -1,12 +1,15 @@
-import os, flask, time
-from sqlalchemy import func
-from datetime import datetime, timedelta, date
-from .. import create_app, db
+import flask
+from sqlalchemy import func, and_, case
+from datetime import datetime
+from .. import db
+from ..jobs import job_handler
+from ..cache import after_commit
+from ..kpis import kpi_cache
+from .summaries import invalidate_year_summaries
 
 
-from ..models import (member, group, user, loan, loan_type, monthly_deposit, 
-        monthly_deposit_overdue, loan_overdue, deposit_overdue_payment, 
-        loan_overdue_payment, installment, month, registration_fee)
+from ..models import (member, loan, monthly_deposit, monthly_deposit_overdue,
+        month, ledger_rollup, ledger_kinds)
 
 def generate_month(description = datetime.utcnow().strftime("%B %Y")):
     """
@@ -23,180 +26,236 @@ def generate_month(description = datetime.utcnow().strftime("%B %Y")):
 
 
 def all_monthly_deposits():
-    app = create_app(os.getenv('FLASK_CONFIG') or 'default')
-
-    with app.app_context():
-        months = month.query.all()
-        deposits_data = []
-        for item in months:
-            deposits = db.session.query(func.sum(monthly_deposit.amount))\
-                .filter_by(month_id = item.month_id).scalar()
-
-            data = {
-                'month' : item.description,
-                'count' : item.deposits.count(),
-                'total' : deposits
-            }
-            deposits_data.append(data)
-    return deposits_data
-
-
-def monthly_records_summary_generator(year = 2020):
-
-    app = create_app(os.getenv('FLASK_CONFIG') or 'default')
-    with app.app_context():
-        months = month.query.filter(month.description.endswith(str(year))).all()
-        month_data = list()
-        for item in months: 
-            month_start = datetime(year, generate_month(item.description), 1,1,1,1,1)
-            try:
-                month_stop = datetime(year, generate_month(item.description) + 1,1,1,1,1)
-            except:
-                month_stop = datetime(year + 1, 1, 1, 1, 1, 1)
-
-            month_installments = db.session.query(
-                    func.count(installment.installment_id).label('count'), 
-                    func.sum(installment.amount).label('total')).filter(
-                installment.date_created.between(month_start, month_stop)).all()
-
-            month_overdues = db.session.query(
-                    func.count(loan_overdue.loan_overdue_id).label('count'),
-                    func.sum(loan_overdue.amount).label('total')).filter(
-                loan_overdue.date_created.between(month_start, month_stop)).all()
-
-            month_overdue_payments = db.session.query(
-                    func.count(loan_overdue_payment.amount).label('count'),
-                    func.sum(loan_overdue_payment.amount).label('total')).filter(
-                loan_overdue_payment.date_created.between(month_start, month_stop)).all()
-        
-            month_loans = db.session.query(
-                    func.count(loan.loan_id).label('count'),
-                    func.sum(loan.amount).label('total')).filter(
-                loan.date_created.between(month_start, month_stop)).all()
-
-            month_registration_fees = db.session.query(
-                    func.count(registration_fee.amount).label('count'),
-                    func.sum(registration_fee.amount).label('total')).filter(
-                registration_fee.date_created.between(month_start, month_stop)).all()
-        
-            month_deposits = db.session.query(
-                    func.count(monthly_deposit.amount).label('count'),
-                    func.sum(monthly_deposit.amount).label('total')).filter(
-                monthly_deposit.date_created.between(month_start, month_stop)).all()
-
-            month_deposit_overdue_payments = db.session.query(
-                        func.count(deposit_overdue_payment.amount).label('count'),
-                        func.sum(deposit_overdue_payment.amount).label('total')).filter(
-                    deposit_overdue_payment.date_created.between(month_start, month_stop)
-                ).all()
-
-            month_deposit_overdues = db.session.query(
-                        func.count(monthly_deposit_overdue.amount).label('count'),
-                        func.sum(monthly_deposit_overdue.amount).label('total')).filter(
-                    monthly_deposit_overdue.date_created.between(month_start, month_stop)
-                ).all()
-
-            data = {
-                'description' : item.description,
-                'deposits' : month_deposits,
-                'installments' : month_installments,
-                'loans' : month_loans,
-                'loan overdues' : month_overdues,
-                'overdue payments' : month_overdue_payments,
-                'registration fees' : month_registration_fees,
-                'deposit overdues' : month_deposit_overdues,
-                'deposit overdue payments' : month_deposit_overdue_payments
-                }
-            month_data.append(data)
+    """Returns the count and total of the monthly deposits of every month"""
+    months = db.session.query(month.description, func.count(monthly_deposit.deposit_id),
+            func.sum(monthly_deposit.amount))\
+        .outerjoin(monthly_deposit, monthly_deposit.month_id == month.month_id)\
+        .group_by(month.month_id, month.description).order_by(month.month_id).all()
+
+    return [{'month' : description, 'count' : count, 'total' : total}
+            for description, count, total in months]
+
+
+def monthly_records_summary_generator(year = None):
+    """
+    Summarises the count and total of every transaction series for each month of {year}.
+    Reads the maintained ledger rollups instead of re-summing the transaction tables.
+        year defaults to the current year
+    """
+    year = year or datetime.utcnow().year
+    months = month.query.filter(month.description.endswith(str(year))).all()
+    totals = {(item.kind, item.month) : (item.count, item.total) 
+            for item in ledger_rollup.query.filter_by(year = year).all()}
+
+    month_data = list()
+    for item in months:
+        numeral = generate_month(item.description)
+
+        data = {'description' : item.description}
+        for kind, model in ledger_kinds:
+            data[kind] = [totals.get((kind, numeral), (0, None))]
+        month_data.append(data)
     return month_data
 
+#series of the financial years comparison and the ledger kind each is summed from
+year_series = (
+        ('monthly deposits', 'deposits'),
+        ('installments', 'installments'),
+        ('supplied loans', 'loans'),
+        ('loan overdue payments', 'overdue payments'),
+        ('registration fees', 'registration fees'),
+        ('fully paid loan interest', None),
+        ('monthly deposit overdue payments', 'deposit overdue payments')
+        )
+
+
+def year_summary_columns(first_year = None, last_year = None):
+    """
+    year_summary_columns(first_year, last_year)
+        Returns the totals of every series for the financial years [first_year, last_year)
+        column by column: {'financial year' : [years], series : [total of each year]}
+        Years are bucketed in SQL, so one grouped query per table covers every year
+        first_year defaults to FIRST_YEAR and last_year to the current year
+    """
+    first_year = first_year or flask.current_app.config['FIRST_YEAR']
+    last_year = last_year or datetime.utcnow().year
+    years = list(range(first_year, last_year))
+
+    #yearly totals of every transaction kind from the ledger rollups
+    totals = {(item[0], item[1]) : item[2] for item in db.session.query(
+            ledger_rollup.year, ledger_rollup.kind, func.sum(ledger_rollup.total))\
+        .filter(ledger_rollup.year >= first_year, ledger_rollup.year < last_year)\
+        .group_by(ledger_rollup.year, ledger_rollup.kind).all()}
+
+    #interest of loans by the year they were fully paid
+    paid_year = db.extract('year', loan.last_updated)
+    for item in db.session.query(paid_year, func.sum(loan.interest))\
+            .filter(loan.status == 'Paid', loan.last_updated >= datetime(first_year, 1, 1),
+                loan.last_updated < datetime(last_year, 1, 1))\
+            .group_by(paid_year).all():
+        totals[(int(item[0]), None)] = item[1]
+
+    columns = {'financial year' : years}
+    for series, kind in year_series:
+        columns[series] = [totals.get((year, kind)) for year in years]
+    return columns
+
+
+def column_rows(columns):
+    """Returns the column-oriented columns as a list of {column : value} rows"""
+    return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+
 def year_summary_data_generator():
-    app = create_app(os.getenv('FLASK_CONFIG') or 'default')
-    with app.app_context():
-
-        year_comparison = list()
-        for item in range(flask.current_app.config['FIRST_YEAR'], 
-                int(time.strftime("%Y"))):
-            year_start = datetime(item, 1, 1, 1, 1, 1)
-            year_stop = datetime(item + 1, 1, 1, 1, 1, 1)
-
-            compare_deposits = db.session.query(
-                    func.sum(monthly_deposit.amount).label('total')).filter(
-                monthly_deposit.date_created.between(year_start, year_stop)).scalar()
-
-            compare_installments = db.session.query(
-                    func.sum(installment.amount).label('total')).filter(
-                installment.date_created.between(year_start, year_stop)).scalar()
-
-            compare_loans = db.session.query(
-                    func.sum(loan.amount).label('total')).filter(
-                loan.date_created.between(year_start, year_stop)).scalar()
-
-            compare_registration_fees = db.session.query(
-                    func.sum(registration_fee.amount).label('total')).filter(
-                registration_fee.date_created.between(year_start, year_stop)).scalar()
-
-            compare_overdue_payments = db.session.query(
-                    func.sum(loan_overdue_payment.amount).label('total')).filter(
-                loan_overdue_payment.date_created.between(year_start, year_stop)).scalar()
-
-            compare_deposit_overdue_payments = db.session.query(
-                    func.sum(deposit_overdue_payment.amount).label('total'))\
-                .filter(deposit_overdue_payment.date_created.between(
-                    year_start, year_stop)).scalar()
-
-            compare_loan_interests = db.session.query(
-                    func.count(loan.loan_id),
-                    func.sum(loan_type.rate * loan.amount * loan_type.max_period * 12)
-                ).join(loan_type, loan_type.loan_type_id == loan.loan_type).filter(
-                        loan.status == 'Paid', 
-                        loan.last_updated.between(year_start, year_stop)).all()
-
-            comparison_data = {
-                'financial year' : item,
-                'monthly deposits' : compare_deposits,
-                'installments' : compare_installments,
-                'supplied loans' : compare_loans,
-                'loan overdue payments' : compare_overdue_payments,
-                'registration fees' : compare_registration_fees,
-                'fully paid loan interest' : compare_loan_interests[0][1],
-                'monthly deposit overdue payments' : compare_deposit_overdue_payments
-                }
-            year_comparison.append(comparison_data)
-    return year_comparison
+    """Returns year_summary_columns() as one {series : total} row per financial year"""
+    return column_rows(year_summary_columns())
+
+
+def overdue_months(period = 12, today = None):
+    """
+    Returns {month_id : first day of the month} for the last {period} months up to {today}
+        period of None spans every registered month
+        today defaults to datetime.utcnow()
+    """
+    today = today or datetime.utcnow()
+
+    starts = dict()
+    for item in month.query.all():
+        start = datetime.strptime(item.description, "%B %Y")
+        if start <= today:
+            starts[item.month_id] = start
+
+    recent = sorted(starts, key = starts.get, reverse = True)
+    if period is not None:
+        recent = recent[:period]
+
+    return {month_id : starts[month_id] for month_id in recent}
+
+
+def overdue_monthly_deposit_shortfalls(starts, limit, members = None):
+    """
+    Computes the deposit shortfall of every member for every month in {starts} that has
+    no overdue record yet, as a single anti-join over members x months.
+        starts is the output of overdue_months()
+        limit is the minimum monthly deposit
+        members is an optional (first, last) range of member IDs to restrict the sweep to
+        Returns a query of (member_id, month_id, amount) rows
+    """
+
+    paid = db.session.query(
+            monthly_deposit.member_id,
+            monthly_deposit.month_id,
+            func.sum(monthly_deposit.amount).label('amount'))\
+        .filter(monthly_deposit.month_id.in_(starts.keys()))\
+        .group_by(monthly_deposit.member_id, monthly_deposit.month_id).subquery()
+    deposited = func.coalesce(paid.c.amount, 0)
+
+    query = db.session.query(
+            member.member_id,
+            month.month_id,
+            (limit - deposited).label('amount'))\
+        .select_from(member)\
+        .join(month, and_(
+            month.month_id.in_(starts.keys()),
+            member.date_created < case(starts, value = month.month_id)))\
+        .outerjoin(paid, and_(
+            paid.c.member_id == member.member_id,
+            paid.c.month_id == month.month_id))\
+        .outerjoin(monthly_deposit_overdue, and_(
+            monthly_deposit_overdue.member_id == member.member_id,
+            monthly_deposit_overdue.month_id == month.month_id))\
+        .filter(
+            monthly_deposit_overdue.monthly_deposit_overdue_id == None,
+            deposited < limit)
+
+    if members is not None:
+        query = query.filter(member.member_id.between(*members))
+    return query
+
+
+def generate_overdue_monthly_deposits(period = 12, today = None, stamp = None, 
+        members = None):
+    """
+    Records overdue monthly deposits of all members for the last {period} months from
+    a single SELECT of the shortfalls. Months already charged are skipped. The caller
+    commits; the cached summaries, charts and KPIs are dropped once it does.
+        today is the date the period is counted back from
+        stamp is the creation date of the records; defaults to datetime.utcnow()
+        members is an optional (first, last) range of member IDs to restrict the sweep to
+        Returns the number of overdue records created
+    """
+    limit = int(flask.current_app.config['DEPOSIT_OVERDUE'])
+    stamp = stamp or datetime.utcnow()
+
+    starts = overdue_months(period, today)
+    if not starts:
+        return 0
+
+    #the inserted rows are exactly those selected, so they give the count and the total
+    shortfalls = overdue_monthly_deposit_shortfalls(starts, limit, members).all()
+    if not shortfalls:
+        return 0
+
+    db.session.execute(monthly_deposit_overdue.__table__.insert(), [{
+        'member_id' : member_id,
+        'month_id' : month_id,
+        'amount' : amount,
+        'status' : 'pending',
+        'date_created' : stamp,
+        'last_updated' : stamp} for member_id, month_id, amount in shortfalls])
+
+    #bulk inserts bypass the ORM listeners maintaining the ledger and the caches
+    ledger_rollup.record(db.session.connection(), 'deposit overdues', stamp,
+            sum(amount for member_id, month_id, amount in shortfalls), len(shortfalls))
+
+    from .graphs import invalidate_charts
+    session = db.session()
+    after_commit(session, invalidate_year_summaries, stamp.year)
+    after_commit(session, invalidate_charts)
+    after_commit(session, kpi_cache.invalidate, 'summary')
+    return len(shortfalls)
+
 
 def update_overdue_monthly_deposits(period = 12):
     """Retrieves all overdue monthly deposit payments for all members for the last {period} months."""
-    app = create_app(os.getenv('FLASK_CONFIG') or 'default')
-
-    ### failed implementation of time constraint
-
-    with app.app_context():
-        months = month.query.all()
-        for member_item in member.query.all():
-            for month_item in months:
-                if member_item.date_created < datetime.strptime(month_item.description, "%B %Y"):
-                    #check whether there is an existing overdue record for member on month_item
-                    overdues = monthly_deposit_overdue.query.filter(
-                            monthly_deposit_overdue.member_id == member_item.member_id,
-                            monthly_deposit_overdue.month_id == month_item.month_id).first()
-                    if overdues:
-                        continue #a record already exists; no need to continue with process
-
-                    #check whether member in question has made any deposit for the month
-                    deposits = db.session.query(func.sum(monthly_deposit.amount))\
-                        .filter(
-                            monthly_deposit.month_id == month_item.month_id,
-                            monthly_deposit.member_id == member_item.member_id).scalar()
-                    if not deposits:
-                        deposits = 0
-
-                    if (deposits == 0) or (deposits < flask.current_app.config['DEPOSIT_OVERDUE']):
-                        overdue = monthly_deposit_overdue(
-                                amount = flask.current_app.config['DEPOSIT_OVERDUE'] - deposits,
-                                month_id = month_item.month_id,
-                                member_id = member_item.member_id)
-                        db.session.add(overdue)
-                        print(f'Generation of overdue monthly deposit for ID {member_item.member_id} - {month_item.description}')
+    created = generate_overdue_monthly_deposits(period)
     db.session.commit()
-    return None
+    return created
+
+
+@job_handler('overdue monthly deposits')
+def overdue_monthly_deposits_job(Job, period = 12):
+    """Sweeps overdue monthly deposits in batches of JOB_BATCH_SIZE consecutive member IDs"""
+    size = int(flask.current_app.config['JOB_BATCH_SIZE'])
+
+    first, last = db.session.query(
+            func.min(member.member_id), func.max(member.member_id)).first()
+    if first is None:
+        return
+
+    Job.total = (last - first) // size + 1
+    start = first if Job.cursor is None else Job.cursor + 1
+    while start <= last:
+        stop = start + size - 1
+        yield stop, generate_overdue_monthly_deposits(period, members = (start, stop))
+        start = stop + 1
+
+
+@job_handler('rebuild ledger')
+def rebuild_ledger_job(Job):
+    """Recomputes the ledger rollups one year at a time"""
+    years = list()
+    for kind, model in ledger_kinds:
+        first, last = db.session.query(
+                func.min(model.date_created), func.max(model.date_created)).first()
+        if first is not None:
+            years += [first.year, last.year]
+    if not years:
+        return
+
+    Job.total = max(years) - min(years) + 1
+    year = min(years) if Job.cursor is None else Job.cursor + 1
+    while year <= max(years):
+        yield year, ledger_rollup.rebuild(year)
+        invalidate_year_summaries(year)
+        year += 1
@@ -18,6 +18,13 @@ class ImageForm(FlaskForm):
     submit = SubmitField('submit')
 
 
+class PaymentImportForm(FlaskForm):
+    file = FileField('select statement (CSV)', validators = [FileRequired(),
+        FileAllowed(['csv'], 'Select CSV Files Only.')])
+
+    submit = SubmitField('import')
+
+
 class OverduePaymentForm(FlaskForm):
     amount = IntegerField('enter amount', validators = [DataRequired()])
     submit = SubmitField('submit')
@@ -1,173 +1,265 @@
+import flask
+from sqlalchemy import event
 from pychartjs import BaseChart,ChartType, Color, Options
-from .dependencies import (monthly_records_summary_generator, year_summary_data_generator,
-        all_monthly_deposits)
-
-
-class MonthlyDepositsGraph(BaseChart):
-    type = ChartType.Line
-
-    class labels:
-        months = [item.get('month') for item in all_monthly_deposits()]
-
-    class data:
-        data = [item.get('total') for item in all_monthly_deposits()]
-        label = "Monthly Deposits"
-        borderColor = Color.Green
-        fill = False
-        yAxisID = "all_monthly_deposits"
-    class options:
-        title = Options.Title("Comparison on Monthly Deposits (in Ksh.)")
-
-        scales = {
-                "yAxes" : [
-                    {
-                        "id" : "all_monthly_deposits",
-                        "ticks" : {
-                            "beginAtZero" : False,
-                            }
-                    }
-                    ]
+
+from ..cache import TimedCache, after_commit
+from ..models import loan, ledger_kinds
+from .dependencies import year_summary_columns, column_rows
+
+#Chart.js JSON of built charts; dropped once a new transaction is committed. The cache
+#is per process: other gunicorn workers keep their charts for CHART_CACHE_TIMEOUT
+chart_cache = TimedCache()
+
+
+def cached_chart(key, builder):
+    """
+    cached_chart(key, builder)
+        Returns the chart JSON cached under key, calling builder() to create it when stale
+    """
+    return chart_cache.get_or_set(key, builder, 
+            flask.current_app.config['CHART_CACHE_TIMEOUT'])
+
+
+def invalidate_charts(*args):
+    """Drops every cached chart so that the next request rebuilds it from current data"""
+    chart_cache.invalidate()
+
+
+def chart_listener(mapper, connection, target):
+    after_commit(target, invalidate_charts)
+
+for kind, model in ledger_kinds:
+    event.listen(model, 'after_insert', chart_listener)
+event.listen(loan, 'after_update', chart_listener)
+
+
+def years_comparison():
+    """
+    years_comparison()
+        Returns the financial years comparison table rows and chart JSON as
+        {'year_comparison' : rows, 'years_comparison_JSON' : chart}
+    """
+    def build():
+        year_columns = year_summary_columns()
+        return {
+                'year_comparison' : column_rows(year_columns),
+                'years_comparison_JSON' : build_years_comparison_graph(year_columns).get()
                 }
+    return cached_chart('years comparison', build)
+
+
+def year_deposits_chart(year_columns = None):
+    """
+    year_deposits_chart(year_columns)
+        Returns the chart JSON comparing the monthly deposits of the financial years
+        year_columns is the output of year_summary_columns(); fetched when not provided
+    """
+    def build():
+        data = year_columns if year_columns is not None else year_summary_columns()
+        return build_year_deposits_graph(data).get()
+    return cached_chart('year deposits', build)
 
 
-class MonthComparisonGraph(BaseChart):
-    type = ChartType.Line
+def build_monthly_deposits_graph(deposits_data):
+    """Builds the line chart of totals of all_monthly_deposits() records"""
+    class MonthlyDepositsGraph(BaseChart):
+        type = ChartType.Line
 
-    class labels:
-        months = [item.get('description') for item in monthly_records_summary_generator()]
+        class labels:
+            months = [item.get('month') for item in deposits_data]
 
-    class data:
-        
-        class monthly_deposits:
-            data= [item.get('deposits')[0][1] for item in 
-                monthly_records_summary_generator()]
+        class data:
+            data = [item.get('total') for item in deposits_data]
             label = "Monthly Deposits"
-            borderColor = Color.Red
-            fill = False
-            yAxisID = "comparison"
-        
-        class installments: 
-            data= [item.get('installments')[0][1] for item in 
-                monthly_records_summary_generator()]
-            label = "Installments"
             borderColor = Color.Green
             fill = False
-            yAxisID = "comparison"
+            yAxisID = "all_monthly_deposits"
+        class options:
+            title = Options.Title("Comparison on Monthly Deposits (in Ksh.)")
 
-        class supplied_loans:         
-            data = [item.get('loans')[0][1] for item in 
-                monthly_records_summary_generator()]
-            label = "Supplied Loans"
-            borderColor = Color.Brown
-            fill = False
-            yAxisID = "comparison"
+            scales = {
+                    "yAxes" : [
+                        {
+                            "id" : "all_monthly_deposits",
+                            "ticks" : {
+                                "beginAtZero" : False,
+                                }
+                        }
+                        ]
+                    }
 
-        class loan_overdue_payments:   
-            data= [item.get('overdue payments')[0][1] 
-                    for item in monthly_records_summary_generator()]
-            label = "Loan Overdue Payments"
-            borderColor = Color.Orange
-            fill = False
-            yAxisID = "comparison"
+    return MonthlyDepositsGraph()
 
-        class registration_fees:        
-            data = [item.get('registration fees')[0][1]
-                    for item in monthly_records_summary_generator()]
-            label = "Registration Fees"
-            borderColor = Color.Blue
-            fill = False
-            yAxisID = "comparison"
 
+def build_month_comparison_graph(month_data):
+    """Builds the line chart of monthly_records_summary_generator() records"""
+    class MonthComparisonGraph(BaseChart):
+        type = ChartType.Line
 
-        class monthly_deposit_overdue_payments:   
-            data= [item.get('deposit overdue payments')[0][1] 
-                    for item in monthly_records_summary_generator()]
-            label = "Monthly Deposit Overdue Payments"
-            borderColor = Color.Black 
-            fill = False
-            yAxisID = "monthly"
-
-    class options:
-        title = Options.Title("Comparison on Monthly Financial Status (in Ksh.)")
-
-        scales = {
-                "yAxes" : [
-                    {
-                        "id" : "monthly",
-                        "ticks" : {
-                            "beginAtZero" : True, 
-                            },
-                        "label" : "Amount in Kenyan Shillings"
+        class labels:
+            months = [item.get('description') for item in month_data]
+
+        class data:
+
+            class monthly_deposits:
+                data= [item.get('deposits')[0][1] for item in month_data]
+                label = "Monthly Deposits"
+                borderColor = Color.Red
+                fill = False
+                yAxisID = "comparison"
+
+            class installments: 
+                data= [item.get('installments')[0][1] for item in month_data]
+                label = "Installments"
+                borderColor = Color.Green
+                fill = False
+                yAxisID = "comparison"
+
+            class supplied_loans:         
+                data = [item.get('loans')[0][1] for item in month_data]
+                label = "Supplied Loans"
+                borderColor = Color.Brown
+                fill = False
+                yAxisID = "comparison"
+
+            class loan_overdue_payments:   
+                data= [item.get('overdue payments')[0][1] 
+                        for item in month_data]
+                label = "Loan Overdue Payments"
+                borderColor = Color.Orange
+                fill = False
+                yAxisID = "comparison"
+
+            class registration_fees:        
+                data = [item.get('registration fees')[0][1]
+                        for item in month_data]
+                label = "Registration Fees"
+                borderColor = Color.Blue
+                fill = False
+                yAxisID = "comparison"
+
+
+            class monthly_deposit_overdue_payments:   
+                data= [item.get('deposit overdue payments')[0][1] 
+                        for item in month_data]
+                label = "Monthly Deposit Overdue Payments"
+                borderColor = Color.Black 
+                fill = False
+                yAxisID = "monthly"
+
+        class options:
+            title = Options.Title("Comparison on Monthly Financial Status (in Ksh.)")
+
+            scales = {
+                    "yAxes" : [
+                        {
+                            "id" : "monthly",
+                            "ticks" : {
+                                "beginAtZero" : True, 
+                                },
+                            "label" : "Amount in Kenyan Shillings"
+                        }
+                        ]
                     }
-                    ]
-                }
 
-class YearsComparisonGraph(BaseChart):
-    type = ChartType.Line
+    return MonthComparisonGraph()
 
-    class labels:
-        years = [item.get('financial year') for item in year_summary_data_generator()]
 
-    class data:
-        
-        class monthly_deposits:
-            data= [item.get('monthly deposits') for item in year_summary_data_generator()]
-            label = "Monthly Deposits"
-            borderColor = Color.Red
-            fill = False
-            yAxisID = "comparison"
-        
-        class installments: 
-            data= [item.get('installments') for item in year_summary_data_generator()]
-            label = "Installments"
-            borderColor = Color.Green
-            fill = False
-            yAxisID = "comparison"
+def build_year_deposits_graph(year_columns):
+    """Builds the bar chart of the monthly deposits column of year_summary_columns()"""
+    class YearDepositsGraph(BaseChart):
+        type = ChartType.Bar
 
-        class supplied_loans:         
-            data= [item.get('supplied loans') for item in year_summary_data_generator()]
-            label = "Supplied Loans"
-            borderColor = Color.Brown
-            fill = False
-            yAxisID = "comparison"
+        class labels:
+            years = year_columns['financial year']
 
-        class loan_overdue_payments:   
-            data= [item.get('loan overdue payments') 
-                    for item in year_summary_data_generator()]
-            label = "Loan Overdue Payments"
-            borderColor = Color.Orange
-            fill = False
-            yAxisID = "comparison"
+        class data:
+            data = [item or 0 for item in year_columns['monthly deposits']]
+            label = "Comparison on Monthly Deposits"
+            backgroundColor = Color.Green
 
-        class registration_fees:        
-            data = [item.get('registration fees') 
-                    for item in year_summary_data_generator()]
-            label = "Registration Fees"
-            borderColor = Color.Blue
-            fill = False
-            yAxisID = "comparison"
+        class options:
+            title = Options.Title("Monthly Deposits per Financial Year (in Ksh.)")
 
+            scales = {
+                    "yAxes" : [
+                        {
+                            "ticks" : {
+                                "beginAtZero" : True,
+                                }
+                        }
+                        ]
+                    }
 
-        class monthly_deposit_overdue_payments:   
-            data= [item.get('monthly deposit overdue payments') 
-                    for item in year_summary_data_generator()]
-            label = "Monthly Deposit Overdue Payments"
-            borderColor = Color.Black 
-            fill = False
-            yAxisID = "comparison"
-
-    class options:
-        title = Options.Title("Financial Year Comparisons (in Ksh.)")
-
-        scales = {
-                "yAxes" : [
-                    {
-                        "id" : "comparison",
-                        "ticks" : {
-                            "beginAtZero" : True, 
-                            },
-                        "label" : "Amount in Kenyan Shillings"
+    return YearDepositsGraph()
+
+
+def build_years_comparison_graph(year_columns):
+    """Builds the line chart of the columns of year_summary_columns()"""
+    class YearsComparisonGraph(BaseChart):
+        type = ChartType.Line
+
+        class labels:
+            years = year_columns['financial year']
+
+        class data:
+
+            class monthly_deposits:
+                data = year_columns['monthly deposits']
+                label = "Monthly Deposits"
+                borderColor = Color.Red
+                fill = False
+                yAxisID = "comparison"
+
+            class installments: 
+                data = year_columns['installments']
+                label = "Installments"
+                borderColor = Color.Green
+                fill = False
+                yAxisID = "comparison"
+
+            class supplied_loans:         
+                data = year_columns['supplied loans']
+                label = "Supplied Loans"
+                borderColor = Color.Brown
+                fill = False
+                yAxisID = "comparison"
+
+            class loan_overdue_payments:   
+                data = year_columns['loan overdue payments']
+                label = "Loan Overdue Payments"
+                borderColor = Color.Orange
+                fill = False
+                yAxisID = "comparison"
+
+            class registration_fees:        
+                data = year_columns['registration fees']
+                label = "Registration Fees"
+                borderColor = Color.Blue
+                fill = False
+                yAxisID = "comparison"
+
+
+            class monthly_deposit_overdue_payments:   
+                data = year_columns['monthly deposit overdue payments']
+                label = "Monthly Deposit Overdue Payments"
+                borderColor = Color.Black 
+                fill = False
+                yAxisID = "comparison"
+
+        class options:
+            title = Options.Title("Financial Year Comparisons (in Ksh.)")
+
+            scales = {
+                    "yAxes" : [
+                        {
+                            "id" : "comparison",
+                            "ticks" : {
+                                "beginAtZero" : True, 
+                                },
+                            "label" : "Amount in Kenyan Shillings"
+                        }
+                        ]
                     }
-                    ]
-                }
 
+    return YearsComparisonGraph()
@@ -0,0 +1,419 @@
+import csv, os, math, itertools
+from collections import defaultdict
+from datetime import datetime
+
+import flask
+from .. import db
+from ..jobs import job_handler
+from ..cache import after_commit
+from ..kpis import kpi_cache
+from ..models import (member, phone_number, month, loan, installment,
+        monthly_deposit, loan_overdue, loan_overdue_payment, monthly_deposit_overdue,
+        deposit_overdue_payment, ledger_rollup, imported_payment)
+from .summaries import invalidate_year_summaries
+
+#values of the kind column and the ledger kind of the records they are imported as
+kinds = {
+        'deposit' : 'deposits',
+        'installment' : 'installments',
+        'loan overdue' : 'overdue payments',
+        'deposit overdue' : 'deposit overdue payments'
+        }
+
+#date formats of bank and M-Pesa statement exports
+date_formats = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d',
+        '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y')
+
+report_header = ['row', 'reference', 'id_no', 'phone_no', 'kind', 'amount', 'status',
+        'member_id', 'record', 'reason']
+
+
+class statement_entry:
+    """
+    class statement_entry
+        One validated row of a payment statement, matched to a member and then to the
+        record it pays into (month, loan or overdue charge)
+    """
+    __slots__ = ('row', 'reference', 'id_no', 'phone_no', 'kind', 'amount', 'date',
+            'month', 'member_id', 'target', 'reason')
+
+    def __init__(self, row, values):
+        self.row = row
+        self.reference = (values.get('reference') or '').strip()
+        self.id_no = (values.get('id_no') or '').strip()
+        self.phone_no = (values.get('phone_no') or '').strip()
+        self.kind = (values.get('kind') or '').strip().lower()
+        self.amount = (values.get('amount') or '').strip()
+        self.date = (values.get('date') or '').strip()
+        self.month = (values.get('month') or '').strip()
+        self.member_id = self.target = self.reason = None
+
+        try:
+            self.validate()
+        except ValueError as error:
+            self.reason = str(error)
+
+    def validate(self):
+        if not self.reference:
+            raise ValueError('no reference')
+        if self.kind not in kinds:
+            raise ValueError(f'unknown kind {self.kind!r}')
+
+        try:
+            amount = float(self.amount.replace(',', ''))
+        except ValueError:
+            raise ValueError(f'invalid amount {self.amount!r}')
+        #records hold whole shillings; a fraction is not rounded away silently
+        if not amount.is_integer():
+            raise ValueError(f'amount {self.amount!r} is not a whole number')
+        self.amount = int(amount)
+        if self.amount <= 0:
+            raise ValueError('amount cannot be zero or less')
+
+        for item in date_formats:
+            try:
+                self.date = datetime.strptime(self.date, item)
+                break
+            except ValueError:
+                pass
+        else:
+            raise ValueError(f'invalid date {self.date!r}')
+        self.month = self.month or self.date.strftime('%B %Y')
+
+        if not self.id_no and not self.phone_no:
+            raise ValueError('neither an ID number nor a phone number')
+        if self.id_no and not self.id_no.isdigit():
+            raise ValueError(f'invalid ID number {self.id_no!r}')
+
+    def reject(self, reason):
+        self.reason = reason
+
+    def report(self):
+        return [self.row, self.reference, self.id_no, self.phone_no, self.kind,
+                self.amount, 'rejected' if self.reason else 'imported', self.member_id,
+                self.target, self.reason or '']
+
+
+def phone_variants(phone_no):
+    """Returns the local and international spellings of a Kenyan phone number"""
+    digits = ''.join(item for item in phone_no if item.isdigit())
+    if len(digits) < 9:
+        return {phone_no}
+    return {phone_no, digits, '0' + digits[-9:], '254' + digits[-9:], '+254' + digits[-9:]}
+
+
+def match_members(entries):
+    """Sets the member_id of entries from their ID numbers, otherwise their phone numbers"""
+    id_nos = {int(item.id_no) for item in entries if item.id_no}
+    phones = set()
+    for item in entries:
+        if item.phone_no:
+            phones |= phone_variants(item.phone_no)
+
+    by_id_no = dict(db.session.query(member.id_no, member.member_id)\
+            .filter(member.id_no.in_(id_nos)).all()) if id_nos else {}
+    by_phone = dict(db.session.query(phone_number.phone_no, phone_number.member_id)\
+            .filter(phone_number.phone_no.in_(phones)).all()) if phones else {}
+
+    for item in entries:
+        if item.id_no:
+            item.member_id = by_id_no.get(int(item.id_no))
+        if item.member_id is None and item.phone_no:
+            item.member_id = next((by_phone[phone] for phone in
+                phone_variants(item.phone_no) if phone in by_phone), None)
+        if item.member_id is None:
+            item.reject('no member with this ID number or phone number')
+
+
+def skip_imported(entries):
+    """Rejects entries whose reference was imported before or repeats in entries"""
+    imported = {item[0] for item in db.session.query(imported_payment.reference)\
+            .filter(imported_payment.reference.in_({item.reference for item in entries}))}
+
+    for item in entries:
+        if item.reference in imported:
+            item.reject(f'reference {item.reference!r} already imported')
+        imported.add(item.reference)
+
+
+def lock_rows(model, key, values):
+    """Locks the records of model whose key is in values before their totals are read"""
+    if values:
+        #setting the column to itself keeps its onupdate from moving the records' dates
+        model.query.filter(key.in_(values)).update({'last_updated' : model.last_updated},
+                synchronize_session = False)
+
+
+def allocate_deposits(entries):
+    months = dict(db.session.query(month.description, month.month_id)\
+            .filter(month.description.in_({item.month for item in entries})).all())
+
+    records = []
+    for item in entries:
+        if item.month not in months:
+            item.reject(f'unknown month {item.month!r}')
+            continue
+        item.target = months[item.month]
+        records.append({'member_id' : item.member_id, 'month_id' : item.target,
+            'amount' : item.amount, 'date_created' : item.date})
+
+    if records:
+        db.session.execute(monthly_deposit.__table__.insert(), records)
+
+
+def allocate_installments(entries):
+    members = {item.member_id for item in entries}
+    pending = [item[0] for item in db.session.query(loan.loan_id)\
+            .filter(loan.member_id.in_(members), loan.status == 'pending').all()]
+    lock_rows(loan, loan.loan_id, pending)
+
+    #balances are read after the lock so tellers posting meanwhile are accounted for
+    loans = dict()
+    for loan_id, member_id, repayable, paid in db.session.query(loan.loan_id,
+            loan.member_id, loan.amount + loan.interest, loan.amount_paid)\
+            .filter(loan.loan_id.in_(pending)).order_by(loan.loan_id).all():
+        loans.setdefault(member_id, [loan_id, repayable, paid])
+
+    records, paid, settled = [], defaultdict(int), dict()
+    for item in entries:
+        balance = loans.get(item.member_id)
+        if balance is None:
+            item.reject('member has no pending loan')
+            continue
+        if balance[2] + item.amount > balance[1]:
+            item.reject(f'over payment, loan {balance[0]} owes {balance[1] - balance[2]:g}')
+            continue
+
+        balance[2] += item.amount
+        paid[balance[0]] += item.amount
+        item.target = balance[0]
+        records.append({'loan_id' : item.target, 'amount' : item.amount,
+            'date_created' : item.date})
+
+        #a loan is dated paid by the statement entry that settled it
+        if balance[2] >= balance[1]:
+            settled[balance[0]] = item.date
+
+    if records:
+        db.session.execute(installment.__table__.insert(), records)
+
+    table = loan.__table__
+    for loan_id, amount in paid.items():
+        db.session.execute(table.update().where(table.c.loan_id == loan_id).values(
+            amount_paid = table.c.amount_paid + amount,
+            outstanding = table.c.outstanding - amount))
+
+    for loan_id, date in settled.items():
+        db.session.execute(table.update().where(table.c.loan_id == loan_id).values(
+            status = 'Paid', last_updated = date))
+
+
+def allocate_overdue_payments(entries, overdue, key, payment, payments_key, paid_status,
+        charges):
+    """
+    allocate_overdue_payments(entries, overdue, key, payment, payments_key, paid_status,
+            charges)
+        Pays every entry into the oldest pending overdue record of its member it does not
+        exceed; charges is a query of (overdue ID, member ID, amount owed)
+        Returns {overdue ID : amount paid} of the payments inserted
+    """
+    pending = charges.filter(overdue.status == 'pending').order_by(key).all()
+    lock_rows(overdue, key, [item[0] for item in pending])
+
+    already = dict(db.session.query(payments_key, db.func.sum(payment.amount))\
+            .filter(payments_key.in_([item[0] for item in pending]))\
+            .group_by(payments_key).all()) if pending else {}
+
+    owed = defaultdict(list)
+    for overdue_id, member_id, amount in pending:
+        owed[member_id].append([overdue_id, amount - (already.get(overdue_id) or 0)])
+
+    records, paid = [], defaultdict(int)
+    for item in entries:
+        charge = next((charge for charge in owed.get(item.member_id, ())
+            if 0 < item.amount <= charge[1]), None)
+        if charge is None:
+            item.reject('no pending overdue charge of at least this amount')
+            continue
+
+        charge[1] -= item.amount
+        paid[charge[0]] += item.amount
+        item.target = charge[0]
+        records.append({payments_key.key : item.target, 'amount' : item.amount,
+            'date_created' : item.date})
+
+    if records:
+        db.session.execute(payment.__table__.insert(), records)
+
+    settled = [charge[0] for charges in owed.values() for charge in charges
+            if charge[1] <= 0 and charge[0] in paid]
+    if settled:
+        overdue.query.filter(key.in_(settled)).update({'status' : paid_status},
+                synchronize_session = False)
+    return paid
+
+
+def allocate_loan_overdues(entries):
+    members = {item.member_id for item in entries}
+    paid = allocate_overdue_payments(entries, loan_overdue, loan_overdue.loan_overdue_id,
+            loan_overdue_payment, loan_overdue_payment.loan_overdue_id, 'Paid',
+            db.session.query(loan_overdue.loan_overdue_id, loan.member_id,
+                loan_overdue.amount)\
+            .join(loan, loan.loan_id == loan_overdue.loan_id)\
+            .filter(loan.member_id.in_(members)))
+
+    #keep the overdue_paid balance of the loans charged in step
+    loans = defaultdict(int)
+    for loan_overdue_id, loan_id in db.session.query(loan_overdue.loan_overdue_id,
+            loan_overdue.loan_id).filter(loan_overdue.loan_overdue_id.in_(paid)).all():
+        loans[loan_id] += paid[loan_overdue_id]
+
+    table = loan.__table__
+    for loan_id, amount in loans.items():
+        db.session.execute(table.update().where(table.c.loan_id == loan_id).values(
+            overdue_paid = table.c.overdue_paid + amount,
+            outstanding = table.c.outstanding - amount))
+
+
+def allocate_deposit_overdues(entries):
+    members = {item.member_id for item in entries}
+    allocate_overdue_payments(entries, monthly_deposit_overdue,
+            monthly_deposit_overdue.monthly_deposit_overdue_id, deposit_overdue_payment,
+            deposit_overdue_payment.monthly_deposit_overdue_id, 'paid',
+            db.session.query(monthly_deposit_overdue.monthly_deposit_overdue_id,
+                monthly_deposit_overdue.member_id, monthly_deposit_overdue.amount)\
+            .filter(monthly_deposit_overdue.member_id.in_(members)))
+
+
+allocators = {
+        'deposit' : allocate_deposits,
+        'installment' : allocate_installments,
+        'loan overdue' : allocate_loan_overdues,
+        'deposit overdue' : allocate_deposit_overdues
+        }
+
+
+def import_batch(rows, job_id = None):
+    """
+    import_batch(rows, job_id)
+        Validates, matches and inserts a batch of (row number, values) statement rows with
+        one INSERT per kind, keeping ledger rollups and loan balances in step, and logs
+        the references imported so that they are skipped when they come again; the
+        caller commits. Returns the batch's entries, rejected ones carrying their reason.
+    """
+    entries = [statement_entry(row, values) for row, values in rows]
+    valid = [item for item in entries if not item.reason]
+    if valid:
+        skip_imported(valid)
+        valid = [item for item in valid if not item.reason]
+    if valid:
+        match_members(valid)
+
+    for kind, allocate in allocators.items():
+        batch = [item for item in valid if item.kind == kind and not item.reason]
+        if batch:
+            allocate(batch)
+
+    #bulk inserts bypass the rollup listeners
+    rollups = defaultdict(lambda: [0, 0])
+    for item in valid:
+        if not item.reason:
+            rollup = rollups[(kinds[item.kind], item.date.year, item.date.month)]
+            rollup[0] += 1
+            rollup[1] += item.amount
+
+    connection = db.session.connection()
+    for (kind, year, month_number), (count, total) in rollups.items():
+        ledger_rollup.record(connection, kind, datetime(year, month_number, 1), total, count)
+
+    imported = [{'reference' : item.reference, 'kind' : item.kind, 'record' : item.target,
+        'amount' : item.amount, 'member_id' : item.member_id, 'job_id' : job_id,
+        'date_created' : datetime.utcnow()} for item in valid if not item.reason]
+    if imported:
+        db.session.execute(imported_payment.__table__.insert(), imported)
+
+    #nor do they reach the cache listeners
+    if rollups:
+        from .graphs import invalidate_charts
+        session = db.session()
+        after_commit(session, invalidate_year_summaries,
+                min(year for kind, year, month_number in rollups))
+        after_commit(session, invalidate_charts)
+        after_commit(session, kpi_cache.invalidate, 'summary')
+
+    return entries
+
+
+def write_report(path, entries):
+    """
+    Appends the reconciliation lines of entries to the report at path, on disk before
+    the batch is committed
+    """
+    new = not os.path.exists(path)
+    with open(path, 'a', newline = '') as report:
+        writer = csv.writer(report)
+        if new:
+            writer.writerow(report_header)
+        writer.writerows(item.report() for item in entries)
+        report.flush()
+        os.fsync(report.fileno())
+
+
+def trim_report(path, done):
+    """
+    Drops the lines of statement rows beyond done from the report at path, those of a
+    batch that was written but never committed before the job was interrupted
+    """
+    if not os.path.exists(path):
+        return
+
+    with open(path, newline = '') as report:
+        lines = list(csv.reader(report))
+    kept = lines[:1] + [line for line in lines[1:] if int(line[0]) <= done]
+    if len(kept) == len(lines):
+        return
+
+    with open(path, 'w', newline = '') as report:
+        csv.writer(report).writerows(kept)
+
+
+def statement_rows(source):
+    """Yields (row number, values) of a statement file with normalised column names"""
+    reader = csv.DictReader(source)
+    reader.fieldnames = [item.strip().lower().replace(' ', '_')
+            for item in reader.fieldnames or []]
+
+    missing = {'reference', 'date', 'kind', 'amount'} - set(reader.fieldnames)
+    if missing or not {'id_no', 'phone_no'} & set(reader.fieldnames):
+        raise ValueError('statement needs reference, date, kind and amount columns and an '
+                'id_no or phone_no column')
+    return enumerate(reader, start = 1)
+
+
+@job_handler('payment import')
+def payment_import_job(Job, path, report):
+    """
+    Imports the payments of the statement CSV at path in batches of JOB_BATCH_SIZE rows,
+    appending every row's outcome to the reconciliation report at report
+    """
+    size = int(flask.current_app.config['JOB_BATCH_SIZE'])
+
+    #utf-8-sig drops the byte order mark spreadsheet exports start with
+    with open(path, newline = '', encoding = 'utf-8-sig') as source:
+        Job.total = math.ceil(sum(1 for item in statement_rows(source)) / size)
+
+    done = Job.cursor or 0
+    trim_report(report, done)
+    with open(path, newline = '', encoding = 'utf-8-sig') as source:
+        rows = itertools.islice(statement_rows(source), done, None)
+        while True:
+            batch = list(itertools.islice(rows, size))
+            if not batch:
+                break
+
+            entries = import_batch(batch, Job.job_id)
+            done += len(batch)
+
+            #the lines of a batch are kept only once it is committed; see trim_report()
+            write_report(report, entries)
+            yield done, sum(1 for item in entries if not item.reason)
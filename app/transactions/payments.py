@@ -0,0 +1,107 @@
+from sqlalchemy import func
+
+from .. import db
+from ..models import (loan, installment, loan_overdue, loan_overdue_payment,
+        monthly_deposit_overdue, deposit_overdue_payment)
+
+#Every posting starts its transaction with an UPDATE of the row it pays into. The UPDATE
+#takes the row lock (a write lock on SQLite) before anything is read, so concurrent
+#postings to the same record queue up behind each other instead of all reading the same
+#paid total and overpaying; postings to different records never wait for each other.
+
+
+def lock_row(model, key, value, condition = None):
+    """
+    lock_row(model, key, value, condition)
+        Locks the record of model whose key is value, provided condition holds on it, by
+        rewriting its last_updated column unchanged; returns False when no record
+        qualified
+    """
+    query = model.query.filter(key == value)
+    if condition is not None:
+        query = query.filter(condition)
+    #setting the column to itself keeps its onupdate from moving the record's dates
+    return query.update({'last_updated' : model.last_updated},
+            synchronize_session = False) == 1
+
+
+def post_installment(loan_id, amount, limit):
+    """
+    post_installment(loan_id, amount, limit)
+        Posts an installment of amount to loan, loan_id unless it takes the amount paid
+        beyond limit, marking the loan Paid when limit is reached
+        Returns the balance left to pay, or None when the installment was refused
+    """
+    #the check and the lock are one statement against the loan's amount_paid column
+    if not lock_row(loan, loan.loan_id, loan_id, loan.amount_paid + amount <= limit):
+        db.session.rollback()
+        return None
+
+    db.session.add(installment(amount = amount, loan_id = loan_id))
+    db.session.flush()
+
+    balance = limit - db.session.query(loan.amount_paid).filter_by(loan_id = loan_id).scalar()
+    if balance == 0:
+        Loan = loan.query.get(loan_id)
+        Loan.status = 'Paid'
+        db.session.add(Loan)
+
+    db.session.commit()
+    return balance
+
+
+def post_overdue_payment(overdue, key, payment, payments_key, amount, paid_status):
+    """
+    post_overdue_payment(overdue, key, payment, payments_key, amount, paid_status)
+        Posts a payment of amount against the overdue record of model overdue whose ID is
+        key, unless its payments would exceed the record's amount; payment is the payment
+        model and payments_key its column referencing overdue
+        Returns the balance left to pay, or None when the payment was refused
+    """
+    primary_key = db.inspect(overdue).primary_key[0]
+    paid = db.select([func.coalesce(func.sum(payment.amount), 0)])\
+            .where(payments_key == key).as_scalar()
+
+    #the check and the lock are one statement against the overdue's own amount
+    if not lock_row(overdue, primary_key, key, paid + amount <= overdue.amount):
+        db.session.rollback()
+        return None
+
+    #no other posting can pay into the overdue until this transaction ends. The check is
+    #repeated on the payments read now: under READ COMMITTED, PostgreSQL re-evaluates the
+    #UPDATE's condition on the locked row but not the payments subquery within it
+    limit, paid = db.session.query(overdue.amount, paid).filter(primary_key == key).one()
+    if paid + amount > limit:
+        db.session.rollback()
+        return None
+
+    db.session.add(payment(amount = amount, **{payments_key.key : key}))
+
+    balance = limit - (paid + amount)
+    if balance == 0:
+        Overdue = overdue.query.get(key)
+        Overdue.status = paid_status
+        db.session.add(Overdue)
+
+    db.session.commit()
+    return balance
+
+
+def post_loan_overdue_payment(loan_overdue_id, amount):
+    """
+    post_loan_overdue_payment(loan_overdue_id, amount)
+        Pays amount towards loan overdue charge, loan_overdue_id
+        Returns the balance left to pay, or None when the payment was refused
+    """
+    return post_overdue_payment(loan_overdue, loan_overdue_id, loan_overdue_payment,
+            loan_overdue_payment.loan_overdue_id, amount, 'Paid')
+
+
+def post_deposit_overdue_payment(overdue_id, amount):
+    """
+    post_deposit_overdue_payment(overdue_id, amount)
+        Pays amount towards monthly deposit overdue charge, overdue_id
+        Returns the balance left to pay, or None when the payment was refused
+    """
+    return post_overdue_payment(monthly_deposit_overdue, overdue_id, deposit_overdue_payment,
+            deposit_overdue_payment.monthly_deposit_overdue_id, amount, 'paid')
@@ -0,0 +1,144 @@
+from collections import namedtuple
+from sqlalchemy import union_all, select, literal, cast, func
+
+from .. import db
+from ..models import (loan, installment, loan_overdue, loan_overdue_payment, month,
+        monthly_deposit, monthly_deposit_overdue, deposit_overdue_payment, registration_fee)
+
+#account affected by every kind of ledger event and the sign of its effect on it
+accounts = {
+        'registration fee' : (None, 0),
+        'deposit' : ('savings', 1),
+        'loan' : ('loans', 1),
+        'installment' : ('loans', -1),
+        'loan overdue' : ('charges', 1),
+        'loan overdue payment' : ('charges', -1),
+        'deposit overdue' : ('charges', 1),
+        'deposit overdue payment' : ('charges', -1)
+        }
+
+#one line of a member statement with the balances after the event
+statement_line = namedtuple('statement_line', ['date', 'kind', 'reference', 'description',
+    'amount', 'savings', 'loans', 'charges'])
+
+
+def event_select(date_created, kind, reference, description, amount):
+    return select([
+        date_created.label('date_created'),
+        literal(kind).label('kind'),
+        reference.label('reference'),
+        cast(description, db.String).label('description'),
+        amount.label('amount')])
+
+
+def ledger_events(member_id, start = None, stop = None):
+    """
+    ledger_events(member_id, start, stop)
+        Returns a UNION ALL of the member's ledger events created in [start, stop) as
+        (date_created, kind, reference, description, amount) rows
+    """
+    def within(query, model):
+        if start is not None:
+            query = query.where(model.date_created >= start)
+        if stop is not None:
+            query = query.where(model.date_created < stop)
+        return query
+
+    return union_all(
+        within(event_select(registration_fee.date_created, 'registration fee',
+                registration_fee.fee_id, literal(''), registration_fee.amount)\
+            .where(registration_fee.member_id == member_id), registration_fee),
+
+        within(event_select(monthly_deposit.date_created, 'deposit',
+                monthly_deposit.deposit_id, month.description, monthly_deposit.amount)\
+            .select_from(monthly_deposit.__table__.join(month.__table__,
+                month.month_id == monthly_deposit.month_id))\
+            .where(monthly_deposit.member_id == member_id), monthly_deposit),
+
+        within(event_select(loan.date_created, 'loan',
+                loan.loan_id, loan.status, loan.amount)\
+            .where(loan.member_id == member_id), loan),
+
+        within(event_select(installment.date_created, 'installment',
+                installment.installment_id, loan.loan_id, installment.amount)\
+            .select_from(installment.__table__.join(loan.__table__,
+                loan.loan_id == installment.loan_id))\
+            .where(loan.member_id == member_id), installment),
+
+        within(event_select(loan_overdue.date_created, 'loan overdue',
+                loan_overdue.loan_overdue_id, loan_overdue.month, loan_overdue.amount)\
+            .select_from(loan_overdue.__table__.join(loan.__table__,
+                loan.loan_id == loan_overdue.loan_id))\
+            .where(loan.member_id == member_id), loan_overdue),
+
+        within(event_select(loan_overdue_payment.date_created, 'loan overdue payment',
+                loan_overdue_payment.loan_overdue_payment_id, loan_overdue.month,
+                loan_overdue_payment.amount)\
+            .select_from(loan_overdue_payment.__table__
+                .join(loan_overdue.__table__,
+                    loan_overdue.loan_overdue_id == loan_overdue_payment.loan_overdue_id)
+                .join(loan.__table__, loan.loan_id == loan_overdue.loan_id))\
+            .where(loan.member_id == member_id), loan_overdue_payment),
+
+        within(event_select(monthly_deposit_overdue.date_created, 'deposit overdue',
+                monthly_deposit_overdue.monthly_deposit_overdue_id, month.description,
+                monthly_deposit_overdue.amount)\
+            .select_from(monthly_deposit_overdue.__table__.join(month.__table__,
+                month.month_id == monthly_deposit_overdue.month_id))\
+            .where(monthly_deposit_overdue.member_id == member_id),
+            monthly_deposit_overdue),
+
+        within(event_select(deposit_overdue_payment.date_created, 'deposit overdue payment',
+                deposit_overdue_payment.deposit_overdue_payment_id, month.description,
+                deposit_overdue_payment.amount)\
+            .select_from(deposit_overdue_payment.__table__
+                .join(monthly_deposit_overdue.__table__,
+                    monthly_deposit_overdue.monthly_deposit_overdue_id ==
+                    deposit_overdue_payment.monthly_deposit_overdue_id)
+                .join(month.__table__, month.month_id == monthly_deposit_overdue.month_id))\
+            .where(monthly_deposit_overdue.member_id == member_id),
+            deposit_overdue_payment)
+        ).alias('events')
+
+
+def opening_balances(member_id, start):
+    """
+    opening_balances(member_id, start)
+        Returns {account : balance} of the member's accounts just before start
+    """
+    balances = {'savings' : 0, 'loans' : 0, 'charges' : 0}
+    if start is None:
+        return balances
+
+    events = ledger_events(member_id, stop = start)
+    for kind, total in db.session.execute(select([events.c.kind,
+            func.sum(events.c.amount)]).group_by(events.c.kind)):
+        account, sign = accounts[kind]
+        if account:
+            balances[account] += sign * (total or 0)
+    return balances
+
+
+def member_statement(member_id, start = None, stop = None, opening = None):
+    """
+    member_statement(member_id, start, stop, opening)
+        Yields the member's ledger events created in [start, stop) in date order, each
+        with the running balances of the savings, loans and charges accounts.
+        Events are read with one UNION query and balances updated one event at a time,
+        so any length of history is processed in a single pass.
+        opening is opening_balances(member_id, start) when the caller already has it
+    """
+    balances = dict(opening) if opening is not None else opening_balances(member_id, start)
+
+    events = ledger_events(member_id, start, stop)
+    rows = db.session.execute(select([events]).order_by(
+        events.c.date_created, events.c.kind, events.c.reference)\
+            .execution_options(stream_results = True))
+
+    for date_created, kind, reference, description, amount in rows:
+        account, sign = accounts[kind]
+        if account:
+            balances[account] += sign * (amount or 0)
+
+        yield statement_line(date_created, kind, reference, description, amount,
+                balances['savings'], balances['loans'], balances['charges'])
@@ -0,0 +1,186 @@
+import flask
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import event, func, case, and_
+
+from .. import db
+from ..cache import TimedCache, after_commit
+from ..kpis import kpi, kpi_cache
+from ..models import member, user, loan, loan_overdue, ledger_rollup, ledger_kinds
+
+#(count, total) pair of a series of records; indexable like the old query rows
+tally = namedtuple('tally', ['count', 'total'])
+
+#year -> YearSummary; years from a transaction's year onwards are dropped once it is
+#committed. The cache is per process: other gunicorn workers keep their summaries until
+#they time out
+summary_cache = TimedCache()
+
+
+class YearSummary:
+    """
+    class YearSummary
+        Financial summary of a calendar year, computed by YearSummary.compute(year)
+        Counts are tallies of (count, total); totals of empty series are None
+    """
+    __slots__ = ('year', 'loans_supplied', 'paid_loans', 'pending_loans', 'overdue_loans',
+            'loan_interests', 'installments', 'deposits', 'overdue_payments',
+            'registration_fees', 'deposit_overdue_payments', 'total_members',
+            'new_members', 'total_employees', 'new_employees')
+
+    def __init__(self, **kwargs):
+        for name in self.__slots__:
+            setattr(self, name, kwargs.get(name))
+
+    @property
+    def gross_profit(self):
+        return sum(item.total or 0 for item in (self.deposit_overdue_payments,
+            self.overdue_payments, self.registration_fees, self.loan_interests))
+
+    @property
+    def dividends(self):
+        return 60/100 * self.gross_profit
+
+    @property
+    def company_profit(self):
+        return 40/100 * self.gross_profit
+
+    @property
+    def credit(self):
+        return self.loans_supplied.total or 0
+
+    @property
+    def debit(self):
+        return self.gross_profit + (self.deposits.total or 0)
+
+    def aggregates(self):
+        """Returns [(vote description, tally)] of the aggregate financial summary"""
+        return [
+                ('monthly deposits', self.deposits),
+                ('installments', self.installments),
+                ('supplied loans', self.loans_supplied),
+                ('loan overdue payments', self.overdue_payments),
+                ('registration fees', self.registration_fees),
+                ('fully paid loan interest', self.loan_interests),
+                ('monthly deposit overdue payments', self.deposit_overdue_payments)
+                ]
+
+    @staticmethod
+    def get(year):
+        """
+        get(year)
+            Returns the summary of year from the cache, computing it when stale
+        """
+        return summary_cache.get_or_set(year, lambda: YearSummary.compute(year),
+                flask.current_app.config['SUMMARY_CACHE_TIMEOUT'])
+
+    @staticmethod
+    def compute(year):
+        """
+        compute(year)
+            Computes the summary of year with one grouped query per table
+        """
+        start = datetime(year, 1, 1)
+        stop = datetime(year + 1, 1, 1)
+
+        def tally_of(condition, amount):
+            return (func.count(case([(condition, 1)])),
+                    func.sum(case([(condition, amount)])))
+
+        supplied = and_(loan.date_created >= start, loan.date_created < stop)
+        paid = and_(loan.status == 'Paid',
+                loan.last_updated >= start, loan.last_updated < stop)
+        pending = and_(loan.status == 'pending', loan.date_created < stop)
+
+        loans = db.session.query(
+                *tally_of(supplied, loan.amount),
+                *tally_of(paid, loan.amount),
+                *tally_of(pending, loan.amount),
+                *tally_of(paid, loan.interest)).one()
+
+        overdues = db.session.query(
+                func.count(loan_overdue.loan_overdue_id), func.sum(loan_overdue.amount))\
+            .filter(loan_overdue.date_created < stop,
+                    loan_overdue.status == 'pending').one()
+
+        members = db.session.query(
+                func.count(member.member_id),
+                func.count(case([(member.date_created >= start, 1)])))\
+            .filter(member.date_created < stop).one()
+
+        employees = db.session.query(
+                func.count(user.id),
+                func.count(case([(user.date_created >= start, 1)])))\
+            .filter(user.date_created < stop).one()
+
+        #the remaining series are summed from the ledger rollups
+        rollups = {item[0] : tally(item[1], item[2]) for item in db.session.query(
+                ledger_rollup.kind, func.sum(ledger_rollup.count),
+                func.sum(ledger_rollup.total))\
+            .filter(ledger_rollup.year == year).group_by(ledger_rollup.kind).all()}
+        empty = tally(0, None)
+
+        return YearSummary(
+                year = year,
+                loans_supplied = tally(*loans[0:2]),
+                paid_loans = tally(*loans[2:4]),
+                pending_loans = tally(*loans[4:6]),
+                loan_interests = tally(*loans[6:8]),
+                overdue_loans = tally(*overdues),
+                installments = rollups.get('installments', empty),
+                deposits = rollups.get('deposits', empty),
+                overdue_payments = rollups.get('overdue payments', empty),
+                registration_fees = rollups.get('registration fees', empty),
+                deposit_overdue_payments = rollups.get('deposit overdue payments', empty),
+                total_members = members[0],
+                new_members = members[1],
+                total_employees = employees[0],
+                new_employees = employees[1])
+
+
+def invalidate_year_summaries(year = None):
+    """
+    invalidate_year_summaries(year)
+        Drops the cached summaries of year and later years (running totals such as
+        pending loans carry forward), or of every year when year is None
+    """
+    if year is None:
+        summary_cache.invalidate()
+        return
+
+    for item in range(year, datetime.utcnow().year + 2):
+        summary_cache.invalidate(item)
+
+
+@kpi('summary')
+def summary_kpis():
+    """Payload of the summary dashboard: all-time monthly deposits and financial years"""
+    from .dependencies import all_monthly_deposits, year_summary_columns, column_rows
+    from .graphs import build_monthly_deposits_graph, build_years_comparison_graph
+
+    deposits_data = all_monthly_deposits()
+    year_columns = year_summary_columns()
+
+    return {
+            'deposits_data' : deposits_data,
+            'all_monthly_deposits_JSON' : build_monthly_deposits_graph(deposits_data).get(),
+            'year_comparison' : column_rows(year_columns),
+            'years_comparison_JSON' : build_years_comparison_graph(year_columns).get()
+            }
+
+
+def summary_listener(mapper, connection, target):
+    """
+    Drops the year summaries and marks the summary dashboard stale once the transaction
+    commits; the dashboard keeps being served until recomputed
+    """
+    stamp = getattr(target, 'date_created', None)
+    after_commit(target, invalidate_year_summaries, stamp.year if stamp else None)
+    after_commit(target, kpi_cache.invalidate, 'summary')
+
+for kind, model in ledger_kinds:
+    event.listen(model, 'after_insert', summary_listener)
+for model in (loan, member, user):
+    event.listen(model, 'after_insert', summary_listener)
+event.listen(loan, 'after_update', summary_listener)
+event.listen(loan_overdue, 'after_update', summary_listener)
@@ -0,0 +1,109 @@
+"""
+Fires parallel payments at one loan and checks none of them overpaid it.
+
+    python benchmarks/bench_concurrent_payments.py [threads] [payments]
+
+Every thread posts its share of the payments as installments of the loan and as
+payments of one of its overdue charges, through the posting service used by the views.
+Together they offer more than the loan and the charge are owed, so postings must be
+refused; the run fails if any money beyond the limits was accepted, if the Paid status
+was missed or if the loan's balance columns drifted from its records.
+"""
+import os, sys, tempfile, threading, time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+database = os.path.join(tempfile.mkdtemp(), 'bench.sqlite')
+os.environ['TEST_DATABASE_URL'] = 'sqlite:///' + database
+
+from app import create_app, db
+from app.models import member, loan, loan_type, installment, loan_overdue, loan_overdue_payment
+from app.transactions.payments import post_installment, post_loan_overdue_payment
+
+LIMIT = 50000
+CHARGE = 5000
+AMOUNT = 500
+
+
+def populate():
+    db.session.add(loan_type(loan_type_id = 1, description = 'Individual', rate = 0,
+        max_period = 1, multiplier = 3, overdue_penalty = 10))
+    db.session.add(member(member_id = 1, first_name = 'M', email_address = 'm@example.com',
+        location_address = 'x', id_no = 1))
+    db.session.add(loan(loan_id = 1, member_id = 1, amount = LIMIT, loan_type = 1))
+    db.session.add(loan_overdue(loan_overdue_id = 1, loan_id = 1, amount = CHARGE,
+        month = datetime.utcnow().strftime('%B %Y')))
+    db.session.commit()
+
+
+def teller(app, payments, accepted, errors):
+    with app.app_context():
+        for number in range(payments):
+            try:
+                if number % 2:
+                    balance = post_loan_overdue_payment(1, AMOUNT)
+                    kind = 'overdue'
+                else:
+                    balance = post_installment(1, AMOUNT, LIMIT)
+                    kind = 'installment'
+            except Exception as error:
+                db.session.rollback()
+                errors.append(error)
+                continue
+
+            if balance is not None:
+                accepted[kind] += 1
+        db.session.remove()
+
+
+def main(threads = 8, payments = 40):
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        populate()
+
+    accepted = {'installment' : 0, 'overdue' : 0}
+    errors = []
+    workers = [threading.Thread(target = teller, args = (app, payments, accepted, errors))
+            for number in range(threads)]
+
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        Loan = loan.query.get(1)
+        Overdue = loan_overdue.query.get(1)
+        paid = db.session.query(db.func.sum(installment.amount)).scalar() or 0
+        settled = db.session.query(db.func.sum(loan_overdue_payment.amount)).scalar() or 0
+
+        print(f'{threads} threads x {payments} postings in {elapsed:.2f} s, '
+                f'{len(errors)} error(s)')
+        print(f'    installments accepted {accepted["installment"]:4d}, paid {paid} of {LIMIT}, '
+                f'status {Loan.status}')
+        print(f'    overdue payments accepted {accepted["overdue"]:4d}, paid {settled} of '
+                f'{CHARGE}, status {Overdue.status}')
+
+        failures = []
+        if paid > LIMIT or settled > CHARGE:
+            failures.append('overpaid')
+        if paid != accepted['installment'] * AMOUNT or \
+                settled != accepted['overdue'] * AMOUNT:
+            failures.append('accepted postings do not match the records')
+        if (Loan.status == 'Paid') != (paid == LIMIT) or \
+                (Overdue.status == 'Paid') != (settled == CHARGE):
+            failures.append('status flip missed')
+        if loan.check_balances():
+            failures.append('balance columns drifted')
+        db.session.remove()
+    os.remove(database)
+
+    print('    ' + (', '.join(failures) if failures else 'ok'))
+    return not failures
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main(*[int(item) for item in sys.argv[1:3]]) else 1)
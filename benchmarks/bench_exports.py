@@ -0,0 +1,82 @@
+"""
+Streams the monthly deposits listing export as CSV and XLSX over a large table.
+
+    python benchmarks/bench_exports.py [deposits]
+
+The deposits table is filled with 1,000,000 rows by default. Each export goes through
+the same listing query and stream_export call as the /records/export route, and its
+chunks are consumed the way a WSGI server would. The peak memory traced during an
+export must stay flat however many rows are exported (tracing slows the run down).
+"""
+import os, sys, tempfile, time, tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+database = os.path.join(tempfile.mkdtemp(), 'bench.sqlite')
+os.environ['TEST_DATABASE_URL'] = 'sqlite:///' + database
+
+from app import create_app, db
+from app.models import member, month, monthly_deposit
+from app.exports import stream_export
+from app.profiles.views import monthly_deposits_listing
+
+MEMBERS = 1000
+MONTHS = 120
+FIRST = datetime(2010, 1, 1)
+
+
+def populate(deposits):
+    db.session.execute(month.__table__.insert(), [{'month_id' : index + 1,
+        'description' : datetime(FIRST.year + index // 12, index % 12 + 1, 1)\
+            .strftime('%B %Y')} for index in range(MONTHS)])
+    db.session.execute(member.__table__.insert(), [{'member_id' : index + 1,
+        'first_name' : f'Member {index + 1}', 'email_address' : f'm{index}@example.com',
+        'location_address' : 'x', 'id_no' : index + 1} for index in range(MEMBERS)])
+
+    batch = []
+    for index in range(deposits):
+        batch.append({'deposit_id' : index + 1, 'member_id' : index % MEMBERS + 1,
+            'month_id' : index // MEMBERS % MONTHS + 1, 'amount' : 1000,
+            'date_created' : FIRST + timedelta(minutes = index)})
+        if len(batch) == 50000:
+            db.session.execute(monthly_deposit.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(monthly_deposit.__table__.insert(), batch)
+    db.session.commit()
+
+
+def main(deposits = 1000000):
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        populate(deposits)
+        print(f'{deposits} deposits written in {time.perf_counter() - started:.1f} s')
+
+        for format in ('csv', 'xlsx'):
+            with app.test_request_context():
+                tracemalloc.start()
+                started = time.perf_counter()
+
+                query, key = monthly_deposits_listing()
+                response = stream_export('deposits', [item['name'] for item in
+                    query.column_descriptions], query.order_by(key.desc()), format)
+
+                size = chunks = 0
+                for chunk in response.response:
+                    size += len(chunk)
+                    chunks += 1
+
+                elapsed = time.perf_counter() - started
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+                print(f'    {format:5s} {elapsed:7.1f} s, {size / 2**20:8.1f} MiB in '
+                        f'{chunks} chunks, peak memory {peak / 2**20:6.1f} MiB')
+        db.session.remove()
+    os.remove(database)
+
+
+if __name__ == '__main__':
+    main(*[int(item) for item in sys.argv[1:2]])
@@ -0,0 +1,106 @@
+"""
+Times the member statement over 10 years of history per member.
+
+    python benchmarks/bench_member_statement.py [members]
+
+Every member gets a monthly deposit, a yearly loan repaid in 12 installments and a
+few overdue charges and payments for each of the 10 years. The statement of each
+member is produced in full and timed, together with the peak memory it used.
+"""
+import os, sys, tempfile, time, tracemalloc, statistics
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+database = os.path.join(tempfile.mkdtemp(), 'bench.sqlite')
+os.environ['TEST_DATABASE_URL'] = 'sqlite:///' + database
+
+from app import create_app, db
+from app.models import (member, month, loan, loan_type, installment, monthly_deposit,
+        monthly_deposit_overdue, deposit_overdue_payment, loan_overdue,
+        loan_overdue_payment, registration_fee)
+from app.transactions.statements import member_statement
+
+YEARS = 10
+FIRST = datetime(2010, 1, 1)
+
+
+def populate(members):
+    months = [{'month_id' : index + 1, 'description' : datetime(FIRST.year + index // 12,
+        index % 12 + 1, 1).strftime('%B %Y')} for index in range(YEARS * 12)]
+    db.session.execute(month.__table__.insert(), months)
+    db.session.execute(loan_type.__table__.insert(), [{'loan_type_id' : 1,
+        'description' : 'Individual', 'rate' : 1.2, 'max_period' : 1, 'multiplier' : 3,
+        'overdue_penalty' : 10}])
+
+    rows = {model : [] for model in (member, registration_fee, monthly_deposit, loan,
+        installment, loan_overdue, loan_overdue_payment, monthly_deposit_overdue,
+        deposit_overdue_payment)}
+    loan_id = overdue_id = 0
+    for member_id in range(1, members + 1):
+        rows[member].append({'member_id' : member_id, 'first_name' : 'M',
+            'email_address' : f'm{member_id}@example.com', 'location_address' : 'x',
+            'id_no' : member_id, 'date_created' : FIRST})
+        rows[registration_fee].append({'member_id' : member_id, 'amount' : 2000,
+            'date_created' : FIRST})
+
+        for item in months:
+            stamp = datetime.strptime(item['description'], '%B %Y') + timedelta(days = 4)
+            rows[monthly_deposit].append({'member_id' : member_id, 'amount' : 1000,
+                'month_id' : item['month_id'], 'date_created' : stamp})
+
+            if item['month_id'] % 6 == 0:
+                overdue_id += 1
+                rows[monthly_deposit_overdue].append({'monthly_deposit_overdue_id' :
+                    overdue_id, 'member_id' : member_id, 'month_id' : item['month_id'],
+                    'amount' : 500, 'status' : 'paid', 'date_created' : stamp})
+                rows[deposit_overdue_payment].append({'monthly_deposit_overdue_id' :
+                    overdue_id, 'amount' : 500, 'date_created' : stamp + timedelta(days = 9)})
+
+        for year in range(YEARS):
+            loan_id += 1
+            stamp = datetime(FIRST.year + year, 1, 15)
+            rows[loan].append({'loan_id' : loan_id, 'member_id' : member_id,
+                'amount' : 12000, 'loan_type' : 1, 'status' : 'Paid',
+                'date_created' : stamp, 'last_updated' : stamp})
+            for number in range(12):
+                rows[installment].append({'loan_id' : loan_id, 'amount' : 1000,
+                    'date_created' : stamp + timedelta(days = 30 * (number + 1))})
+            rows[loan_overdue].append({'loan_overdue_id' : loan_id, 'loan_id' : loan_id,
+                'amount' : 300, 'month' : 'x', 'status' : 'paid',
+                'date_created' : stamp + timedelta(days = 100)})
+            rows[loan_overdue_payment].append({'loan_overdue_id' : loan_id, 'amount' : 300,
+                'date_created' : stamp + timedelta(days = 110)})
+
+    for model, values in rows.items():
+        db.session.execute(model.__table__.insert(), values)
+    db.session.commit()
+
+
+def main(members = 50):
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        populate(members)
+
+        timings, lines, peak = [], 0, 0
+        for member_id in range(1, members + 1):
+            tracemalloc.start()
+            started = time.perf_counter()
+            for line in member_statement(member_id):
+                lines += 1
+            timings.append((time.perf_counter() - started) * 1000)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+
+        timings.sort()
+        print(f'{members} members, {lines // members} statement lines each '
+                f'({YEARS} years of history)')
+        print(f'    median {statistics.median(timings):8.2f} ms')
+        print(f'    p95    {timings[int(len(timings) * 0.95) - 1]:8.2f} ms')
+        print(f'    peak memory {peak / 1024:8.1f} KiB')
+        db.session.remove()
+    os.remove(database)
+
+
+if __name__ == '__main__':
+    main(*[int(item) for item in sys.argv[1:2]])
@@ -0,0 +1,142 @@
+"""
+Compares the query plans and timings of the summary page queries with and without the
+transaction table indexes.
+
+    python benchmarks/bench_query_plans.py [members]
+
+A throwaway SQLite database is filled with synthetic members, deposits, loans and
+overdues; every query is explained and timed first without the indexes (as on a
+database created before they were declared) and then with them.
+"""
+import os, sys, tempfile, time, random
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+database = os.path.join(tempfile.mkdtemp(), 'bench.sqlite')
+os.environ['TEST_DATABASE_URL'] = 'sqlite:///' + database
+
+from sqlalchemy import func, text
+from app import create_app, db
+from app.models import (member, month, loan, loan_type, installment, monthly_deposit,
+        monthly_deposit_overdue, loan_overdue, registration_fee)
+
+START, STOP = datetime(2020, 1, 1), datetime(2021, 1, 1)
+
+
+def populate(members):
+    rnd = random.Random(8)
+    months = [{'month_id' : index + 1, 'description' : datetime(2019 + index // 12,
+        index % 12 + 1, 1).strftime('%B %Y')} for index in range(36)]
+    db.session.execute(month.__table__.insert(), months)
+    db.session.execute(loan_type.__table__.insert(), [{'loan_type_id' : 1,
+        'description' : 'Individual', 'rate' : 1.2, 'max_period' : 3, 'multiplier' : 3,
+        'overdue_penalty' : 10}])
+
+    rows = {'member' : [], 'fee' : [], 'deposit' : [], 'overdue' : [], 'loan' : [],
+            'installment' : [], 'loan_overdue' : []}
+    for member_id in range(1, members + 1):
+        joined = datetime(2019, 1, 1) + timedelta(days = rnd.randint(0, 700))
+        rows['member'].append({'member_id' : member_id, 'first_name' : 'M',
+            'email_address' : f'm{member_id}@example.com', 'location_address' : 'x',
+            'id_no' : member_id, 'date_created' : joined})
+        rows['fee'].append({'member_id' : member_id, 'amount' : 2000, 'date_created' : joined})
+
+        for item in months:
+            stamp = datetime.strptime(item['description'], '%B %Y')
+            if stamp < joined:
+                continue
+            if rnd.random() < 0.8:
+                rows['deposit'].append({'member_id' : member_id, 'amount' : 1000,
+                    'month_id' : item['month_id'], 'date_created' : stamp + timedelta(days = 3)})
+            else:
+                rows['overdue'].append({'member_id' : member_id, 'amount' : 1000,
+                    'month_id' : item['month_id'], 'status' : 'pending',
+                    'date_created' : stamp + timedelta(days = 40)})
+
+        stamp = joined + timedelta(days = 30)
+        rows['loan'].append({'loan_id' : member_id, 'member_id' : member_id, 'amount' : 30000,
+            'loan_type' : 1, 'status' : rnd.choice(['pending', 'Paid']),
+            'date_created' : stamp, 'last_updated' : stamp + timedelta(days = 90)})
+        for number in range(3):
+            rows['installment'].append({'loan_id' : member_id, 'amount' : 10000,
+                'date_created' : stamp + timedelta(days = 30 * (number + 1))})
+        rows['loan_overdue'].append({'loan_id' : member_id, 'amount' : 300, 'month' : 'x',
+            'status' : 'pending', 'date_created' : stamp + timedelta(days = 60)})
+
+    for key, model in [('member', member), ('fee', registration_fee),
+            ('deposit', monthly_deposit), ('overdue', monthly_deposit_overdue),
+            ('loan', loan), ('installment', installment), ('loan_overdue', loan_overdue)]:
+        db.session.execute(model.__table__.insert(), rows[key])
+    db.session.commit()
+
+
+def summary_queries(member_id):
+    return {
+        'deposits per month' : db.session.query(monthly_deposit.month_id,
+            func.sum(monthly_deposit.amount)).group_by(monthly_deposit.month_id),
+        'deposits of a month' : db.session.query(func.sum(monthly_deposit.amount))\
+            .filter(monthly_deposit.month_id == 14),
+        'member deposits' : monthly_deposit.query.filter_by(member_id = member_id)\
+            .order_by(monthly_deposit.month_id),
+        'member month deposit' : monthly_deposit.query.filter_by(member_id = member_id,
+            month_id = 14),
+        'loans supplied in year' : db.session.query(func.count(loan.loan_id),
+            func.sum(loan.amount)).filter(loan.date_created.between(START, STOP)),
+        'paid loans in year' : db.session.query(func.count(loan.loan_id),
+            func.sum(loan.amount)).filter(loan.status == 'Paid',
+                loan.last_updated.between(START, STOP)),
+        'installments in year' : db.session.query(func.sum(installment.amount))\
+            .filter(installment.date_created.between(START, STOP)),
+        'loan installments' : installment.query.filter_by(loan_id = member_id),
+        'loan overdues' : loan_overdue.query.filter_by(loan_id = member_id),
+        'pending deposit overdues' : db.session.query(
+            func.sum(monthly_deposit_overdue.amount)).filter(
+                monthly_deposit_overdue.status == 'pending'),
+        'member overdues' : monthly_deposit_overdue.query.filter_by(member_id = member_id),
+        'fees in year' : db.session.query(func.sum(registration_fee.amount))\
+            .filter(registration_fee.date_created.between(START, STOP)),
+        }
+
+
+def measure(queries, repeat = 20):
+    results = dict()
+    for name, query in queries.items():
+        compiled = query.statement.compile(db.engine,
+                compile_kwargs = {'literal_binds' : True})
+        plan = [row[-1] for row in db.session.execute(
+            text(f'EXPLAIN QUERY PLAN {compiled}')).fetchall()]
+
+        started = time.perf_counter()
+        for number in range(repeat):
+            query.all()
+        results[name] = ('; '.join(plan), (time.perf_counter() - started) / repeat * 1000)
+    return results
+
+
+def main(members = 3000):
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        populate(members)
+
+        indexes = [index for table in db.metadata.sorted_tables for index in table.indexes
+                if not index.unique and table.name != 'role']
+        for index in indexes:
+            index.drop(db.engine)
+        before = measure(summary_queries(members // 2))
+
+        for index in indexes:
+            index.create(db.engine)
+        db.session.execute(text('ANALYZE'))
+        after = measure(summary_queries(members // 2))
+
+        for name in before:
+            print(f'{name}\n'
+                    f'    without indexes {before[name][1]:8.2f} ms  {before[name][0]}\n'
+                    f'    with indexes    {after[name][1]:8.2f} ms  {after[name][0]}')
+        db.session.remove()
+    os.remove(database)
+
+
+if __name__ == '__main__':
+    main(*[int(item) for item in sys.argv[1:2]])
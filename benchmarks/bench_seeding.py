@@ -0,0 +1,75 @@
+"""
+Seeds synthetic data through the Generator's ORM path and its bulk seeding mode.
+
+    python benchmarks/bench_seeding.py [members] [deposits] [workers]
+
+The ORM path writes deposits one generate_monthly_deposit() at a time, each with its own
+commit; the bulk mode seeds the full histories of members members over 60 months with
+BulkGenerator.populate(), or with populate_partitioned() across workers processes
+writing SQLite shards when workers is above 1. Both rates are reported in records per second, and the bulk
+run must leave the loan balances and ledger rollups as a rebuild would compute them.
+"""
+import os, sys, tempfile, time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+database = os.path.join(tempfile.mkdtemp(), 'bench.sqlite')
+os.environ['TEST_DATABASE_URL'] = 'sqlite:///' + database
+
+from app import create_app, db
+from app.generator import Generator, BulkGenerator, populate_partitioned
+from app.models import member, month, loan, ledger_rollup
+
+
+def rollups():
+    return {(item.year, item.month, item.kind) : (item.count, item.total)
+            for item in ledger_rollup.query}
+
+
+def main(members = 2000, deposits = 2000, workers = 1):
+    app = create_app('testing')
+    failures = []
+    with app.app_context():
+        db.create_all()
+        db.session.add(month(description = 'January 2020'))
+        db.session.add(member(first_name = 'M', email_address = 'm@example.com',
+            location_address = 'x', id_no = 1))
+        db.session.commit()
+
+        generator = Generator(seed = 1)
+        started = time.perf_counter()
+        with redirect_stdout(open(os.devnull, 'w')):
+            for number in range(deposits):
+                generator.generate_monthly_deposit(month_id = 1, member_id = 1)
+        elapsed = time.perf_counter() - started
+        print(f'orm   {deposits:8d} records in {elapsed:6.1f} s, '
+                f'{deposits / elapsed:8.0f} records/s')
+
+        started = time.perf_counter()
+        with redirect_stdout(open(os.devnull, 'w')):
+            if workers > 1:
+                written = populate_partitioned('testing', members = members,
+                        workers = workers, seed = 1)
+            else:
+                written = BulkGenerator(seed = 1).populate(members = members)
+        written = sum(written.values())
+        elapsed = time.perf_counter() - started
+        print(f'bulk  {written:8d} records in {elapsed:6.1f} s, '
+                f'{written / elapsed:8.0f} records/s')
+
+        if loan.check_balances():
+            failures.append('loan balances drifted')
+        seeded = rollups()
+        ledger_rollup.rebuild()
+        if rollups() != seeded:
+            failures.append('ledger rollups drifted')
+        db.session.rollback()
+        db.session.remove()
+    os.remove(database)
+
+    print('    ' + (', '.join(failures) if failures else 'ok'))
+    return not failures
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main(*[int(item) for item in sys.argv[1:4]]) else 1)
@@ -0,0 +1,244 @@
+"""
+Times the hot views through the Flask test client against generated fixture databases.
+
+    python benchmarks/bench_views.py [profile ...] [--rounds N] [--workers N]
+            [--latency] [--update] [--headroom H] [--slack MS]
+
+Each profile (small by default, see app.generator.profiles) is generated once into
+benchmarks/fixtures/<profile>.sqlite with a fixed seed and reused while its manifest
+matches the profile; every run works on a copy of it, since some views write. Every
+view is requested once cold, then rounds times; the latency percentiles of those
+rounds and the SQL statements issued per request are reported and checked against
+benchmarks/thresholds.json. The run fails when a view errors or issues more queries
+than it did when the thresholds were recorded. With --latency it also fails when a
+view takes longer than its p95 budget; a p95 of a few rounds is mostly noise, so
+--latency and --update need at least MIN_ROUNDS rounds. --update records the current
+figures as the thresholds, budgeting latencies at headroom times their p95, and at
+least slack milliseconds above it, to absorb machine noise.
+"""
+import argparse, json, os, shutil, sys, tempfile, time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+thresholds_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'thresholds.json')
+os.environ['TEST_DATABASE_URL'] = 'sqlite:///' + os.path.join(folder, 'small.sqlite')
+
+from sqlalchemy import event
+from app import create_app, db
+from app.generator import profiles, generate_profile, seeded_now
+from app.models import user, role, member, loan, principal_cache, permission_cache
+from app.kpis import kpi_cache
+from app.transactions.summaries import summary_cache
+from app.transactions.graphs import chart_cache
+
+SEED = 1
+MIN_ROUNDS = 20
+EMAIL = 'benchmark@example.com'
+PASSWORD = 'benchmark'
+
+
+def application(path):
+    """Returns an application on the database at path, with no figures cached"""
+    #the caches are per process and would serve the figures of another database
+    for cache in (principal_cache, permission_cache, summary_cache, chart_cache):
+        cache.invalidate()
+    kpi_cache.clear()
+
+    app = create_app('testing')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    app.config['WTF_CSRF_ENABLED'] = False
+    return app
+
+
+def fixture(profile, workers):
+    """Returns the path of the fixture database of profile, generating it if stale"""
+    path = os.path.join(folder, profile + '.sqlite')
+    app = application(path)
+
+    try:
+        with open(path + '.manifest.json') as file:
+            manifest = json.load(file)
+        fresh = manifest['parameters'] != profiles[profile] or manifest['seed'] != SEED \
+                or manifest.get('now') != seeded_now.isoformat()
+    except (OSError, ValueError, KeyError):
+        fresh = True
+
+    with app.app_context():
+        if fresh:
+            os.makedirs(folder, exist_ok = True)
+            db.drop_all()
+            db.create_all()
+            started = time.perf_counter()
+            with redirect_stdout(open(os.devnull, 'w')):
+                generate_profile(profile, 'testing', workers = workers, seed = SEED)
+            print(f'{profile} fixture generated in {time.perf_counter() - started:.1f} s')
+
+        if not user.query.filter_by(email_address = EMAIL).first():
+            db.session.add(user(first_name = 'Benchmark', email_address = EMAIL,
+                location_address = 'x', id_no = 1, password = PASSWORD,
+                role_id = role.query.filter_by(name = 'Administrator').first().role_id))
+            db.session.commit()
+        db.session.remove()
+    return path
+
+
+def cases(app):
+    """Returns [(name, method, url, cookie tab_var, data)] of the views to time"""
+    with app.app_context():
+        #the member with the longest history and a loan, and their group
+        Loan = loan.query.order_by(loan.member_id).first()
+        Member = member.query.get(Loan.member_id)
+        db.session.remove()
+
+    #the last full year of the fixture's history
+    year = seeded_now.year - 1
+    views = [
+            ('year_summary', 'GET', f'/year_summary/{year}', None, None),
+            ('summary', 'GET', '/summary', None, None)
+            ]
+    views += [(f'member_profile tab {tab}', 'GET', f'/member_profile/{Member.member_id}'
+        f'?year={year}', tab, None) for tab in range(6)]
+    views += [(f'group_profile tab {tab}', 'GET', f'/group_profile/{Member.group_id}'
+        f'?tab={tab}', None, None) for tab in range(4)]
+    views += [('loan_profile', 'GET', f'/loan_profile/{Loan.loan_id}', None, None)]
+    views += [(url.strip('/'), 'GET', url, None, None) for url in ('/view_loans',
+        '/view_monthly_deposits', '/view_registration_fees', '/overdue_monthly_deposits',
+        '/overdue_loans', '/overdue_monthly_deposit_payments')]
+    views += [('update_overdue_monthly_deposit', 'POST', '/update_overdue_monthly_deposits',
+        None, {'period' : 12})]
+    return views
+
+
+def percentile(values, share):
+    """Returns the nearest-rank percentile share (0 - 100) of values"""
+    ordered = sorted(values)
+    return ordered[max(0, -(-len(ordered) * share // 100) - 1)]
+
+
+def measure(app, rounds):
+    """Returns {case name : figures} of every case timed through the test client"""
+    statements = [0]
+    def count(*args):
+        statements[0] += 1
+
+    client = app.test_client()
+    response = client.post('/authentication/login', data = {'email_address' : EMAIL,
+        'password' : PASSWORD})
+    if response.status_code != 302:
+        raise RuntimeError(f'benchmark login failed with {response.status_code}')
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+
+    results = {}
+    try:
+        for name, method, url, tab, data in cases(app):
+            client.set_cookie('localhost', 'tab_var', str(tab or 0))
+            timings = []
+            queries = []
+            status = None
+            for number in range(rounds + 1):
+                statements[0] = 0
+                started = time.perf_counter()
+                response = client.open(url, method = method, data = data)
+                response.get_data()
+                timings.append((time.perf_counter() - started) * 1000)
+                queries.append(statements[0])
+                status = response.status_code
+
+            warm = timings[1:]
+            results[name] = {
+                    'status' : status,
+                    'cold_ms' : round(timings[0], 1),
+                    'p50_ms' : round(percentile(warm, 50), 1),
+                    'p95_ms' : round(percentile(warm, 95), 1),
+                    'p99_ms' : round(percentile(warm, 99), 1),
+                    'queries' : max(queries[1:])
+                    }
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    return results
+
+
+def check(results, budgets, latency = False):
+    """
+    check(results, budgets, latency)
+        Returns [failure] of results against the budgets of their profile
+        latency also checks the p95 latencies, otherwise only the query counts
+    """
+    failures = []
+    for name, figures in results.items():
+        if figures['status'] not in (200, 302):
+            failures.append(f'{name} answered {figures["status"]}')
+        budget = budgets.get(name)
+        if not budget:
+            continue
+        if latency and figures['p95_ms'] > budget['p95_ms']:
+            failures.append(f'{name} p95 {figures["p95_ms"]} ms over {budget["p95_ms"]} ms')
+        if figures['queries'] > budget['queries']:
+            failures.append(f'{name} issued {figures["queries"]} queries, '
+                    f'{budget["queries"]} recorded')
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.strip().splitlines()[0])
+    parser.add_argument('profiles', nargs = '*', default = ['small'],
+            choices = list(profiles), metavar = 'profile')
+    parser.add_argument('--rounds', type = int, default = 20)
+    parser.add_argument('--workers', type = int, default = 1)
+    parser.add_argument('--latency', action = 'store_true')
+    parser.add_argument('--update', action = 'store_true')
+    parser.add_argument('--headroom', type = float, default = 2.0)
+    parser.add_argument('--slack', type = float, default = 25.0)
+    options = parser.parse_args()
+    if (options.latency or options.update) and options.rounds < MIN_ROUNDS:
+        parser.error(f'--latency and --update need at least {MIN_ROUNDS} rounds')
+
+    try:
+        with open(thresholds_path) as file:
+            thresholds = json.load(file)
+    except OSError:
+        thresholds = {}
+
+    failures = []
+    for profile in options.profiles:
+        copy = os.path.join(tempfile.mkdtemp(), profile + '.sqlite')
+        shutil.copyfile(fixture(profile, options.workers), copy)
+        results = measure(application(copy), options.rounds)
+        shutil.rmtree(os.path.dirname(copy))
+        budgets = thresholds.get(profile, {})
+
+        print(f'{profile}: {options.rounds} rounds')
+        print(f'    {"view":34s} {"cold":>8s} {"p50":>8s} {"p95":>8s} {"p99":>8s} '
+                f'{"budget":>8s} {"queries":>8s}')
+        for name, figures in results.items():
+            budget = budgets.get(name, {})
+            print(f'    {name:34s} {figures["cold_ms"]:8.1f} {figures["p50_ms"]:8.1f} '
+                    f'{figures["p95_ms"]:8.1f} {figures["p99_ms"]:8.1f} '
+                    f'{budget.get("p95_ms", "-")!s:>8s} '
+                    f'{figures["queries"]:4d}/{budget.get("queries", "-")!s:>3s}')
+
+        if options.update:
+            thresholds[profile] = {name : {
+                'p95_ms' : round(max(figures['p95_ms'] * options.headroom,
+                    figures['p95_ms'] + options.slack), 1),
+                'queries' : figures['queries']} for name, figures in results.items()}
+        failures += [f'{profile}: {item}' for item in check(results,
+            {} if options.update else budgets, options.latency)]
+
+    if options.update:
+        with open(thresholds_path, 'w') as file:
+            json.dump(thresholds, file, indent = 4, sort_keys = True)
+        print(f'thresholds written to {thresholds_path}')
+
+    for item in failures:
+        print('    ' + item)
+    print('    ' + ('failed' if failures else 'ok'))
+    return not failures
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
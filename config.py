@@ -35,9 +35,21 @@ class Config:
     DOCUMENT_UPLOAD_PATH = os.path.join(basedir + '/app/static/documents')
     GALLERY_UPLOAD_PATH = os.path.join(basedir + '/app/static/gallery')
     BRANCH_UPLOAD_PATH = os.path.join(basedir + '/app/static/branches')
+    IMPORT_UPLOAD_PATH = os.environ.get('IMPORT_UPLOAD_PATH') or os.path.join(basedir, 'imports')
 
     UPLOAD_EXTENSIONS = ['.jpg', '.gif', '.jpeg', '.png']
     FIRST_YEAR = os.environ.get('FIRST_YEAR') or (int(today.strftime("%Y")) - 5)
+    CHART_CACHE_TIMEOUT = int(os.environ.get('CHART_CACHE_TIMEOUT') or 300)
+    SUMMARY_CACHE_TIMEOUT = int(os.environ.get('SUMMARY_CACHE_TIMEOUT') or 300)
+    PERMISSION_CACHE_TIMEOUT = int(os.environ.get('PERMISSION_CACHE_TIMEOUT') or 60)
+    USER_CACHE_TIMEOUT = int(os.environ.get('USER_CACHE_TIMEOUT') or 30)
+    KPI_REFRESH_INTERVAL = int(os.environ.get('KPI_REFRESH_INTERVAL') or 300)
+    KPI_CACHE_PATH = os.environ.get('KPI_CACHE_PATH')
+    KPI_REFRESH_INLINE = False
+
+    JOBS_INLINE = False
+    JOB_TIMEOUT = int(os.environ.get('JOB_TIMEOUT') or 600)
+    JOB_BATCH_SIZE = int(os.environ.get('JOB_BATCH_SIZE') or 500)
 
 
 @staticmethod
@@ -53,6 +65,8 @@ class DevelopmentConfig(Config):
 
 class TestingConfig(Config):
     TESTING = True
+    JOBS_INLINE = True
+    KPI_REFRESH_INLINE = True
     SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL') or 'sqlite://'
 
 
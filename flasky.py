@@ -1,8 +1,12 @@
 import os
+import click
 from app import create_app, db
 from flask_migrate import Migrate
+from app.jobs import enqueue, work
+from app.kpis import builders, kpi_cache
+from app.generator import BulkGenerator, populate_partitioned, profiles, generate_profile
 
-from app.models import (user, member, group, Permission, role)
+from app.models import user, member, group, Permission, role, loan
 
 app = create_app(os.getenv('FLASK_CONFIG') or 'default')
 migrate = Migrate(app, db)
@@ -12,5 +16,73 @@ def make_shell_context():
     return dict(db = db, user = user, member = member, group = group, app = app, 
             Permission = Permission, role = role)
 
+@app.cli.command()
+def rebuild_ledger():
+    """Recomputes the monthly ledger rollups from the transaction tables."""
+    #run here as a job, one year per batch, so an interrupted rebuild can be resumed
+    Job = enqueue('rebuild ledger', inline = True)
+    click.echo(f'job {Job.job_id} {Job.status}: {Job.rows} rollup(s) written')
+    if Job.status == 'failed':
+        raise click.ClickException(Job.error)
+
+@app.cli.command()
+@click.option('--fix', is_flag = True, help = 'Rewrite the mismatching balances.')
+def check_loans(fix):
+    """Compares loan balance columns with the installment and overdue tables."""
+    mismatches = loan.check_balances(fix = fix)
+    for Loan, paid, charged, settled in mismatches:
+        click.echo(f'loan {Loan.loan_id}: paid {paid}, overdue charged {charged}, '
+                f'overdue paid {settled}')
+    if fix:
+        db.session.commit()
+    click.echo(f'{len(mismatches)} loan(s) {"repaired" if fix else "mismatching"}')
+
+@app.cli.command()
+def refresh_kpis():
+    """Recomputes every dashboard KPI payload now."""
+    for name in builders:
+        kpi_cache.refresh(name)
+        click.echo(f'{name} refreshed')
+
+@app.cli.command()
+@click.option('--members', default = 1000, help = 'Number of members to seed.')
+@click.option('--months', default = 60, help = 'Length of their history in months.')
+@click.option('--batch', default = 5000, help = 'Rows written per INSERT.')
+@click.option('--seed', type = int, help = 'Seed for a reproducible dataset.')
+@click.option('--workers', default = 1, help = 'Processes seeding partitions in parallel.')
+def seed_data(members, months, batch, seed, workers):
+    """Bulk-seeds synthetic member histories for load testing."""
+    if workers > 1:
+        written = populate_partitioned(os.getenv('FLASK_CONFIG') or 'default',
+                members = members, workers = workers, months = months, batch = batch,
+                seed = seed)
+    else:
+        generator = BulkGenerator(batch = batch, seed = seed)
+        written = generator.populate(members = members, months = months)
+
+    for name, count in written.items():
+        click.echo(f'{name}: {count}')
+
+@app.cli.command()
+@click.argument('profile', type = click.Choice(list(profiles)))
+@click.option('--workers', default = 1, help = 'Processes seeding partitions in parallel.')
+@click.option('--seed', default = 1, help = 'Seed of the dataset.')
+@click.option('--manifest', help = 'Where to write the manifest of row counts.')
+@click.option('--fresh', is_flag = True, help = 'Drop and recreate every table first.')
+def generate_dataset(profile, workers, seed, manifest, fresh):
+    """Generates a dataset profile of known size, then writes its manifest."""
+    if fresh:
+        db.drop_all()
+        db.create_all()
+    counts = generate_profile(profile, os.getenv('FLASK_CONFIG') or 'default',
+            workers = workers, seed = seed, manifest = manifest)['counts']
+    for name, count in counts.items():
+        click.echo(f'{name}: {count}')
+
+@app.cli.command()
+def run_jobs():
+    """Runs queued background jobs, waiting for new ones until interrupted."""
+    work(app, poll = 5)
+
 if __name__ == '__main__':
     app.run(PORT = 8000)
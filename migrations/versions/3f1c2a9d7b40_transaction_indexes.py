@@ -0,0 +1,78 @@
+"""date and foreign key indexes on the transaction tables
+
+Revision ID: 3f1c2a9d7b40
+Revises:
+Create Date: 2026-10-18 11:40:00.000000
+
+Databases created with db.create_all() before these indexes were declared on the
+models only get them from this revision; databases created afterwards already have
+them, so every index is only created when it is missing.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7b40'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+indexes = [
+        ('ix_member_group_id', 'member', ['group_id']),
+
+        ('ix_monthly_deposit_member_month', 'monthly_deposit', ['member_id', 'month_id']),
+        ('ix_monthly_deposit_month_id', 'monthly_deposit', ['month_id']),
+        ('ix_monthly_deposit_date_created', 'monthly_deposit', ['date_created']),
+
+        ('ix_registration_fee_member_id', 'registration_fee', ['member_id']),
+        ('ix_registration_fee_date_created', 'registration_fee', ['date_created']),
+
+        ('ix_loan_status_last_updated', 'loan', ['status', 'last_updated']),
+        ('ix_loan_member_id', 'loan', ['member_id']),
+        ('ix_loan_date_created', 'loan', ['date_created']),
+
+        ('ix_installment_loan_id', 'installment', ['loan_id']),
+        ('ix_installment_date_created', 'installment', ['date_created']),
+
+        ('ix_loan_overdue_loan_id', 'loan_overdue', ['loan_id']),
+        ('ix_loan_overdue_date_created', 'loan_overdue', ['date_created']),
+
+        ('ix_loan_overdue_payment_loan_overdue_id', 'loan_overdue_payment',
+            ['loan_overdue_id']),
+        ('ix_loan_overdue_payment_date_created', 'loan_overdue_payment', ['date_created']),
+
+        ('ix_monthly_deposit_overdue_member_month', 'monthly_deposit_overdue',
+            ['member_id', 'month_id']),
+        ('ix_monthly_deposit_overdue_month_id', 'monthly_deposit_overdue', ['month_id']),
+        ('ix_monthly_deposit_overdue_status', 'monthly_deposit_overdue', ['status']),
+        ('ix_monthly_deposit_overdue_date_created', 'monthly_deposit_overdue',
+            ['date_created']),
+
+        ('ix_deposit_overdue_payment_monthly_deposit_overdue_id', 'deposit_overdue_payment',
+            ['monthly_deposit_overdue_id']),
+        ('ix_deposit_overdue_payment_date_created', 'deposit_overdue_payment',
+            ['date_created']),
+        ]
+
+
+def existing_indexes(table):
+    inspector = sa.inspect(op.get_bind())
+    if table not in inspector.get_table_names():
+        return None
+    return {item['name'] for item in inspector.get_indexes(table)}
+
+
+def upgrade():
+    for name, table, columns in indexes:
+        existing = existing_indexes(table)
+        if existing is not None and name not in existing:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, columns in reversed(indexes):
+        existing = existing_indexes(table)
+        if existing is not None and name in existing:
+            op.drop_index(name, table_name = table)
@@ -0,0 +1,78 @@
+"""monthly ledger rollups
+
+Revision ID: 5d7a3c9e1b24
+Revises: 3f1c2a9d7b40
+Create Date: 2026-10-18 12:20:00.000000
+
+Creates ledger_rollup, the running count and sum of every transaction kind per
+calendar month, and fills it from the transaction tables. Databases created with
+db.create_all() after the model was declared already have the table; their rollups
+are recomputed all the same.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d7a3c9e1b24'
+down_revision = '3f1c2a9d7b40'
+branch_labels = None
+depends_on = None
+
+
+#series name of every transaction table, as in app.models.ledger_kinds
+kinds = [
+        ('deposits', 'monthly_deposit'),
+        ('installments', 'installment'),
+        ('loans', 'loan'),
+        ('loan overdues', 'loan_overdue'),
+        ('overdue payments', 'loan_overdue_payment'),
+        ('registration fees', 'registration_fee'),
+        ('deposit overdues', 'monthly_deposit_overdue'),
+        ('deposit overdue payments', 'deposit_overdue_payment')
+        ]
+
+rollup = sa.table('ledger_rollup',
+        sa.column('year', sa.Integer),
+        sa.column('month', sa.Integer),
+        sa.column('kind', sa.String),
+        sa.column('count', sa.Integer),
+        sa.column('total', sa.Integer),
+        sa.column('last_updated', sa.DateTime))
+
+
+def upgrade():
+    bind = op.get_bind()
+    tables = sa.inspect(bind).get_table_names()
+
+    if 'ledger_rollup' not in tables:
+        op.create_table('ledger_rollup',
+                sa.Column('rollup_id', sa.Integer(), nullable = False),
+                sa.Column('year', sa.Integer(), nullable = False),
+                sa.Column('month', sa.Integer(), nullable = False),
+                sa.Column('kind', sa.String(length = 32), nullable = False),
+                sa.Column('count', sa.Integer(), nullable = False),
+                sa.Column('total', sa.Integer(), nullable = False),
+                sa.Column('last_updated', sa.DateTime(), nullable = True),
+                sa.PrimaryKeyConstraint('rollup_id'),
+                sa.UniqueConstraint('year', 'month', 'kind'))
+
+    op.execute(rollup.delete())
+    for kind, name in kinds:
+        if name not in tables:
+            continue
+
+        source = sa.table(name, sa.column('amount', sa.Integer),
+                sa.column('date_created', sa.DateTime))
+        years = sa.extract('year', source.c.date_created)
+        months = sa.extract('month', source.c.date_created)
+        op.execute(rollup.insert().from_select(
+            ['year', 'month', 'kind', 'count', 'total', 'last_updated'],
+            sa.select([years, months, sa.literal(kind), sa.func.count(source.c.amount),
+                sa.func.coalesce(sa.func.sum(source.c.amount), 0), sa.func.current_timestamp()])\
+                .where(source.c.date_created != None)\
+                .group_by(years, months)))
+
+
+def downgrade():
+    op.drop_table('ledger_rollup')
@@ -0,0 +1,45 @@
+"""background job queue
+
+Revision ID: 6e0b9f2a4c18
+Revises: 5d7a3c9e1b24
+Create Date: 2026-10-18 13:10:00.000000
+
+Creates job, the table app/jobs.py queues long running operations in. Databases created
+with db.create_all() after the model was declared already have it.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6e0b9f2a4c18'
+down_revision = '5d7a3c9e1b24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'job' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table('job',
+            sa.Column('job_id', sa.Integer(), nullable = False),
+            sa.Column('kind', sa.String(length = 64), nullable = False),
+            sa.Column('arguments', sa.Text(), nullable = False),
+            sa.Column('status', sa.String(length = 16), nullable = False),
+            sa.Column('cursor', sa.Integer(), nullable = True),
+            sa.Column('progress', sa.Integer(), nullable = False),
+            sa.Column('total', sa.Integer(), nullable = True),
+            sa.Column('rows', sa.Integer(), nullable = False),
+            sa.Column('error', sa.Text(), nullable = True),
+            sa.Column('date_created', sa.DateTime(), nullable = True),
+            sa.Column('last_updated', sa.DateTime(), nullable = True),
+            sa.Column('user_id', sa.Integer(), nullable = True),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+            sa.PrimaryKeyConstraint('job_id'))
+    op.create_index(op.f('ix_job_status'), 'job', ['status'], unique = False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_job_status'), table_name = 'job')
+    op.drop_table('job')
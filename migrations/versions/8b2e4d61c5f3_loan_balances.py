@@ -0,0 +1,63 @@
+"""running balance columns on loan
+
+Revision ID: 8b2e4d61c5f3
+Revises: 6e0b9f2a4c18
+Create Date: 2026-10-18 14:05:00.000000
+
+Adds interest, amount_paid, overdue_charged, overdue_paid and outstanding to loan and
+fills them from the loan types and the installment and overdue tables. Databases created with db.create_all() after
+the columns were declared already have them and are only backfilled.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e4d61c5f3'
+down_revision = '6e0b9f2a4c18'
+branch_labels = None
+depends_on = None
+
+
+columns = ['interest', 'amount_paid', 'overdue_charged', 'overdue_paid', 'outstanding']
+
+
+def existing_columns():
+    inspector = sa.inspect(op.get_bind())
+    return {item['name'] for item in inspector.get_columns('loan')}
+
+
+def upgrade():
+    existing = existing_columns()
+    with op.batch_alter_table('loan') as batch:
+        for name in columns:
+            if name not in existing:
+                batch.add_column(sa.Column(name, sa.Integer(), nullable = False,
+                    server_default = '0'))
+
+    op.execute("""
+        UPDATE loan SET
+            interest = COALESCE((SELECT CAST(ROUND(loan.amount * loan_type.max_period * 12 *
+                    loan_type.rate / 100) AS INTEGER) FROM loan_type
+                WHERE loan_type.loan_type_id = loan.loan_type), 0),
+            amount_paid = COALESCE((SELECT SUM(installment.amount) FROM installment
+                WHERE installment.loan_id = loan.loan_id), 0),
+            overdue_charged = COALESCE((SELECT SUM(loan_overdue.amount) FROM loan_overdue
+                WHERE loan_overdue.loan_id = loan.loan_id), 0),
+            overdue_paid = COALESCE((SELECT SUM(loan_overdue_payment.amount)
+                FROM loan_overdue_payment JOIN loan_overdue
+                    ON loan_overdue.loan_overdue_id = loan_overdue_payment.loan_overdue_id
+                WHERE loan_overdue.loan_id = loan.loan_id), 0)
+        """)
+    op.execute("""
+        UPDATE loan SET
+            outstanding = amount + interest + overdue_charged - amount_paid - overdue_paid
+        """)
+
+
+def downgrade():
+    existing = existing_columns()
+    with op.batch_alter_table('loan') as batch:
+        for name in reversed(columns):
+            if name in existing:
+                batch.drop_column(name)
@@ -0,0 +1,42 @@
+"""references of imported statement payments
+
+Revision ID: a4d8c1e7f92b
+Revises: 8b2e4d61c5f3
+Create Date: 2026-10-18 16:30:00.000000
+
+Creates imported_payment, the references of the statement payments the payment import
+posted, which it skips when they appear again. Databases created with db.create_all()
+after the model was declared already have it.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4d8c1e7f92b'
+down_revision = '8b2e4d61c5f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'imported_payment' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table('imported_payment',
+            sa.Column('imported_payment_id', sa.Integer(), nullable = False),
+            sa.Column('reference', sa.String(length = 128), nullable = False),
+            sa.Column('kind', sa.String(length = 32), nullable = False),
+            sa.Column('record', sa.Integer(), nullable = True),
+            sa.Column('amount', sa.Integer(), nullable = False),
+            sa.Column('date_created', sa.DateTime(), nullable = True),
+            sa.Column('member_id', sa.Integer(), nullable = True),
+            sa.Column('job_id', sa.Integer(), nullable = True),
+            sa.ForeignKeyConstraint(['job_id'], ['job.job_id'], ),
+            sa.ForeignKeyConstraint(['member_id'], ['member.member_id'], ),
+            sa.PrimaryKeyConstraint('imported_payment_id'),
+            sa.UniqueConstraint('reference'))
+
+
+def downgrade():
+    op.drop_table('imported_payment')
@@ -0,0 +1,26 @@
+import pytest
+from app import create_app, db
+from app.models import role
+
+
+@pytest.fixture(autouse = True)
+def app_context(request):
+    """
+    Pushes a testing application with its tables and roles for the test cases that
+    do not set one up themselves e.g., the user model tests
+    """
+    if request.cls is not None and 'setUp' in vars(request.cls):
+        yield None
+        return
+
+    app = create_app('testing')
+    context = app.app_context()
+    context.push()
+    db.create_all()
+    role.insert_roles()
+
+    yield app
+
+    db.session.remove()
+    db.drop_all()
+    context.pop()
@@ -0,0 +1,24 @@
+import unittest, flask
+from app import create_app, app_context
+
+class AppContextTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+
+
+    def test_reuses_current_application(self):
+        """Ensures app_context() runs against the application already in context"""
+
+        with self.app.app_context():
+            with app_context() as current:
+                self.assertIs(current, self.app)
+            self.assertIs(flask.current_app._get_current_object(), self.app)
+
+
+    def test_creates_application_outside_context(self):
+        """Ensures app_context() pushes one application of its own for the block"""
+
+        with app_context('testing') as current:
+            self.assertIsNot(current, self.app)
+            self.assertIs(flask.current_app._get_current_object(), current)
+        self.assertFalse(flask.has_app_context())
@@ -0,0 +1,81 @@
+import unittest
+from datetime import datetime
+from app import create_app, db
+from app.models import member, monthly_deposit
+from app.kpis import kpi_cache
+from app.transactions.graphs import chart_cache
+from app.transactions.summaries import summary_cache
+
+class CacheInvalidationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        db.session.add(member(member_id = 1, first_name = 'M', email_address = 'm@example.com',
+            location_address = 'x', id_no = 1))
+        db.session.commit()
+        chart_cache.set('monthly deposits', 'cached')
+        summary_cache.set(2024, 'cached')
+        kpi_cache.clear()
+
+
+    def tearDown(self):
+        chart_cache.invalidate()
+        summary_cache.invalidate()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+
+    def test_charts_invalidated_on_commit(self):
+        """Ensures cached charts are dropped at commit and not at flush"""
+
+        db.session.add(monthly_deposit(amount = 1000, member_id = 1,
+            date_created = datetime(2024, 1, 1)))
+        db.session.flush()
+        self.assertEqual(chart_cache.get('monthly deposits'), 'cached')
+
+        db.session.commit()
+        self.assertIsNone(chart_cache.get('monthly deposits'))
+
+
+    def test_rolled_back_insert_keeps_charts(self):
+        """Ensures a rolled back insert leaves cached charts in place"""
+
+        db.session.add(monthly_deposit(amount = 1000, member_id = 1,
+            date_created = datetime(2024, 1, 1)))
+        db.session.flush()
+        db.session.rollback()
+        db.session.commit()
+        self.assertEqual(chart_cache.get('monthly deposits'), 'cached')
+
+
+    def test_year_summaries_invalidated_on_commit(self):
+        """Ensures the summary of a transaction's year is dropped at commit only"""
+
+        db.session.add(monthly_deposit(amount = 1000, member_id = 1,
+            date_created = datetime(2024, 1, 1)))
+        db.session.flush()
+        self.assertEqual(summary_cache.get(2024), 'cached')
+
+        db.session.rollback()
+        self.assertEqual(summary_cache.get(2024), 'cached')
+
+        db.session.add(monthly_deposit(amount = 1000, member_id = 1,
+            date_created = datetime(2024, 1, 1)))
+        db.session.commit()
+        self.assertIsNone(summary_cache.get(2024))
+
+
+    def test_summary_kpis_marked_stale_on_commit(self):
+        """Ensures the summary KPIs are marked stale at commit and not at flush"""
+
+        db.session.add(monthly_deposit(amount = 1000, member_id = 1,
+            date_created = datetime(2024, 1, 1)))
+        db.session.flush()
+        self.assertNotIn('summary', kpi_cache.stale)
+
+        db.session.commit()
+        self.assertIn('summary', kpi_cache.stale)
@@ -0,0 +1,137 @@
+import atexit, os, shutil, tempfile, unittest
+from unittest import mock
+from datetime import datetime
+from app import create_app, db
+from app.generator import (Timer, Generator, BulkGenerator, seeded_now,
+        populate_partitioned, reset_sequences)
+from app.models import member, monthly_deposit, loan, installment, monthly_deposit_overdue
+
+class GeneratorTestCase(unittest.TestCase):
+    def setUp(self):
+        #a database file, which the workers of a partitioned run can attach
+        self.folder = tempfile.mkdtemp()
+        self.app = create_app('testing')
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(
+                self.folder, 'test.sqlite')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.folder)
+
+
+    def dump(self):
+        """Returns every row of the tables a history is written to"""
+        return {model.__tablename__ : [tuple(row) for row in db.session.execute(
+            model.__table__.select().order_by(*model.__table__.primary_key.columns))]
+            for model in (member, monthly_deposit, monthly_deposit_overdue, loan,
+                installment)}
+
+
+    def test_seeded_timer_leaves_checkpoint_alone(self):
+        """Ensures a timer that does not resume never writes the checkpoint"""
+
+        checkpoint = os.path.join(self.folder, 'file.txt')
+        timer = Timer(begin = datetime(2020, 1, 1), checkpoint = checkpoint, every = 1,
+                seed = 1, resume = False)
+        for number in range(5):
+            timer.add()
+        self.assertFalse(os.path.exists(checkpoint))
+
+        timer = Timer(begin = datetime(2020, 1, 1), checkpoint = checkpoint, every = 1)
+        atexit.unregister(timer.save)
+        timer.add()
+        self.assertTrue(os.path.exists(checkpoint))
+
+
+    def test_seeded_timeline_is_anchored(self):
+        """Ensures a seeded generator's timeline ends at seeded_now whatever the day"""
+
+        generator = Generator(seed = 1)
+        self.assertEqual((generator.now, generator.timer.end), (seeded_now, seeded_now))
+        self.assertEqual(Generator(seed = 1).timer.add(), generator.timer.add())
+
+
+    def test_seeded_population_is_reproducible(self):
+        """Ensures a seed generates the same records every time"""
+
+        BulkGenerator(seed = 7).populate(members = 12, months = 18, group_size = 4)
+        first = self.dump()
+        self.assertTrue(first['monthly_deposit'])
+        self.assertLessEqual(db.session.query(db.func.max(member.date_created)).scalar(),
+                seeded_now)
+
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+
+        BulkGenerator(seed = 7).populate(members = 12, months = 18, group_size = 4)
+        self.assertEqual(self.dump(), first)
+
+
+    def test_orm_insert_after_bulk_generation(self):
+        """Ensures records added through the ORM after a bulk run get fresh IDs"""
+
+        BulkGenerator(seed = 7).populate(members = 4, months = 6, group_size = 0)
+        highest = db.session.query(db.func.max(member.member_id)).scalar()
+
+        Member = member(first_name = 'M', email_address = 'orm@example.com',
+                location_address = 'x', id_no = 999999)
+        db.session.add(Member)
+        db.session.commit()
+        self.assertEqual(Member.member_id, highest + 1)
+
+
+    def test_sequences_reset_on_postgresql(self):
+        """Ensures the sequences of the tables written are moved past their highest IDs"""
+
+        connection = mock.Mock()
+        connection.dialect.name = 'postgresql'
+        reset_sequences(connection, [member, loan])
+
+        statements = [item[0][0] for item in connection.execute.call_args_list]
+        self.assertEqual(len(statements), 2)
+        self.assertIn("""setval(pg_get_serial_sequence('"member"', 'member_id')""",
+                statements[0])
+        self.assertIn('FROM "loan"', statements[1])
+
+        connection.dialect.name = 'sqlite'
+        reset_sequences(connection, [member])
+        self.assertEqual(connection.execute.call_count, 2)
+
+
+    def test_partitioned_population_is_reproducible(self):
+        """Ensures a seed and number of workers generate the same records every time"""
+
+        arguments = dict(members = 12, workers = 2, months = 18, group_size = 4, seed = 7)
+        populate_partitioned('testing', **arguments)
+        first = self.dump()
+        self.assertEqual(len(first['member']), 12)
+
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+
+        populate_partitioned('testing', **arguments)
+        self.assertEqual(self.dump(), first)
+
+
+    def test_orm_insert_after_partitioned_population(self):
+        """Ensures the sequences are reset once the partitions are merged"""
+
+        with mock.patch('app.generator.reset_sequences') as reset:
+            populate_partitioned('testing', members = 8, workers = 2, months = 6,
+                    group_size = 4, seed = 7)
+        self.assertEqual(reset.call_args[0][1], BulkGenerator.tables)
+
+        highest = db.session.query(db.func.max(member.member_id)).scalar()
+        Member = member(first_name = 'M', email_address = 'orm@example.com',
+                location_address = 'x', id_no = 999999)
+        db.session.add(Member)
+        db.session.commit()
+        self.assertEqual(Member.member_id, highest + 1)
@@ -0,0 +1,141 @@
+import csv, os, shutil, tempfile, unittest
+from datetime import datetime
+from app import create_app, db
+from app.jobs import enqueue
+from app.models import (member, month, monthly_deposit, monthly_deposit_overdue,
+        deposit_overdue_payment, imported_payment, loan, loan_type)
+from app.transactions.imports import write_report, trim_report, statement_entry
+
+class PaymentImportTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['JOB_BATCH_SIZE'] = 2
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        db.session.add(member(member_id = 1, first_name = 'M', email_address = 'm@example.com',
+            location_address = 'x', id_no = 1001))
+        db.session.add(month(month_id = 1, description = 'January 2024'))
+        db.session.add(monthly_deposit_overdue(monthly_deposit_overdue_id = 1, amount = 300,
+            member_id = 1, month_id = 1))
+        db.session.commit()
+
+        self.folder = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+
+    def statement(self, rows):
+        """Writes rows to a statement CSV the way spreadsheets export it, with a BOM"""
+        path = os.path.join(self.folder, f'statement{len(os.listdir(self.folder))}.csv')
+        with open(path, 'w', newline = '', encoding = 'utf-8-sig') as file:
+            writer = csv.writer(file)
+            writer.writerow(['Reference', 'Date', 'Kind', 'Amount', 'ID No'])
+            writer.writerows(rows)
+        return path
+
+
+    def run_import(self, path):
+        return enqueue('payment import', path = path, report = path + '.report.csv')
+
+
+    def report(self, path):
+        with open(path + '.report.csv', newline = '') as file:
+            return {item['reference'] : item['reason'] for item in csv.DictReader(file)}
+
+
+    def test_reimport_posts_nothing_twice(self):
+        """Ensures importing a statement again skips every reference already imported"""
+
+        path = self.statement([
+            ['R1', '2024-01-05', 'deposit', '1,000', '1001'],
+            ['R2', '2024-01-06', 'deposit', '500', '1001'],
+            ['R3', '2024-01-07', 'deposit', '200', '1001']])
+
+        Job = self.run_import(path)
+        self.assertEqual((Job.status, Job.rows), ('completed', 3))
+
+        Job = self.run_import(path)
+        self.assertEqual((Job.status, Job.rows), ('completed', 0))
+        self.assertEqual(monthly_deposit.query.count(), 3)
+        self.assertEqual(db.session.query(db.func.sum(monthly_deposit.amount)).scalar(), 1700)
+        self.assertEqual(imported_payment.query.count(), 3)
+
+
+    def test_repeated_reference_in_one_statement(self):
+        """Ensures a reference repeated within a statement, even in one batch, posts once"""
+
+        path = self.statement([
+            ['R1', '2024-01-05', 'deposit', '1000', '1001'],
+            ['R1', '2024-01-05', 'deposit', '1000', '1001'],
+            ['R1', '2024-01-05', 'deposit', '1000', '1001']])
+
+        self.assertEqual(self.run_import(path).rows, 1)
+        self.assertEqual(monthly_deposit.query.count(), 1)
+
+
+    def test_rejected_rows(self):
+        """Ensures fractional amounts and rows without a reference are rejected"""
+
+        path = self.statement([
+            ['R1', '2024-01-05', 'deposit', '999.99', '1001'],
+            ['', '2024-01-05', 'deposit', '1000', '1001'],
+            ['R3', '2024-01-05', 'deposit', '1000.00', '1001']])
+
+        self.assertEqual(self.run_import(path).rows, 1)
+        self.assertEqual(monthly_deposit.query.one().amount, 1000)
+
+        reasons = self.report(path)
+        self.assertIn('whole number', reasons['R1'])
+        self.assertEqual(reasons[''], 'no reference')
+        self.assertEqual(reasons['R3'], '')
+
+
+    def test_deposit_overdue_capped_at_its_amount(self):
+        """Ensures deposit overdue payments are capped at the overdue's own amount"""
+
+        path = self.statement([
+            ['R1', '2024-01-05', 'deposit overdue', '400', '1001'],
+            ['R2', '2024-01-05', 'deposit overdue', '300', '1001']])
+
+        self.assertEqual(self.run_import(path).rows, 1)
+        self.assertEqual(deposit_overdue_payment.query.one().amount, 300)
+        self.assertEqual(monthly_deposit_overdue.query.get(1).status, 'paid')
+
+
+    def test_settled_loan_dated_by_its_entry(self):
+        """Ensures a loan settled by an import is dated paid by the settling entry"""
+
+        db.session.add(loan_type(loan_type_id = 1, description = 'Individual', rate = 0,
+            max_period = 1, multiplier = 3, overdue_penalty = 10))
+        db.session.add(loan(loan_id = 1, amount = 1500, member_id = 1, loan_type = 1))
+        db.session.commit()
+
+        path = self.statement([
+            ['R1', '2024-01-05', 'installment', '1000', '1001'],
+            ['R2', '2024-02-09 10:30', 'installment', '500', '1001']])
+
+        self.assertEqual(self.run_import(path).rows, 2)
+        Loan = loan.query.get(1)
+        self.assertEqual((Loan.status, Loan.outstanding), ('Paid', 0))
+        self.assertEqual(Loan.last_updated, datetime(2024, 2, 9, 10, 30))
+
+
+    def test_report_trimmed_to_committed_rows(self):
+        """Ensures a resumed import drops the report lines of its uncommitted batch"""
+
+        report = os.path.join(self.folder, 'report.csv')
+        entries = [statement_entry(row, {'reference' : f'R{row}'}) for row in range(1, 5)]
+        write_report(report, entries[:2])
+        write_report(report, entries[2:])
+
+        trim_report(report, 2)
+        with open(report, newline = '') as file:
+            self.assertEqual([item['reference'] for item in csv.DictReader(file)],
+                    ['R1', 'R2'])
@@ -0,0 +1,92 @@
+import unittest, threading
+from app import create_app, db, jobs
+from app.jobs import enqueue, run_job, job_handler, retire
+from app.models import member, group, job
+from app.registration.dependencies import change_group_status
+
+class GroupStatusesJobTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        for number in range(1, 4):
+            db.session.add(group(group_id = number, name = f'G{number}',
+                email_address = f'g{number}@example.com', phone_no = str(number),
+                location_address = 'x'))
+            db.session.add(member(member_id = number, first_name = 'M', group_id = number,
+                email_address = f'm{number}@example.com', location_address = 'x',
+                id_no = number, status = 'activated'))
+        db.session.commit()
+
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+
+    def test_groups_deactivated_in_batches(self):
+        """Ensures the job deactivates every listed group and member, one batch each"""
+
+        Job = enqueue('group statuses', group_ids = [1, 2], active = False)
+
+        self.assertEqual((Job.status, Job.progress, Job.rows), ('completed', 2, 2))
+        self.assertEqual([item.active for item in group.query.order_by(group.group_id)],
+                [False, False, True])
+        self.assertEqual(member.query.filter_by(status = 'deactivated').count(), 2)
+
+
+    def test_resumed_job_repeats_nothing(self):
+        """Ensures a job resumed after its first batch leaves that group as it was set"""
+
+        Job = enqueue('group statuses', group_ids = [1, 2], active = False)
+        Job.status, Job.cursor, Job.progress, Job.rows = 'queued', 0, 1, 1
+        group.query.get(1).active = True
+        db.session.commit()
+
+        run_job(Job)
+        self.assertTrue(group.query.get(1).active)
+        self.assertFalse(group.query.get(2).active)
+        self.assertEqual(Job.rows, 1)
+
+
+    def test_change_group_status_runs_as_job(self):
+        """Ensures toggling a group's status goes through the 'group statuses' job"""
+
+        Job = change_group_status(1)
+
+        self.assertEqual((Job.kind, Job.status, Job.rows), ('group statuses', 'completed', 1))
+        self.assertFalse(group.query.get(1).active)
+        self.assertEqual(member.query.get(1).status, 'deactivated')
+
+
+    def test_failed_job_keeps_a_short_error(self):
+        """Ensures a failed job stores a one line error rather than its traceback"""
+
+        @job_handler('failing')
+        def failing_job(Job):
+            raise ValueError('bad statement\nsecond line')
+            yield
+
+        Job = enqueue('failing')
+        self.assertEqual((Job.status, Job.error), ('failed', 'ValueError: bad statement'))
+
+
+    def test_retiring_worker_claims_job_queued_meanwhile(self):
+        """Ensures a worker finding the queue empty picks up a job queued as it exits"""
+
+        Job = job(kind = 'group statuses', arguments = '{"group_ids" : [1], "active" : false}')
+        db.session.add(Job)
+        db.session.commit()
+
+        jobs.worker = threading.current_thread()
+        try:
+            self.assertEqual(retire().job_id, Job.job_id)
+            self.assertIs(jobs.worker, threading.current_thread())
+
+            self.assertIsNone(retire())
+            self.assertIsNone(jobs.worker)
+        finally:
+            jobs.worker = None
@@ -0,0 +1,94 @@
+import unittest
+from datetime import datetime
+from app import create_app, db
+from app.models import (member, month, monthly_deposit, monthly_deposit_overdue,
+        registration_fee, ledger_rollup)
+from app.transactions.dependencies import generate_overdue_monthly_deposits
+
+class LedgerRollupTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        db.session.add(member(member_id = 1, first_name = 'M', email_address = 'm@example.com',
+            location_address = 'x', id_no = 1, date_created = datetime(2023, 12, 1)))
+        db.session.commit()
+
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+
+    def rollups(self):
+        return {(item.year, item.month, item.kind) : (item.count, item.total)
+                for item in ledger_rollup.query}
+
+
+    def test_rollups_follow_inserts(self):
+        """Ensures the rollups written on insert equal those rebuilt from the tables"""
+
+        for day in range(1, 6):
+            db.session.add(monthly_deposit(amount = 1000 * day, member_id = 1,
+                date_created = datetime(2024, 1 + day % 2, day)))
+        db.session.add(registration_fee(amount = 1500, member_id = 1,
+            date_created = datetime(2024, 2, 1)))
+        db.session.commit()
+
+        written = self.rollups()
+        self.assertEqual(written[(2024, 2, 'deposits')], (3, 9000))
+        self.assertEqual(written[(2024, 1, 'deposits')], (2, 6000))
+        self.assertEqual(written[(2024, 2, 'registration fees')], (1, 1500))
+
+        ledger_rollup.rebuild()
+        db.session.commit()
+        self.assertEqual(self.rollups(), written)
+
+
+    def test_rolled_back_insert_leaves_no_rollup(self):
+        """Ensures a rolled back insert does not count in the rollups"""
+
+        db.session.add(monthly_deposit(amount = 1000, member_id = 1,
+            date_created = datetime(2024, 3, 1)))
+        db.session.flush()
+        db.session.rollback()
+
+        self.assertEqual(self.rollups(), {})
+
+
+    def test_record_adds_to_the_month(self):
+        """Ensures records of the same month and kind add up in one rollup"""
+
+        connection = db.session.connection()
+        ledger_rollup.record(connection, 'deposits', datetime(2024, 4, 2), 500)
+        ledger_rollup.record(connection, 'deposits', datetime(2024, 4, 30), 700, 2)
+        db.session.commit()
+
+        self.assertEqual(self.rollups(), {(2024, 4, 'deposits') : (3, 1200)})
+
+
+    def test_overdue_sweep_records_what_it_inserts(self):
+        """Ensures the overdue sweep counts and rolls up exactly the rows it inserts"""
+
+        for number in range(1, 4):
+            db.session.add(month(month_id = number,
+                description = datetime(2024, number, 1).strftime('%B %Y')))
+        db.session.add(monthly_deposit(amount = 400, member_id = 1, month_id = 2,
+            date_created = datetime(2024, 2, 1)))
+        db.session.commit()
+
+        limit = int(self.app.config['DEPOSIT_OVERDUE'])
+        stamp = datetime(2024, 4, 1)
+        created = generate_overdue_monthly_deposits(12, datetime(2024, 3, 31), stamp)
+        db.session.commit()
+
+        self.assertEqual(created, 3)
+        self.assertEqual(monthly_deposit_overdue.query.count(), 3)
+        self.assertEqual(self.rollups()[(2024, 4, 'deposit overdues')],
+                (3, 3 * limit - 400))
+
+        #months already charged are skipped
+        self.assertEqual(generate_overdue_monthly_deposits(12, datetime(2024, 3, 31)), 0)
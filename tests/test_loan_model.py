@@ -0,0 +1,84 @@
+import unittest
+from datetime import datetime
+from app import create_app, db
+from app.models import member, loan, loan_type, installment, loan_overdue
+from app.transactions.payments import post_installment
+
+class LoanModelTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        db.session.add(member(member_id = 1, first_name = 'M', email_address = 'm@example.com',
+            location_address = 'x', id_no = 1))
+        db.session.add(loan_type(loan_type_id = 1, description = 'Individual', rate = 0.01,
+            max_period = 3, multiplier = 3, overdue_penalty = 10))
+        db.session.commit()
+
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+
+    def test_new_loan_outstanding_is_its_amount_and_interest(self):
+        """Ensures a new loan starts with its amount and its interest outstanding"""
+
+        Loan = loan(amount = 30000, member_id = 1, loan_type = 1)
+        db.session.add(Loan)
+        db.session.commit()
+
+        self.assertEqual((Loan.interest, Loan.outstanding), (108, 30108))
+        self.assertEqual((Loan.amount_paid, Loan.overdue_charged, Loan.overdue_paid),
+                (0, 0, 0))
+
+
+    def test_balances_follow_payments_and_charges(self):
+        """Ensures installments and overdues update the balances of their loan"""
+
+        Loan = loan(amount = 30000, member_id = 1, loan_type = 1)
+        db.session.add(Loan)
+        db.session.commit()
+
+        db.session.add(installment(amount = 10000, loan_id = Loan.loan_id))
+        db.session.add(loan_overdue(amount = 500, month = 'January 2024',
+            loan_id = Loan.loan_id))
+        db.session.commit()
+
+        self.assertEqual((Loan.amount_paid, Loan.overdue_charged, Loan.outstanding),
+                (10000, 500, 20608))
+
+
+    def test_loan_paid_in_full_has_nothing_outstanding(self):
+        """Ensures a loan repaid with its interest ends Paid with nothing outstanding"""
+
+        Loan = loan(amount = 30000, member_id = 1, loan_type = 1)
+        db.session.add(Loan)
+        db.session.commit()
+        loan_id, repayable = Loan.loan_id, Loan.amount + Loan.interest
+
+        self.assertEqual(post_installment(loan_id, 20000, repayable), 10108)
+        self.assertEqual(post_installment(loan_id, 10108, repayable), 0)
+
+        Loan = loan.query.get(loan_id)
+        self.assertEqual((Loan.status, Loan.outstanding), ('Paid', 0))
+        self.assertEqual(loan.check_balances(), [])
+
+
+    def test_balance_updates_keep_last_updated(self):
+        """Ensures a paid loan's last_updated, its date of repayment, is not moved"""
+
+        paid = datetime(2023, 6, 30)
+        Loan = loan(amount = 30000, member_id = 1, loan_type = 1, status = 'Paid',
+                last_updated = paid)
+        db.session.add(Loan)
+        db.session.commit()
+
+        db.session.add(loan_overdue(amount = 500, month = 'July 2023', loan_id = Loan.loan_id))
+        db.session.commit()
+
+        self.assertEqual(Loan.overdue_charged, 500)
+        self.assertEqual(Loan.last_updated, paid)
@@ -0,0 +1,116 @@
+import unittest
+from app import create_app, db
+from app.models import member, monthly_deposit
+from app.pagination import KeysetPagination
+
+class KeysetPaginationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        db.session.add(member(member_id = 1, first_name = 'M', email_address = 'm@example.com',
+            location_address = 'x', id_no = 1))
+        db.session.commit()
+
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+
+    def deposits(self, count):
+        db.session.add_all([monthly_deposit(deposit_id = number, amount = 100,
+            member_id = 1) for number in range(1, count + 1)])
+        db.session.commit()
+
+
+    def page(self, **kwargs):
+        return KeysetPagination(monthly_deposit.query, monthly_deposit.deposit_id,
+                3, **kwargs)
+
+
+    def keys(self, pagination):
+        return [item.deposit_id for item in pagination.items]
+
+
+    def test_empty_listing(self):
+        """Ensures an empty listing has one page with no links"""
+
+        pagination = self.page(approximate_total = True)
+        self.assertEqual(pagination.items, [])
+        self.assertEqual((pagination.has_prev, pagination.has_next), (False, False))
+        self.assertEqual((pagination.prev_cursor, pagination.next_cursor), (None, None))
+        self.assertEqual((pagination.total, pagination.pages), (0, 1))
+
+
+    def test_exactly_one_page(self):
+        """Ensures a listing of exactly per_page rows has no next page"""
+
+        self.deposits(3)
+        pagination = self.page()
+        self.assertEqual(self.keys(pagination), [3, 2, 1])
+        self.assertFalse(pagination.has_next)
+        self.assertIsNone(pagination.next_cursor)
+        self.assertIsNone(pagination.pages)
+
+
+    def test_forward_and_back(self):
+        """Ensures seeking forward to the last page and back again returns the same rows"""
+
+        self.deposits(7)
+        first = self.page()
+        self.assertEqual(self.keys(first), [7, 6, 5])
+        self.assertEqual((first.has_prev, first.next_cursor), (False, 5))
+
+        second = self.page(after = first.next_cursor, page = 2)
+        self.assertEqual(self.keys(second), [4, 3, 2])
+        self.assertEqual((second.prev_cursor, second.next_cursor), (4, 2))
+
+        last = self.page(after = second.next_cursor, page = 3)
+        self.assertEqual(self.keys(last), [1])
+        self.assertEqual((last.has_next, last.prev_cursor), (False, 1))
+
+        back = self.page(before = last.prev_cursor, page = 2)
+        self.assertEqual(self.keys(back), [4, 3, 2])
+        self.assertTrue(back.has_prev and back.has_next)
+
+        self.assertEqual(self.keys(self.page(before = back.prev_cursor)), [7, 6, 5])
+        self.assertFalse(self.page(before = back.prev_cursor).has_prev)
+
+
+    def test_cursor_past_either_end(self):
+        """Ensures cursors beyond the first or last key give empty pages"""
+
+        self.deposits(4)
+        self.assertEqual(self.keys(self.page(after = 1)), [])
+        self.assertEqual(self.keys(self.page(before = 4)), [])
+        self.assertEqual(self.keys(self.page(after = 100)), [4, 3, 2])
+
+
+    def test_tuple_rows(self):
+        """Ensures cursors are read from the model leading a row of several entities"""
+
+        self.deposits(4)
+        query = db.session.query(monthly_deposit, member).join(member)
+        pagination = KeysetPagination(query, monthly_deposit.deposit_id, 3)
+        self.assertEqual(pagination.next_cursor, 2)
+
+
+    def test_from_request(self):
+        """Ensures the request arguments select the page and bad ones are ignored"""
+
+        self.deposits(5)
+        self.app.config['FLASKY_POSTS_PER_PAGE'] = 2
+        with self.app.test_request_context('/?after=4&page=2'):
+            pagination = KeysetPagination.from_request(monthly_deposit.query,
+                    monthly_deposit.deposit_id)
+            self.assertEqual([item.deposit_id for item in pagination.items], [3, 2])
+            self.assertEqual((pagination.page, pagination.pages), (2, 3))
+
+        with self.app.test_request_context('/?after=x&page=9'):
+            pagination = KeysetPagination.from_request(monthly_deposit.query,
+                    monthly_deposit.deposit_id)
+            self.assertEqual(pagination.page, 1)
@@ -0,0 +1,152 @@
+import unittest, os, tempfile, threading
+from unittest import mock
+from datetime import datetime
+from app import create_app, db
+from app.models import (member, month, loan, loan_type, loan_overdue, loan_overdue_payment,
+        monthly_deposit_overdue)
+from app.transactions import payments
+from app.transactions.payments import (post_installment, post_loan_overdue_payment,
+        post_deposit_overdue_payment)
+
+class PaymentsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.stamp = datetime(2024, 1, 31)
+        db.session.add(member(member_id = 1, first_name = 'M', email_address = 'm@example.com',
+            location_address = 'x', id_no = 1))
+        db.session.add(loan_type(loan_type_id = 1, description = 'Individual', rate = 0.01,
+            max_period = 3, multiplier = 3, overdue_penalty = 10))
+        db.session.add(month(month_id = 1, description = 'January 2024'))
+        db.session.add(loan(loan_id = 1, amount = 3000, member_id = 1, loan_type = 1,
+            last_updated = self.stamp))
+        db.session.add(loan_overdue(loan_overdue_id = 1, amount = 500, month = 'January 2024',
+            loan_id = 1, last_updated = self.stamp))
+        db.session.add(monthly_deposit_overdue(monthly_deposit_overdue_id = 1, amount = 300,
+            member_id = 1, month_id = 1, last_updated = self.stamp))
+        db.session.commit()
+
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+
+    def test_installments_capped_at_limit(self):
+        """Ensures installments beyond the limit are refused and the last marks the loan paid"""
+
+        self.assertEqual(post_installment(1, 2000, 3000), 1000)
+        self.assertIsNone(post_installment(1, 1500, 3000))
+        self.assertEqual(post_installment(1, 1000, 3000), 0)
+        self.assertEqual(loan.query.get(1).status, 'Paid')
+
+
+    def test_loan_overdue_payments_capped_at_charge(self):
+        """Ensures payments beyond a loan overdue charge are refused"""
+
+        self.assertIsNone(post_loan_overdue_payment(1, 600))
+        self.assertEqual(post_loan_overdue_payment(1, 200), 300)
+        self.assertIsNone(post_loan_overdue_payment(1, 400))
+        self.assertEqual(post_loan_overdue_payment(1, 300), 0)
+        self.assertEqual(loan_overdue.query.get(1).status, 'Paid')
+
+
+    def test_deposit_overdue_payments_capped_at_charge(self):
+        """Ensures a deposit overdue is capped at its own amount, not the configured one"""
+
+        self.assertIsNone(post_deposit_overdue_payment(1, 400))
+        self.assertEqual(post_deposit_overdue_payment(1, 100), 200)
+        self.assertEqual(post_deposit_overdue_payment(1, 200), 0)
+        self.assertIsNone(post_deposit_overdue_payment(1, 1))
+        self.assertEqual(monthly_deposit_overdue.query.get(1).status, 'paid')
+
+
+    def test_unknown_record_refused(self):
+        """Ensures payments into records that do not exist are refused"""
+
+        self.assertIsNone(post_loan_overdue_payment(2, 100))
+        self.assertIsNone(post_deposit_overdue_payment(2, 100))
+        self.assertIsNone(post_installment(2, 100, 1000))
+
+
+    def test_payments_keep_last_updated(self):
+        """Ensures locking a record for a payment does not move its last_updated"""
+
+        post_installment(1, 1000, 3000)
+        post_loan_overdue_payment(1, 100)
+        post_deposit_overdue_payment(1, 100)
+
+        self.assertEqual(loan.query.get(1).last_updated, self.stamp)
+        self.assertEqual(loan_overdue.query.get(1).last_updated, self.stamp)
+        self.assertEqual(monthly_deposit_overdue.query.get(1).last_updated, self.stamp)
+
+
+    def test_overpayment_refused_after_the_lock(self):
+        """Ensures a payment is refused when the locked overdue turns out to be paid up"""
+
+        #the lock's condition passes as it does when PostgreSQL does not re-run its subquery
+        lock_row = payments.lock_row
+        stale = lambda model, key, value, condition = None: lock_row(model, key, value)
+
+        self.assertEqual(post_loan_overdue_payment(1, 400), 100)
+        with mock.patch.object(payments, 'lock_row', stale):
+            self.assertIsNone(post_loan_overdue_payment(1, 300))
+
+        paid = db.session.query(db.func.sum(loan_overdue_payment.amount)).scalar()
+        self.assertEqual(paid, 400)
+
+
+class ConcurrentPaymentsTestCase(unittest.TestCase):
+    def setUp(self):
+        handle, self.database = tempfile.mkstemp(suffix = '.sqlite')
+        os.close(handle)
+
+        self.app = create_app('testing')
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + self.database
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        db.session.add(member(member_id = 1, first_name = 'M', email_address = 'm@example.com',
+            location_address = 'x', id_no = 1))
+        db.session.add(loan_type(loan_type_id = 1, description = 'Individual', rate = 0,
+            max_period = 1, multiplier = 3, overdue_penalty = 10))
+        db.session.add(loan(loan_id = 1, amount = 3000, member_id = 1, loan_type = 1))
+        db.session.add(loan_overdue(loan_overdue_id = 1, amount = 1000, month = 'January 2024',
+            loan_id = 1))
+        db.session.commit()
+
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        os.remove(self.database)
+
+
+    def test_parallel_payments_never_overpay(self):
+        """Ensures parallel payments into one overdue accept no more than its amount"""
+
+        accepted = list()
+        def teller():
+            with self.app.app_context():
+                try:
+                    for number in range(5):
+                        if post_loan_overdue_payment(1, 100) is not None:
+                            accepted.append(100)
+                finally:
+                    db.session.remove()
+
+        tellers = [threading.Thread(target = teller) for number in range(4)]
+        for item in tellers:
+            item.start()
+        for item in tellers:
+            item.join()
+
+        paid = db.session.query(db.func.sum(loan_overdue_payment.amount)).scalar()
+        self.assertEqual((sum(accepted), paid), (1000, 1000))
+        self.assertEqual(loan_overdue.query.get(1).status, 'Paid')
@@ -13,7 +13,7 @@ class UserModelTestCase(unittest.TestCase):
         """Ensures that password attribute is write-only"""
 
         u = user(password = "john")
-        with self.assertRaises("AttributeError"):
+        with self.assertRaises(AttributeError):
             u.password
 
 